@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from datetime import timedelta
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,13 +32,16 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # autodiscover() runs from the URLconf, not at every app registry load
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    # for ObtainAuthToken and the migration history only: the tokens live
+    # in core.AuthToken and core/0021 drops the legacy copies
     'rest_framework.authtoken',
     'core',
     'users',
@@ -46,6 +50,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
+    'core.load_shedding.LoadSheddingMiddleware',
+    'core.query_log.QueryOriginMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,6 +95,63 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=db-replica-1,db-replica-2. Safe-method
+# API reads are routed to them by core.db_routers.ReplicaRouter; in tests they
+# mirror the default database.
+REPLICA_DATABASES = []
+for index, host in enumerate(
+        h.strip() for h in os.environ.get('DB_REPLICA_HOSTS', '').split(',')
+        if h.strip()):
+    alias = f'replica{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'}
+    )
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after a write (read-your-writes)
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+# Seconds a replica that raised an OperationalError is kept out of rotation
+REPLICA_EJECT_SECONDS = int(os.environ.get('DB_REPLICA_EJECT_SECONDS', 30))
+
+
+# Caches
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# The default cache holds what every process has to agree on: throttle
+# buckets, replica pins, idempotency keys, published query statistics and
+# the shared tier of the recipe detail cache. It is memcached at
+# CACHE_LOCATION (e.g. memcached:11211); CACHE_BACKEND may name another
+# backend shared between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.memcached.MemcachedCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211'),
+    }
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/2.2/topics/auth/passwords/
+# Argon2 is preferred; existing PBKDF2 hashes are upgraded on next login.
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Logins verify hashes on a bounded pool (see users.auth): this many run at
+# once, this many may wait, and waiting longer than the timeout is a 503.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+PASSWORD_HASH_TIMEOUT = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -132,3 +196,143 @@ STATIC_ROOT = 'vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
 AUTH_USER_MODEL = 'core.User'
+
+# API tokens (core.models.AuthToken) expire AUTH_TOKEN_TTL after their last
+# refresh; use slides the expiry forward at most once per refresh interval.
+AUTH_TOKEN_TTL = timedelta(days=14)
+AUTH_TOKEN_REFRESH_INTERVAL = timedelta(hours=1)
+
+# Shared recipe pages (recipe.sharing) are cached by browsers for
+# SHARED_RECIPE_MAX_AGE and by the CDN for SHARED_RECIPE_S_MAXAGE seconds.
+# SURROGATE_KEY_PURGER is the dotted path of a callable taking a list of
+# surrogate keys to purge from the CDN when a shared recipe changes.
+SHARED_RECIPE_MAX_AGE = 60
+SHARED_RECIPE_S_MAXAGE = 24 * 60 * 60
+SURROGATE_KEY_PURGER = os.environ.get('SURROGATE_KEY_PURGER')
+
+# Delta sync (recipe.sync): at most SYNC_PAGE_SIZE changes per response,
+# changes younger than SYNC_SETTLE_SECONDS wait for the next sync, and
+# tombstones are kept (and tokens accepted) for SYNC_TOMBSTONE_RETENTION.
+SYNC_PAGE_SIZE = 500
+SYNC_SETTLE_SECONDS = 2
+SYNC_TOMBSTONE_RETENTION = timedelta(days=30)
+
+# most ids accepted by /api/recipe/recipes/batch/ in one request
+RECIPE_BATCH_MAX_IDS = 100
+
+# Recipe detail payloads (recipe.detail_cache): a per-process LRU of
+# RECIPE_CACHE_LOCAL_SIZE entries, each trusted for RECIPE_CACHE_LOCAL_TTL
+# seconds, in front of the shared cache. Concurrent misses wait up to
+# RECIPE_CACHE_BUILD_WAIT seconds for the request already building it.
+RECIPE_CACHE_LOCAL_SIZE = 1024
+RECIPE_CACHE_LOCAL_TTL = 5
+RECIPE_CACHE_TIMEOUT = 60 * 60
+RECIPE_CACHE_BUILD_WAIT = 0.5
+
+# how long a shopping list (recipe.shopping) is cached for a set of recipes
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+
+# Similar recipes (recipe.similarity): the index written by
+# build_similarity, and how many results /recipes/{id}/similar/ returns by
+# default and at most (?limit=). At most RECIPE_SIMILARITY_MAX_FRESH
+# recipes written since the build are scored from the database; with more
+# a rebuild is queued as a background job.
+RECIPE_SIMILARITY_INDEX = os.environ.get(
+    'RECIPE_SIMILARITY_INDEX', '/vol/web/similarity.npz'
+)
+RECIPE_SIMILARITY_MAX_FRESH = 200
+RECIPE_SIMILAR_LIMIT = 10
+RECIPE_SIMILAR_MAX_LIMIT = 50
+
+# how long core.catalog caches a catalog name -> id mapping
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+
+# how long a create response is replayed for its Idempotency-Key
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Response compression (core.compression): br, zstd (when brotli/zstandard
+# are installed) or gzip, at COMPRESS_LEVELS, for bodies of at least
+# COMPRESS_MIN_SIZE bytes of JSON. Levels favour CPU: responses are
+# compressed on every request.
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+
+# longest side, in pixels, uploaded recipe images are shrunk to by a job
+RECIPE_IMAGE_MAX_SIZE = 2048
+
+# recipes rendered per chunk of the streamed /api/recipe/recipes/export/
+RECIPE_EXPORT_BATCH_SIZE = 500
+
+# Background jobs (core.jobs, run by manage.py run_workers): a failed job is
+# retried up to JOB_MAX_ATTEMPTS times, after JOB_RETRY_BACKOFF seconds
+# doubling up to JOB_RETRY_MAX_DELAY; one running for longer than
+# JOB_TIMEOUT seconds is assumed lost with its worker and queued again, or
+# failed once out of attempts.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10
+JOB_RETRY_MAX_DELAY = 60 * 60
+JOB_TIMEOUT = 30 * 60
+JOB_POLL_INTERVAL = 1.0
+
+# API throttles (core.throttling) are token buckets per user and per client
+# IP, with separate rates for reads, writes and uploads. Buckets live in the
+# THROTTLE_CACHE alias, the shared default cache unless set, so the limits
+# hold across processes.
+THROTTLE_CACHE = os.environ.get('THROTTLE_CACHE', 'default')
+
+# Load shedding (core.load_shedding): when the moving average of statement
+# latency exceeds LOAD_SHED_DB_LATENCY seconds (0 disables), a growing share
+# of writes, then reads, is answered 503 with Retry-After.
+LOAD_SHED_DB_LATENCY = float(os.environ.get('LOAD_SHED_DB_LATENCY', 0.25))
+LOAD_SHED_HALF_LIFE = 5
+LOAD_SHED_RETRY_AFTER = 5
+
+# Query statistics (core.query_log): statements are tagged with the view
+# they run for, grouped by fingerprint (at most QUERY_STATS_MAX_FINGERPRINTS)
+# and published to the default cache every QUERY_STATS_FLUSH_INTERVAL
+# seconds for /api/queries/ and manage.py query_report. Statements slower
+# than SLOW_QUERY_THRESHOLD seconds are logged as JSON to core.slow_queries.
+SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.5))
+QUERY_STATS_MAX_FINGERPRINTS = 1000
+QUERY_STATS_FLUSH_INTERVAL = 10
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.CompactJSONRenderer',
+    ),
+    # proxies in front of the app: the client IP throttles count is taken
+    # from X-Forwarded-For that many hops back, REMOTE_ADDR when 0. Never
+    # leave it unset: the whole (client supplied) header is used then.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.UserRateThrottle',
+        'core.throttling.IPRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_email': '10/min',
+        'user_read': '1200/min',
+        'user_write': '300/min',
+        'user_upload': '60/hour',
+        'ip_read': '3000/min',
+        'ip_write': '600/min',
+        'ip_upload': '120/hour',
+    },
+}
@@ -18,8 +18,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+admin.autodiscover()
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include("users.urls")),
-    path('api/recipe/', include("recipe.urls"))
+    path('api/recipe/', include("recipe.urls")),
+    path('api/', include("core.urls"))
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
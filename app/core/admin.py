@@ -1,9 +1,50 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 from core import models
 
 
+# below this many rows an exact COUNT(*) is cheap enough to keep
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """planner row estimate for an unfiltered queryset, else None"""
+    if queryset.query.where or queryset.query.distinct:
+        return None
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < ESTIMATE_THRESHOLD:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """avoid COUNT(*) over whole large tables on every changelist page"""
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # the "N total" next to the search box is a second, unfiltered count
+    show_full_result_count = False
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+
+
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
@@ -23,7 +64,58 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class RecipeAttrAdmin(LargeTableAdmin):
+    list_display = ["name", "user", "recipe_count"]
+    search_fields = ["^name"]
+    # the catalog entry follows the name (core.signals), so no <select>
+    # over the whole catalog either
+    readonly_fields = ["catalog", "recipe_count", "updated_at"]
+
+
+class RecipeTagInline(admin.TabularInline):
+    model = models.RecipeTag
+    autocomplete_fields = ["tag"]
+    extra = 0
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = models.RecipeIngredient
+    autocomplete_fields = ["ingredient"]
+    extra = 0
+
+
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ["title", "user", "price", "time_minute", "deleted_at"]
+    search_fields = ["^title"]
+    inlines = [RecipeTagInline, RecipeIngredientInline]
+    # through model -> (Recipe m2m field, link field to the tag/ingredient)
+    links = {
+        models.RecipeTag: ("tags", "tag"),
+        models.RecipeIngredient: ("ingredients", "ingredient"),
+    }
+    readonly_fields = [
+        "version", "updated_at", "deleted_at", "share_slug", "shared_snapshot"
+    ]
+
+    def get_queryset(self, request):
+        # soft-deleted recipes stay visible until purge_deleted runs
+        return models.Recipe.all_objects.all()
+
+    def save_formset(self, request, form, formset, change):
+        """apply link edits with set() so that the m2m_changed handlers
+        keeping counters, caches and snapshots in step still run"""
+        field, target = self.links[formset.model]
+        getattr(form.instance, field).set([
+            row[target].pk for row in formset.cleaned_data
+            if row and row.get(target) and not row.get("DELETE")
+        ])
+        # formset.save() is skipped, so there is nothing to log per link
+        formset.new_objects = []
+        formset.changed_objects = []
+        formset.deleted_objects = []
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, RecipeAttrAdmin)
+admin.site.register(models.Ingredient, RecipeAttrAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
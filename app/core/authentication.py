@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.models import AuthToken
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """token authentication with a sliding expiry"""
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        user, token = super().authenticate_credentials(key)
+        now = timezone.now()
+        if token.expires <= now:
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        refreshed = token.expires - settings.AUTH_TOKEN_TTL
+        if now - refreshed >= settings.AUTH_TOKEN_REFRESH_INTERVAL:
+            token.expires = now + settings.AUTH_TOKEN_TTL
+            AuthToken.objects.filter(pk=token.pk).update(
+                expires=token.expires
+            )
+        return (user, token)
@@ -0,0 +1,60 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+# max_length of CatalogEntry.normalized
+KEY_LENGTH = 255
+
+
+def normalize(name):
+    """catalog key of a name: whitespace collapsed, case folded
+
+    Cut to KEY_LENGTH: case folding can lengthen a name ("ß" -> "ss").
+    """
+    return " ".join(name.split()).casefold()[:KEY_LENGTH]
+
+
+def _key(model, normalized):
+    # hashed: names may hold characters memcached keys can't
+    digest = hashlib.md5(normalized.encode()).hexdigest()
+    return f"catalog:{model._meta.model_name}:{digest}"
+
+
+def resolve(model, names):
+    """map names to the ids of their catalog entries, creating missing ones
+
+    Entries are never renamed or deleted, so the normalized name -> id
+    map is cached without invalidation and most saves skip the database.
+    """
+    wanted = {}
+    for name in names:
+        wanted.setdefault(normalize(name), " ".join(name.split()))
+    keys = {_key(model, normalized): normalized for normalized in wanted}
+    ids = {keys[key]: pk for key, pk in cache.get_many(keys).items()}
+    missing = [normalized for normalized in wanted if normalized not in ids]
+    if missing:
+        found = dict(
+            model.objects.filter(normalized__in=missing)
+            .values_list("normalized", "pk")
+        )
+        new = [n for n in missing if n not in found]
+        if new:
+            # ignore_conflicts: a concurrent request may create them too
+            model.objects.bulk_create(
+                [model(name=wanted[n], normalized=n) for n in new],
+                ignore_conflicts=True
+            )
+            found.update(
+                model.objects.filter(normalized__in=new)
+                .values_list("normalized", "pk")
+            )
+        # only once committed: a rolled back entry must not stay cached
+        mapping = {_key(model, n): pk for n, pk in found.items()}
+        transaction.on_commit(
+            lambda: cache.set_many(mapping, settings.CATALOG_CACHE_TIMEOUT)
+        )
+        ids.update(found)
+    return {name: ids[normalize(name)] for name in names}
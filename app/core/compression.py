@@ -0,0 +1,155 @@
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# JSON only: HTML pages (the admin, the browsable API) carry a CSRF token
+# next to reflected input, which compressed is open to BREACH
+COMPRESSIBLE = re.compile(r"^application/(json|[\w.+-]+\+json)\b")
+
+
+def _gzip(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def _brotli(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def _zstd(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        compressor.flush,
+    )
+
+
+def codecs():
+    """{coding: factory} of the available codings, preferred first
+
+    A factory takes a level and returns (compress, sync, finish):
+    compress(bytes) and finish() like zlib, sync() to push out what was
+    compressed so far without ending the stream.
+    """
+    found = {}
+    if brotli is not None:
+        found["br"] = _brotli
+    if zstandard is not None:
+        found["zstd"] = _zstd
+    found["gzip"] = _gzip
+    return found
+
+
+def _accepted(header):
+    """{coding: q} of an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate(header):
+    """the coding to answer a request with, None for identity"""
+    accepted = _accepted(header)
+    for coding in codecs():
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def compress(data, coding, level=None):
+    """data compressed in one go"""
+    if level is None:
+        level = settings.COMPRESS_LEVELS[coding]
+    compress, _, finish = codecs()[coding](level)
+    return compress(data) + finish()
+
+
+def compress_stream(chunks, coding):
+    """compress a streamed response chunk by chunk
+
+    Each chunk is flushed as it is produced, so clients get the first
+    batches before the last one is rendered.
+    """
+    compress, sync, finish = codecs()[coding](settings.COMPRESS_LEVELS[coding])
+    for chunk in chunks:
+        data = compress(chunk) + sync()
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """compress responses with the best coding the client accepts
+
+    Brotli and zstd are used when their modules are installed, gzip
+    otherwise. Bodies under COMPRESS_MIN_SIZE bytes are sent as is:
+    below a packet or so compression only costs CPU.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.has_header("Content-Encoding") or
+                response.status_code == 206 or
+                not COMPRESSIBLE.match(response.get("Content-Type", ""))):
+            return response
+        if (not response.streaming and
+                len(response.content) < settings.COMPRESS_MIN_SIZE):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, coding
+            )
+            del response["Content-Length"]
+        else:
+            body = compress(response.content, coding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response["Content-Length"] = str(len(body))
+
+        # an encoded body is a representation of its own: keep the tag
+        # strong, so If-Match can use it, but distinct from the plain one
+        etag = response.get("ETag")
+        if etag and not etag.startswith("W/"):
+            response["ETag"] = f'{etag[:-1]}-{coding}"'
+        response["Content-Encoding"] = coding
+        return response
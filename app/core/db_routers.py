@@ -0,0 +1,160 @@
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+from rest_framework.permissions import SAFE_METHODS
+
+
+_state = threading.local()
+_lock = threading.Lock()
+_ejected = {}
+_cycles = {}
+
+
+def _pin_key(user_id):
+    return f"db-pin:{user_id}"
+
+
+def replicas():
+    """return the configured replica aliases that are currently healthy"""
+    now = time.monotonic()
+    return [
+        alias for alias in getattr(settings, "REPLICA_DATABASES", [])
+        if _ejected.get(alias, 0) <= now
+    ]
+
+
+def next_replica():
+    """pick the next healthy replica round-robin, or the primary"""
+    configured = tuple(getattr(settings, "REPLICA_DATABASES", []))
+    healthy = replicas()
+    if not healthy:
+        return DEFAULT_DB_ALIAS
+    with _lock:
+        cycle = _cycles.get(configured)
+        if cycle is None:
+            cycle = _cycles[configured] = itertools.cycle(configured)
+        for alias in itertools.islice(cycle, len(configured)):
+            if alias in healthy:
+                return alias
+    return DEFAULT_DB_ALIAS
+
+
+def eject(alias):
+    """take a failing replica out of rotation for a while"""
+    with _lock:
+        _ejected[alias] = (
+            time.monotonic() + getattr(settings, "REPLICA_EJECT_SECONDS", 30)
+        )
+
+
+def watch(alias):
+    """start telling errors of a replica apart, see raised_by"""
+    if alias != DEFAULT_DB_ALIAS:
+        connections[alias].errors_occurred = False
+
+
+def raised_by(alias):
+    """return true if the error being handled came from the replica alias
+
+    Django flags a connection when it raises (on connect or execute), so
+    a failing write or pinned read on the primary doesn't count.
+    """
+    return (alias not in (None, DEFAULT_DB_ALIAS)
+            and connections[alias].errors_occurred)
+
+
+def pin_to_primary(user):
+    """send this user's reads to the primary for a short window"""
+    timeout = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+    if user is not None and user.is_authenticated and timeout:
+        cache.set(_pin_key(user.pk), True, timeout)
+
+
+def is_pinned(user):
+    """return true if the user wrote recently"""
+    if user is None or not user.is_authenticated:
+        return False
+    return bool(cache.get(_pin_key(user.pk)))
+
+
+def get_read_alias():
+    """return the alias reads are routed to for the current thread"""
+    return getattr(_state, "read_alias", None)
+
+
+def set_read_alias(alias):
+    _state.read_alias = alias
+
+
+class ReplicaRouter:
+    """route reads flagged by ReplicaReadMixin to a replica"""
+
+    def db_for_read(self, model, **hints):
+        return get_read_alias() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, "REPLICA_DATABASES", [])
+
+
+class ReplicaReadMixin:
+    """serve safe-method requests from a replica (read-your-writes aware)
+
+    Authentication runs against the primary so freshly issued tokens work;
+    the handler's reads are routed to a replica unless the user wrote
+    within REPLICA_PIN_SECONDS. A replica that fails with an
+    OperationalError is ejected and the request is retried once; the
+    primary failing leaves the replicas in rotation.
+    Viewset actions listed in read_actions count as reads whatever
+    their method (e.g. a POST that only carries a long query).
+    """
+    read_actions = ()
+
+    def _is_read(self, request):
+        return (request.method in SAFE_METHODS or
+                getattr(self, "action", None) in self.read_actions)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self._is_read(request) and not is_pinned(request.user):
+            alias = next_replica()
+            watch(alias)
+            set_read_alias(alias)
+
+    def initialize_request(self, request, *args, **kwargs):
+        # the retry goes on with the first attempt's request: the body
+        # can't be read twice, and was parsed already if the view read it
+        retried = getattr(self, "_retried_request", None)
+        if retried is not None:
+            return retried
+        return super().initialize_request(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except OperationalError:
+            alias = get_read_alias()
+            if not raised_by(alias):
+                raise
+            eject(alias)
+            set_read_alias(None)
+            self._retried_request = self.request
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            self._retried_request = None
+            set_read_alias(None)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if not self._is_read(request) and response.status_code < 400:
+            pin_to_primary(getattr(request, "user", None))
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,66 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+
+class IdempotencyKeyInUse(APIException):
+    """a request with the same key is still being processed"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is in progress."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    """the key was first sent with a different request body"""
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was used for another request."
+    default_code = "idempotency_key_reused"
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """replay the first response to a create retried with the same key
+
+    Clients send an Idempotency-Key header with a create; the response
+    (anything but a server error) is kept for IDEMPOTENCY_KEY_TTL and
+    returned as is, with Idempotent-Replayed: true, to a retry carrying
+    the same key and body.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.META.get("HTTP_IDEMPOTENCY_KEY", "").strip()
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > 255:
+            raise ValidationError({"Idempotency-Key": "Too long."})
+        cache_key = (
+            f"idempotency:{request.user.pk}:{self.basename}:{_digest(key)}"
+        )
+        body = _digest(json.dumps(request.data, sort_keys=True, default=str))
+        saved = cache.get(cache_key)
+        if saved is None:
+            if not cache.add(cache_key + ":lock", True, timeout=60):
+                raise IdempotencyKeyInUse()
+            try:
+                response = super().create(request, *args, **kwargs)
+                if response.status_code < 500:
+                    saved = (body, response.status_code, response.data)
+                    cache.set(cache_key, saved, settings.IDEMPOTENCY_KEY_TTL)
+                return response
+            finally:
+                cache.delete(cache_key + ":lock")
+        saved_body, status_code, data = saved
+        if saved_body != body:
+            raise IdempotencyKeyReused()
+        response = Response(data, status=status_code)
+        response["Idempotent-Replayed"] = "true"
+        return response
@@ -0,0 +1,179 @@
+import json
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Avg, Count, DurationField, ExpressionWrapper, F, Min
+)
+from django.utils import timezone
+
+from core.models import Job
+
+
+_tasks = {}
+
+
+def task(name, max_attempts=None):
+    """register a function as the background task `name`
+
+    Tasks take JSON serializable keyword arguments and may run more than
+    once (a retry, or a worker lost mid-job), so they must be idempotent.
+    """
+    def register(func):
+        func.task_name = name
+        func.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        _tasks[name] = func
+        return func
+    return register
+
+
+def enqueue(task_name, user=None, delay=0, **kwargs):
+    """queue a task with kwargs as its arguments
+
+    The job becomes visible to workers when the transaction the call is
+    part of commits.
+    """
+    if task_name not in _tasks:
+        raise KeyError(f"unknown task {task_name!r}")
+    return Job.objects.create(
+        task=task_name,
+        arguments=json.dumps(kwargs),
+        user=user,
+        max_attempts=_tasks[task_name].max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def backoff(attempts):
+    """seconds before retry number `attempts`: doubling, capped, jittered"""
+    delay = min(
+        settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY
+    )
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(worker):
+    """lock the next due job for this worker, None if there is none"""
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.QUEUED, run_at__lte=timezone.now()
+        ).order_by("run_at").first()
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_by = worker
+        job.started_at = timezone.now()
+        job.save(update_fields=[
+            "status", "attempts", "locked_by", "started_at"
+        ])
+    return job
+
+
+def requeue_stale():
+    """put back jobs whose worker died, running longer than JOB_TIMEOUT
+
+    A job out of attempts is marked failed instead, so one that takes
+    its worker down (out of memory, a crash in an extension) isn't run
+    forever.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT)
+    )
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, finished_at=now, locked_by="",
+        error="worker lost while running the job"
+    )
+    return stale.update(status=Job.QUEUED, run_at=now, locked_by="")
+
+
+def run(job):
+    """run a claimed job and record its outcome"""
+    func = _tasks.get(job.task)
+    try:
+        if func is None:
+            raise KeyError(f"unknown task {job.task!r}")
+        result = func(**json.loads(job.arguments))
+    except Exception:
+        job.error = traceback.format_exc()
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + timedelta(
+                seconds=backoff(job.attempts)
+            )
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.result = json.dumps(result)
+        job.error = ""
+        job.finished_at = timezone.now()
+    job.locked_by = ""
+    job.save(update_fields=[
+        "status", "run_at", "result", "error", "finished_at", "locked_by"
+    ])
+    return job
+
+
+def work(worker, should_stop, burst=False):
+    """claim and run jobs until should_stop(), or the queue is empty
+    with burst
+    """
+    processed = 0
+    checked = None
+    while not should_stop():
+        if checked is None or (
+                time.monotonic() - checked > settings.JOB_TIMEOUT / 10):
+            requeue_stale()
+            checked = time.monotonic()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(settings.JOB_POLL_INTERVAL)
+            continue
+        run(job)
+        processed += 1
+    return processed
+
+
+def metrics():
+    """queue depth, lag and recent throughput for monitoring"""
+    now = timezone.now()
+    hour_ago = now - timedelta(hours=1)
+    counts = {status: 0 for status, _ in Job.STATUSES}
+    for row in Job.objects.values("status").annotate(n=Count("pk")):
+        counts[row["status"]] = row["n"]
+    oldest = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ).aggregate(Min("run_at"))["run_at__min"]
+    finished = Job.objects.filter(finished_at__gte=hour_ago)
+    recent = finished.values("status").annotate(
+        n=Count("pk"),
+        duration=Avg(ExpressionWrapper(
+            F("finished_at") - F("started_at"), output_field=DurationField()
+        ))
+    )
+    last_hour = {row["status"]: row for row in recent}
+    done = last_hour.get(Job.DONE, {})
+    duration = done.get("duration")
+    return {
+        "counts": counts,
+        "lag_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+        "done_last_hour": done.get("n", 0),
+        "failed_last_hour": last_hour.get(Job.FAILED, {}).get("n", 0),
+        "average_run_seconds": (
+            duration.total_seconds() if duration is not None else None
+        ),
+        "queued_by_task": dict(Job.objects.filter(
+            status=Job.QUEUED
+        ).values_list("task").annotate(n=Count("pk"))),
+    }
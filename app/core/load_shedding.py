@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+class LatencyMonitor:
+    """moving average of database statement latency in this process
+
+    Installed as an execute wrapper, so it sees the whole round trip: a
+    pooler (pgbouncer) holding a transaction until a server connection is
+    free shows up here as latency. The average halves every
+    LOAD_SHED_HALF_LIFE seconds without statements, so a process that
+    shed everything still recovers.
+    """
+    weight = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._average = 0.0
+            self._at = time.monotonic()
+
+    def _decayed(self, now):
+        idle = max(0.0, now - self._at)
+        return self._average * 0.5 ** (idle / settings.LOAD_SHED_HALF_LIFE)
+
+    def observe(self, seconds):
+        now = time.monotonic()
+        with self._lock:
+            average = self._decayed(now)
+            self._average = average + self.weight * (seconds - average)
+            self._at = now
+
+    def average(self):
+        with self._lock:
+            return self._decayed(time.monotonic())
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.observe(time.monotonic() - start)
+
+
+monitor = LatencyMonitor()
+
+
+def shed_probability(method):
+    """share of requests of this method to turn away right now
+
+    Writes start being shed once the average crosses LOAD_SHED_DB_LATENCY
+    and all of them are at twice that; reads follow one threshold later.
+    """
+    threshold = settings.LOAD_SHED_DB_LATENCY
+    if not threshold:
+        return 0.0
+    load = monitor.average() / threshold - 1
+    if method in SAFE_METHODS:
+        load -= 1
+    return min(1.0, max(0.0, load))
+
+
+class LoadSheddingMiddleware:
+    """answer 503 with Retry-After while the database is saturated
+
+    Turned away requests cost no query at all, which is what lets the
+    database catch up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() < shed_probability(request.method):
+            response = JsonResponse(
+                {"detail": "The service is overloaded, try again shortly."},
+                status=503
+            )
+            response["Retry-After"] = str(settings.LOAD_SHED_RETRY_AFTER)
+            return response
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(monitor))
+            return self.get_response(request)
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.renderers import JSONRenderer
+
+from core.compression import codecs, compress
+from core.models import Recipe
+from core.renderers import CompactJSONRenderer
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command to measure response compression on real recipes"""
+    help = ("Render a recipe list like /api/recipe/recipes/ does and report "
+            "bytes on the wire and compression CPU time per response for "
+            "each output mode and available coding.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes", type=int, default=100,
+            help="recipes in the rendered list (default: %(default)s)")
+        parser.add_argument(
+            "--user", default="",
+            help="email of the user whose recipes are used (default: any)")
+        parser.add_argument(
+            "--repeat", type=int, default=50,
+            help="compressions timed per row (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.prefetch_related("tags", "ingredients")
+        if options["user"]:
+            recipes = recipes.filter(user__email=options["user"])
+        recipes = list(recipes.order_by("-pk")[:options["recipes"]])
+        if not recipes:
+            raise CommandError("no recipes to render")
+        data = RecipeSerializer(recipes, many=True).data
+        bodies = {
+            "json": JSONRenderer().render(data),
+            "compact": CompactJSONRenderer().render(data),
+        }
+        repeat = max(1, options["repeat"])
+
+        self.stdout.write(f"{len(recipes)} recipes")
+        self.stdout.write(
+            f"{'mode':<8} {'coding':<9} {'bytes':>9} {'ratio':>6} "
+            f"{'ms/resp':>8}"
+        )
+        for mode, body in bodies.items():
+            self.stdout.write(
+                f"{mode:<8} {'identity':<9} {len(body):>9} {1:>6.2f} "
+                f"{0:>8.2f}"
+            )
+            for coding in codecs():
+                level = settings.COMPRESS_LEVELS[coding]
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    size = len(compress(body, coding, level))
+                elapsed = (time.perf_counter() - start) / repeat
+                self.stdout.write(
+                    f"{mode:<8} {f'{coding}-{level}':<9} {size:>9} "
+                    f"{size / len(body):>6.2f} {elapsed * 1000:>8.2f}"
+                )
@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(ordered, fraction):
+    """nearest-rank percentile of an already sorted list"""
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    """Django command to load a running server at several concurrencies"""
+    help = ("Send GET requests to a running server at increasing "
+            "concurrency and report throughput and latency, e.g. to "
+            "compare sync and gevent gunicorn workers.")
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="absolute URL to request")
+        parser.add_argument(
+            "--token", default="",
+            help="API token sent as 'Authorization: Token <token>'")
+        parser.add_argument(
+            "--concurrency", default="1,8,32,128",
+            help="comma separated client counts (default: %(default)s)")
+        parser.add_argument(
+            "--requests", type=int, default=500,
+            help="requests per concurrency level (default: %(default)s)")
+        parser.add_argument(
+            "--timeout", type=float, default=30.0,
+            help="per request timeout in seconds (default: %(default)s)")
+
+    def _fetch(self, request, timeout):
+        start = time.monotonic()
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                response.read()
+                ok = response.status < 400
+        except HTTPError as exc:
+            ok = exc.code < 400
+        except (URLError, OSError):
+            ok = False
+        return time.monotonic() - start, ok
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(n) for n in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency takes numbers, e.g. 1,8,32")
+        if min(levels) < 1 or options["requests"] < 1:
+            raise CommandError("concurrency and requests must be positive")
+        headers = {}
+        if options["token"]:
+            headers["Authorization"] = f"Token {options['token']}"
+        request = Request(options["url"], headers=headers)
+        total = options["requests"]
+
+        self.stdout.write(
+            f"{'clients':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'errors':>7}"
+        )
+        for clients in levels:
+            start = time.monotonic()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                results = list(pool.map(
+                    lambda _: self._fetch(request, options["timeout"]),
+                    range(total)
+                ))
+            elapsed = time.monotonic() - start
+            latencies = sorted(latency for latency, _ in results)
+            errors = sum(1 for _, ok in results if not ok)
+            self.stdout.write(
+                f"{clients:>8} {total / elapsed:>9.1f} "
+                f"{percentile(latencies, 0.50) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.95) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.1f} "
+                f"{errors:>7}"
+            )
@@ -0,0 +1,31 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.similarity import SimilarityIndex
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the similar recipes index"""
+    help = ("Rebuild the recipe x tag/ingredient matrix behind "
+            "/recipes/{id}/similar/. Run it periodically: recipes written "
+            "since the last build are scored from the database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", default=settings.RECIPE_SIMILARITY_INDEX,
+            help="file to write (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        index = SimilarityIndex.build()
+        path = options["output"]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        index.save(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} recipes, {len(index.columns)} features, "
+            f"{len(index.rows)} links in "
+            f"{time.monotonic() - started:.1f}s to {path}."
+        ))
@@ -0,0 +1,74 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, SyncTombstone, Tag
+
+
+class Command(BaseCommand):
+    """Django command to remove soft-deleted recipes and accounts"""
+    help = "Delete tombstoned recipes, users and their files in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=200,
+            help="rows deleted per transaction (default: %(default)s)")
+        parser.add_argument(
+            "--pause", type=float, default=0.1,
+            help="seconds to sleep between batches (default: %(default)s)")
+        parser.add_argument(
+            "--min-age", type=float,
+            default=settings.SYNC_TOMBSTONE_RETENTION.total_seconds(),
+            help="only purge rows deleted this many seconds ago, so sync "
+                 "clients can still see the deletion (default: %(default)s)")
+
+    def _purge(self, queryset, with_images=False):
+        """delete a queryset in short transactions, return the row count"""
+        storage = Recipe._meta.get_field("image").storage
+        total = 0
+        while True:
+            ids = list(queryset.values_list("pk", flat=True)[:self.batch])
+            if not ids:
+                return total
+            batch = queryset.model._base_manager.filter(pk__in=ids)
+            images = []
+            if with_images:
+                images = [
+                    name for name in batch.values_list("image", flat=True)
+                    if name
+                ]
+            with transaction.atomic():
+                batch.delete()
+            for name in images:
+                storage.delete(name)
+            total += len(ids)
+            if self.pause:
+                time.sleep(self.pause)
+
+    def handle(self, *args, **options):
+        self.batch = options["batch_size"]
+        self.pause = options["pause"]
+        cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+        recipes = self._purge(
+            Recipe.all_objects.filter(deleted_at__lte=cutoff),
+            with_images=True
+        )
+        users = 0
+        deleted = get_user_model().objects.filter(deleted_at__lte=cutoff)
+        for user in deleted.iterator():
+            recipes += self._purge(
+                Recipe.all_objects.filter(user=user), with_images=True
+            )
+            self._purge(Tag.objects.filter(user=user))
+            self._purge(Ingredient.objects.filter(user=user))
+            user.delete()
+            users += 1
+        self._purge(SyncTombstone.objects.filter(deleted_at__lte=cutoff))
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {recipes} recipes and {users} users."
+        ))
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """Django command to delete expired API tokens in small batches"""
+    help = "Delete expired API tokens in batches without long locks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="tokens deleted per statement (default: %(default)s)")
+        parser.add_argument(
+            "--pause", type=float, default=0.0,
+            help="seconds to sleep between batches (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now()
+        expired = AuthToken.objects.filter(expires__lte=cutoff)
+        total = 0
+        while True:
+            keys = list(
+                expired.values_list("pk", flat=True)[:options["batch_size"]]
+            )
+            if not keys:
+                break
+            deleted, _ = AuthToken.objects.filter(pk__in=keys).delete()
+            total += deleted
+            if options["pause"]:
+                time.sleep(options["pause"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {total} expired tokens."
+        ))
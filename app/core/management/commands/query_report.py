@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import query_log
+
+
+class Command(BaseCommand):
+    """Django command to dump the statistics of the query log"""
+    help = ("Print the statement fingerprints with the most time spent in "
+            "the database, summed over the processes that published their "
+            "statistics to the cache.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=20,
+            help="fingerprints to print (default: %(default)s)")
+        parser.add_argument(
+            "--sort", default="total_ms",
+            choices=["total_ms", "count", "mean_ms", "max_ms"],
+            help="ordering of the fingerprints (default: %(default)s)")
+        parser.add_argument(
+            "--json", action="store_true",
+            help="print the rows as JSON, histograms included")
+        parser.add_argument(
+            "--reset", action="store_true",
+            help="forget the published statistics afterwards")
+
+    def handle(self, *args, **options):
+        rows = query_log.report(
+            query_log.collect(), order=options["sort"], limit=options["top"]
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+        else:
+            self.stdout.write(
+                f"{'count':>8} {'total ms':>10} {'mean ms':>9} "
+                f"{'p95 ms':>7} {'max ms':>9}  fingerprint"
+            )
+            for row in rows:
+                self.stdout.write(
+                    f"{row['count']:>8} {row['total_ms']:>10.1f} "
+                    f"{row['mean_ms']:>9.2f} {row['p95_ms']:>7g} "
+                    f"{row['max_ms']:>9.1f}  {row['fingerprint']}"
+                )
+                origins = ", ".join(
+                    f"{origin} ({count})"
+                    for origin, count in row["origins"].items()
+                )
+                self.stdout.write(f"{'':>49}from {origins}")
+        if options["reset"]:
+            query_log.reset()
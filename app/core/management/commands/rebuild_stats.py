@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs, stats
+
+
+class Command(BaseCommand):
+    """Django command to recompute or verify the recipe statistics"""
+    help = "Recompute the recipe summary tables, or verify them with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="only report summaries that disagree with the data")
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="users processed per transaction (default: %(default)s)")
+        parser.add_argument(
+            "--enqueue", action="store_true",
+            help="queue one background job per batch instead of waiting")
+
+    def _user_batches(self, size):
+        users = get_user_model().objects.order_by("pk")
+        last = None
+        while True:
+            batch = users if last is None else users.filter(pk__gt=last)
+            ids = list(batch.values_list("pk", flat=True)[:size])
+            if not ids:
+                return
+            yield ids
+            last = ids[-1]
+
+    def handle(self, *args, **options):
+        problems = []
+        users = 0
+        for ids in self._user_batches(options["batch_size"]):
+            users += len(ids)
+            if options["check"]:
+                problems.extend(stats.check(ids))
+            elif options["enqueue"]:
+                jobs.enqueue("core.rebuild_stats", user_ids=ids)
+            else:
+                stats.rebuild(ids)
+        if options["check"]:
+            for problem in problems:
+                self.stdout.write(problem)
+            if problems:
+                raise CommandError(
+                    f"{len(problems)} inconsistent summaries found."
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"Statistics consistent for {users} users."
+            ))
+        elif options["enqueue"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"Queued statistics rebuild for {users} users."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt statistics for {users} users."
+            ))
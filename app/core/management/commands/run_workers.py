@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import jobs
+
+
+def _worker(name, stopping, burst):
+    """body of a worker process"""
+    # the parent handles signals and tells children through `stopping`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    jobs.work(name, stopping.is_set, burst=burst)
+
+
+class Command(BaseCommand):
+    """Django command to run background jobs from the job table"""
+    help = ("Run queued background jobs in a pool of worker processes "
+            "until interrupted; SIGTERM lets running jobs finish.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=os.cpu_count() or 1,
+            help="worker processes (default: %(default)s)")
+        parser.add_argument(
+            "--burst", action="store_true",
+            help="exit once no job is due, e.g. from cron or in tests")
+
+    def _work_inline(self, name, burst):
+        """run jobs in this process, stopping between jobs on a signal"""
+        # the handler only raises a flag: locks could be held when it runs
+        stopped = []
+
+        def stop(signum, frame):
+            stopped.append(signum)
+        previous = {
+            signum: signal.signal(signum, stop)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            return jobs.work(name, lambda: bool(stopped), burst=burst)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        if concurrency < 1:
+            raise CommandError("--concurrency must be positive")
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        if concurrency == 1:
+            processed = self._work_inline(prefix, options["burst"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Processed {processed} jobs."
+            ))
+            return
+
+        context = multiprocessing.get_context("fork")
+        stopping = context.Event()
+
+        def stop(signum, frame):
+            stopping.set()
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        # children must open their own database connections
+        connections.close_all()
+        workers = {}
+        while True:
+            for index in range(concurrency):
+                if index in workers and workers[index].is_alive():
+                    continue
+                if index in workers and (
+                        options["burst"] or stopping.is_set()):
+                    continue
+                process = context.Process(
+                    target=_worker,
+                    args=(f"{prefix}/{index}", stopping, options["burst"]),
+                    daemon=True
+                )
+                process.start()
+                workers[index] = process
+            alive = [p for p in workers.values() if p.is_alive()]
+            if not alive:
+                break
+            # a worker that died outside of a shutdown is replaced
+            alive[0].join(timeout=1)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stopped {len(workers)} workers."
+        ))
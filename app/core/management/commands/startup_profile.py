@@ -0,0 +1,97 @@
+import os
+import re
+import shlex
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(output):
+    """return (module, self_us, cumulative_us, depth) from -X importtime"""
+    rows = []
+    for line in output.splitlines():
+        match = LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            rows.append(
+                (module, int(own), int(cumulative), len(indent) // 2)
+            )
+    return rows
+
+
+def owner(module, packages):
+    """the installed app package a module belongs to, else its top-level
+    package
+    """
+    best = None
+    for app in packages:
+        if module == app or module.startswith(app + "."):
+            if best is None or len(app) > len(best):
+                best = app
+    return best or module.split(".")[0]
+
+
+class Command(BaseCommand):
+    """Django command to attribute cold-start import time to apps"""
+    help = ("Run a fresh interpreter with -X importtime and report import "
+            "time per installed app and the slowest top-level imports.")
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--run", default="",
+            help="manage.py command line to profile, e.g. 'wait_for_db' "
+                 "(default: only django.setup())")
+        parser.add_argument(
+            "--top", type=int, default=15,
+            help="rows shown per table (default: %(default)s)")
+
+    def _profile(self, run):
+        if run:
+            manage = os.path.join(settings.BASE_DIR, "manage.py")
+            argv = [manage] + shlex.split(run)
+        else:
+            argv = ["-c", "import django; django.setup()"]
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime"] + argv,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            env=dict(os.environ),
+        )
+        rows = parse_importtime(result.stderr)
+        if not rows:
+            raise CommandError(f"no import timings captured:\n{result.stderr}")
+        return rows
+
+    def handle(self, *args, **options):
+        rows = self._profile(options["run"])
+        top = options["top"]
+        # app packages, not INSTALLED_APPS entries: those may name an
+        # AppConfig class (django.contrib.admin.apps.SimpleAdminConfig)
+        packages = [config.name for config in apps.get_app_configs()]
+        per_owner = defaultdict(int)
+        for module, own, _, _ in rows:
+            per_owner[owner(module, packages)] += own
+        total = sum(per_owner.values())
+
+        self.stdout.write(f"total import time: {total / 1000:.1f} ms "
+                          f"({len(rows)} modules)")
+        self.stdout.write("\nby app / package (self time):")
+        for name, own in sorted(per_owner.items(), key=lambda i: -i[1])[:top]:
+            self.stdout.write(
+                f"  {own / 1000:9.1f} ms {own * 100 / total:5.1f}%  {name}"
+            )
+        self.stdout.write("\nslowest top-level imports (cumulative):")
+        roots = sorted(
+            (row for row in rows if row[3] == 0), key=lambda r: -r[2]
+        )
+        for module, _, cumulative, _ in roots[:top]:
+            self.stdout.write(f"  {cumulative / 1000:9.1f} ms  {module}")
@@ -1,19 +1,86 @@
+import random
 import time
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
-    """Django command to psuse exucution util the database is available"""
+    """Django command to pause execution until the database is available"""
+    help = "Block until the database answers queries (and is migrated)."
+    # checks import the URLconf, admin and PIL; none of it is needed here
+    requires_system_checks = False
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default=DEFAULT_DB_ALIAS,
+            help="database alias to probe (default: %(default)s)")
+        parser.add_argument(
+            "--timeout", type=float, default=60.0,
+            help="give up after this many seconds (default: %(default)s)")
+        parser.add_argument(
+            "--initial-delay", type=float, default=0.1,
+            help="first backoff delay in seconds (default: %(default)s)")
+        parser.add_argument(
+            "--max-delay", type=float, default=5.0,
+            help="upper bound for a single backoff (default: %(default)s)")
+        parser.add_argument(
+            "--check-migrations", action="store_true",
+            help="also wait until there are no unapplied migrations")
+
+    def _probe(self, alias, check_migrations):
+        """run a real round trip against the database"""
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        if check_migrations:
+            executor = MigrationExecutor(connection)
+            targets = executor.loader.graph.leaf_nodes()
+            if executor.migration_plan(targets):
+                return False
+        return True
+
+    def _backoff(self, attempt, initial, maximum):
+        """exponential backoff with full jitter"""
+        return random.uniform(0, min(maximum, initial * (2 ** attempt)))
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        timeout = options["timeout"]
         self.stdout.write("waiting for database...")
-        db_connection = None
-        while not db_connection:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_start = time.monotonic()
             try:
-                db_connection = connections["default"]
-            except OperationalError:
-                self.stdout.write("database unavailable, waiting 1 second...")
-                time.sleep(1)
-        self.stdout.write(self.style.SUCCESS("Database available."))
+                if self._probe(alias, options["check_migrations"]):
+                    break
+                reason = "migrations pending"
+            except OperationalError as exc:
+                lines = str(exc).strip().splitlines()
+                reason = lines[0] if lines else "database unavailable"
+            elapsed = time.monotonic() - start
+            remaining = timeout - elapsed
+            if remaining <= 0:
+                raise CommandError(
+                    f"database not ready after {elapsed:.2f}s "
+                    f"({attempt + 1} attempts): {reason}")
+            delay = min(
+                remaining,
+                self._backoff(
+                    attempt, options["initial_delay"], options["max_delay"]
+                )
+            )
+            self.stdout.write(
+                f"{reason} (attempt {attempt + 1}, "
+                f"{(time.monotonic() - attempt_start) * 1000:.0f}ms), "
+                f"retrying in {delay:.2f}s..."
+            )
+            time.sleep(delay)
+            attempt += 1
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Database available after {elapsed:.2f}s "
+            f"({attempt + 1} attempts)."
+        ))
@@ -0,0 +1,57 @@
+# Generated by Django 2.2 on 2026-10-19 07:47
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def copy_legacy_tokens(apps, schema_editor):
+    """carry existing rest_framework.authtoken tokens over, one batch per
+    transaction
+    """
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('core', 'AuthToken')
+    using = schema_editor.connection.alias
+    expires = timezone.now() + settings.AUTH_TOKEN_TTL
+    last = ''
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(
+                Token.objects.filter(key__gt=last).order_by('key')
+                .values_list('key', 'user_id')[:1000]
+            )
+            if not rows:
+                break
+            last = rows[-1][0]
+            AuthToken.objects.bulk_create([
+                AuthToken(key=key, user_id=user_id, expires=expires)
+                for key, user_id in rows
+            ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    # the copy commits batch by batch, see 0016_catalog
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_recipe_image'),
+        ('authtoken', '0002_auto_20160226_1747'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('device', models.CharField(blank=True, max_length=64)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'device')},
+            },
+        ),
+        migrations.RunPython(copy_legacy_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 2.2 on 2026-10-19 07:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    """seed the summaries from the existing rows (same as rebuild_stats)"""
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeStats = apps.get_model('core', 'RecipeStats')
+    totals = (
+        Recipe.objects.order_by().values('user_id')
+        .annotate(n=Count('pk'), price=Sum('price'), time=Sum('time_minute'))
+    )
+    RecipeStats.objects.bulk_create([
+        RecipeStats(
+            user_id=row['user_id'],
+            recipe_count=row['n'],
+            price_total=row['price'] or 0,
+            time_total=row['time'] or 0,
+        )
+        for row in totals.iterator()
+    ], batch_size=1000)
+    for name, target in (('tags', 'tag'), ('ingredients', 'ingredient')):
+        field = Recipe._meta.get_field(name)
+        through = field.remote_field.through
+        field.related_model.objects.update(recipe_count=Coalesce(Subquery(
+            through.objects.filter(**{target: OuterRef('pk')})
+            .order_by().values(target)
+            .annotate(n=Count('pk')).values('n')
+        ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_authtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('time_total', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_ingred_user_id_de1121_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_tag_user_id_699afc_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
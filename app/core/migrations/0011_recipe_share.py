@@ -0,0 +1,23 @@
+# Generated by Django 2.2 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='share_slug',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shared_snapshot',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 2.2 on 2026-10-19 08:04
+
+from django.db import migrations, models, transaction
+from django.db.models import Case, When
+import django.db.models.deletion
+
+
+def normalize(name):
+    """same as core.catalog.normalize, frozen for this migration"""
+    return ' '.join(name.split()).casefold()[:255]
+
+
+def link_rows(apps, using, model_name, catalog_name, batch_size=1000):
+    """fold a per-user table into its catalog, one batch of rows at a time
+
+    Each batch commits on its own. Rows saved meanwhile are linked by
+    core.signals and skipped.
+    """
+    Model = apps.get_model('core', model_name)
+    Catalog = apps.get_model('core', catalog_name)
+    last = 0
+    while True:
+        with transaction.atomic(using=using):
+            rows = list(
+                Model.objects.filter(pk__gt=last, catalog=None).order_by('pk')
+                .values_list('pk', 'name')[:batch_size]
+            )
+            if not rows:
+                break
+            last = rows[-1][0]
+            names = {}
+            for _, name in rows:
+                names.setdefault(normalize(name), ' '.join(name.split()))
+            Catalog.objects.bulk_create(
+                [
+                    Catalog(name=name, normalized=key)
+                    for key, name in names.items()
+                ],
+                ignore_conflicts=True
+            )
+            ids = dict(
+                Catalog.objects.filter(normalized__in=list(names))
+                .values_list('normalized', 'pk')
+            )
+            Model.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+                catalog_id=Case(*[
+                    When(pk=pk, then=ids[normalize(name)])
+                    for pk, name in rows
+                ])
+            )
+
+
+def link_catalog(apps, schema_editor):
+    using = schema_editor.connection.alias
+    link_rows(apps, using, 'Tag', 'CatalogTag')
+    link_rows(apps, using, 'Ingredient', 'CatalogIngredient')
+
+
+class Migration(migrations.Migration):
+    # The backfill commits batch by batch instead of holding every tag
+    # and ingredient row locked until the whole table is done.
+    atomic = False
+
+    dependencies = [
+        ('core', '0015_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogIngredient',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('normalized', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CatalogTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('normalized', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='catalog',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ingredients', to='core.CatalogIngredient'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='catalog',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tags', to='core.CatalogTag'),
+        ),
+        migrations.RunPython(link_catalog, migrations.RunPython.noop),
+    ]
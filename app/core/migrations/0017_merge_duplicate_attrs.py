@@ -0,0 +1,97 @@
+# Generated by Django 2.2 on 2026-10-19 08:06
+
+from django.db import migrations
+from django.db.models import Count, Min
+from django.utils import timezone
+
+
+def merge_rows(apps, model_name, field_name, batch_size=500):
+    """fold each user's duplicates into the oldest row of the name
+
+    Links move to the kept row, the others are deleted with a sync
+    tombstone, and counters and updated_at are set by hand: signals
+    don't reach historical models.
+    """
+    Model = apps.get_model('core', model_name)
+    Recipe = apps.get_model('core', 'Recipe')
+    SyncTombstone = apps.get_model('core', 'SyncTombstone')
+    field = Recipe._meta.get_field(field_name)
+    Through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    while True:
+        groups = list(
+            Model.objects.exclude(catalog=None)
+            .values('user_id', 'catalog_id')
+            .annotate(n=Count('pk'), keep=Min('pk')).filter(n__gt=1)
+            .order_by()[:batch_size]
+        )
+        if not groups:
+            break
+        now = timezone.now()
+        for group in groups:
+            keep = group['keep']
+            dupes = list(
+                Model.objects.filter(
+                    user_id=group['user_id'], catalog_id=group['catalog_id']
+                ).exclude(pk=keep).values_list('pk', flat=True)
+            )
+            moving = set(
+                Through.objects.filter(**{target + '__in': dupes})
+                .values_list(source, flat=True)
+            )
+            linked = set(
+                Through.objects.filter(**{target: keep})
+                .values_list(source, flat=True)
+            )
+            Through.objects.bulk_create([
+                Through(**{source + '_id': recipe_id, target + '_id': keep})
+                for recipe_id in moving - linked
+            ])
+            Recipe.objects.filter(pk__in=moving).update(updated_at=now)
+            Model.objects.filter(pk__in=dupes).delete()
+            SyncTombstone.objects.bulk_create([
+                SyncTombstone(
+                    user_id=group['user_id'],
+                    model_name=Model._meta.model_name,
+                    object_id=pk,
+                    deleted_at=now
+                )
+                for pk in dupes
+            ])
+            Model.objects.filter(pk=keep).update(
+                updated_at=now,
+                recipe_count=Through.objects.filter(**{
+                    target: keep, source + '__deleted_at__isnull': True
+                }).count()
+            )
+
+
+def merge_duplicates(apps, schema_editor):
+    merge_rows(apps, 'Tag', 'tags')
+    merge_rows(apps, 'Ingredient', 'ingredients')
+
+
+class Migration(migrations.Migration):
+    # The merge commits before the unique constraints are added: postgres
+    # refuses to ALTER a table with deferred FK checks still pending from
+    # the rows it deleted in the same transaction.
+    atomic = False
+
+    dependencies = [
+        ('core', '0016_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicates, migrations.RunPython.noop, atomic=True
+        ),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('user', 'catalog')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='tag',
+            unique_together={('user', 'catalog')},
+        ),
+    ]
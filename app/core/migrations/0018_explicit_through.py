@@ -0,0 +1,71 @@
+# Generated by Django 2.2 on 2026-10-19 08:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_merge_duplicate_attrs'),
+    ]
+
+    # the tables Django created for the implicit through models already
+    # have this shape, so only the migration state changes: no copy and
+    # no DDL
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='RecipeIngredient',
+                fields=[
+                    ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                    ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Ingredient')),
+                ],
+                options={
+                    'db_table': 'core_recipe_ingredients',
+                },
+            ),
+            migrations.CreateModel(
+                name='RecipeTag',
+                fields=[
+                    ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ],
+                options={
+                    'db_table': 'core_recipe_tags',
+                },
+            ),
+            migrations.AlterField(
+                model_name='recipe',
+                name='ingredients',
+                field=models.ManyToManyField(through='core.RecipeIngredient', to='core.Ingredient'),
+            ),
+            migrations.AlterField(
+                model_name='recipe',
+                name='tags',
+                field=models.ManyToManyField(through='core.RecipeTag', to='core.Tag'),
+            ),
+            migrations.AddField(
+                model_name='recipetag',
+                name='recipe',
+                field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Recipe'),
+            ),
+            migrations.AddField(
+                model_name='recipetag',
+                name='tag',
+                field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Tag'),
+            ),
+            migrations.AddField(
+                model_name='recipeingredient',
+                name='recipe',
+                field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Recipe'),
+            ),
+            migrations.AlterUniqueTogether(
+                name='recipetag',
+                unique_together={('recipe', 'tag')},
+            ),
+            migrations.AlterUniqueTogether(
+                name='recipeingredient',
+                unique_together={('recipe', 'ingredient')},
+            ),
+        ]),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 2.2 on 2026-10-19 08:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+LINKS = [
+    ('core_recipe_tags', 'recipe_id', 'tag_id', 'recipe_tags_tag_idx'),
+    ('core_recipe_ingredients', 'recipe_id', 'ingredient_id',
+     'recipe_ingr_ingredient_idx'),
+]
+
+
+def _single_column_indexes(schema_editor, table, column):
+    with schema_editor.connection.cursor() as cursor:
+        constraints = schema_editor.connection.introspection.get_constraints(
+            cursor, table
+        )
+    return [
+        name for name, info in constraints.items()
+        if info['index'] and not info['unique'] and not info['primary_key']
+        and info['columns'] == [column]
+    ]
+
+
+def _concurrently(schema_editor):
+    return (
+        ' CONCURRENTLY'
+        if schema_editor.connection.vendor == 'postgresql' else ''
+    )
+
+
+def swap_indexes(apps, schema_editor):
+    """add the (x, recipe) indexes, then drop the single column ones
+
+    Built CONCURRENTLY on postgres so link writes carry on meanwhile; a
+    tag lookup always has an index to use.
+    """
+    online = _concurrently(schema_editor)
+    for table, recipe_column, other_column, name in LINKS:
+        schema_editor.execute(
+            f'CREATE INDEX{online} IF NOT EXISTS {name} '
+            f'ON {table} ({other_column}, {recipe_column})'
+        )
+        for column in (recipe_column, other_column):
+            for old in _single_column_indexes(schema_editor, table, column):
+                schema_editor.execute(f'DROP INDEX{online} {old}')
+
+
+def restore_indexes(apps, schema_editor):
+    online = _concurrently(schema_editor)
+    for table, recipe_column, other_column, name in LINKS:
+        for column in (recipe_column, other_column):
+            schema_editor.execute(
+                f'CREATE INDEX{online} IF NOT EXISTS {table}_{column}_idx '
+                f'ON {table} ({column})'
+            )
+        schema_editor.execute(f'DROP INDEX{online} IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0018_explicit_through'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='recipeingredient',
+                    name='ingredient',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.Ingredient'),
+                ),
+                migrations.AlterField(
+                    model_name='recipeingredient',
+                    name='recipe',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.Recipe'),
+                ),
+                migrations.AlterField(
+                    model_name='recipetag',
+                    name='recipe',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.Recipe'),
+                ),
+                migrations.AlterField(
+                    model_name='recipetag',
+                    name='tag',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.Tag'),
+                ),
+                migrations.AddIndex(
+                    model_name='recipeingredient',
+                    index=models.Index(fields=['ingredient', 'recipe'], name='recipe_ingr_ingredient_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='recipetag',
+                    index=models.Index(fields=['tag', 'recipe'], name='recipe_tags_tag_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(swap_indexes, restore_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2 on 2026-10-19 09:12
+
+from django.db import migrations, transaction
+
+
+def drop_legacy_tokens(apps, schema_editor):
+    """delete the rest_framework.authtoken tokens 0009 copied over, one
+    batch per transaction
+
+    Nothing authenticates against them since, and they never expire.
+    """
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('core', 'AuthToken')
+    copied = Token.objects.filter(
+        key__in=AuthToken.objects.values('key')
+    )
+    while True:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            keys = list(copied.values_list('key', flat=True)[:1000])
+            if not keys:
+                break
+            Token.objects.filter(key__in=keys).delete()
+
+
+class Migration(migrations.Migration):
+    # the delete commits batch by batch, see 0016_catalog
+    atomic = False
+
+    dependencies = [
+        ('core', '0020_job'),
+        ('authtoken', '0002_auto_20160226_1747'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_legacy_tokens, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
+import binascii
 import uuid
 import os
 
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -10,6 +13,8 @@ from django.contrib.auth.models import (
 
 from django.conf import settings
 
+from core import catalog
+
 
 def recipe_image_file_path(instance, file_name):
     """generate  file path for a new recipe image"""
@@ -18,6 +23,10 @@ def recipe_image_file_path(instance, file_name):
     return os.path.join("uploads/recipe/", filename)
 
 
+class VersionConflict(Exception):
+    """a conditional update found the row at a different version"""
+
+
 class UserManager(BaseUserManager):
 
     def create_user(self, email, password=None, **kwargs):
@@ -44,19 +53,201 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # tombstone: the account and its data are removed by purge_deleted
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     objects = UserManager()
 
     USERNAME_FIELD = "email"
 
+    def soft_delete(self):
+        """lock the account and hide its recipes now
+
+        The edge cache purge of shared recipes runs as a background job
+        and the data is left to purge_deleted.
+        """
+        from core import jobs
+
+        now = timezone.now()
+        with transaction.atomic():
+            self.deleted_at = now
+            self.is_active = False
+            self.save(update_fields=["deleted_at", "is_active"])
+            self.auth_tokens.all().delete()
+            shared = list(self.recipe_set.filter(
+                share_slug__isnull=False
+            ).values_list("pk", flat=True))
+            self.recipe_set.update(deleted_at=now, updated_at=now)
+            if shared:
+                jobs.enqueue("recipe.purge_shared", recipe_ids=shared)
+
+
+class AuthTokenManager(models.Manager):
+
+    def rotate(self, user, device=""):
+        """replace the user's token for a device with a fresh one
+
+        A single INSERT ... ON CONFLICT DO UPDATE, so logins racing on one
+        device each get a token (the last one wins) rather than an
+        IntegrityError.
+        """
+        connection = connections[self.db]
+        opts = self.model._meta
+        token = self.model(
+            key=self.model.generate_key(), user=user, device=device,
+            expires=timezone.now() + settings.AUTH_TOKEN_TTL
+        )
+        fields = opts.concrete_fields
+        values = [
+            f.get_db_prep_save(f.pre_save(token, True), connection)
+            for f in fields
+        ]
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(f.column) for f in fields)
+        fresh = ", ".join(
+            f"{quote(f.column)} = EXCLUDED.{quote(f.column)}"
+            for f in fields if f.name not in ("user", "device")
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+                f"VALUES ({', '.join(['%s'] * len(fields))}) "
+                f"ON CONFLICT ({quote('user_id')}, {quote('device')}) "
+                f"DO UPDATE SET {fresh} "
+                f"RETURNING {columns}",
+                values
+            )
+            row = cursor.fetchone()
+        return self.model.from_db(
+            self.db, [f.attname for f in fields], row
+        )
+
+
+class AuthToken(models.Model):
+    """expiring API token, one per user and device"""
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="auth_tokens",
+        on_delete=models.CASCADE
+    )
+    device = models.CharField(max_length=64, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+
+    objects = AuthTokenManager()
+
+    class Meta:
+        unique_together = ("user", "device")
+
+    @classmethod
+    def generate_key(cls):
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        if not self.expires:
+            self.expires = timezone.now() + settings.AUTH_TOKEN_TTL
+        return super().save(*args, **kwargs)
+
+    @property
+    def is_expired(self):
+        return self.expires <= timezone.now()
+
+    def __str__(self):
+        return self.key
+
+
+class RecipeAttrManager(models.Manager):
+
+    def get_or_create_by_name(self, user, name):
+        """return (object, created) for the user's tag/ingredient of a name
+
+        Names match the way the catalog matches them, in a single
+        INSERT ... ON CONFLICT ... RETURNING round trip.
+        """
+        entries = self.model._meta.get_field("catalog").related_model
+        catalog_id = catalog.resolve(entries, [name])[name]
+        connection = connections[self.db]
+        opts = self.model._meta
+        obj = self.model(user=user, catalog_id=catalog_id, name=name)
+        fields = [f for f in opts.concrete_fields if not f.primary_key]
+        values = [
+            f.get_db_prep_save(f.pre_save(obj, True), connection)
+            for f in fields
+        ]
+        quote = connection.ops.quote_name
+        table = quote(opts.db_table)
+        columns = ", ".join(quote(f.column) for f in opts.concrete_fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"({', '.join(quote(f.column) for f in fields)}) "
+                f"VALUES ({', '.join(['%s'] * len(fields))}) "
+                f"ON CONFLICT ({quote('user_id')}, {quote('catalog_id')}) "
+                # a no-op update so that RETURNING yields an existing row too
+                f"DO UPDATE SET {quote('name')} = {table}.{quote('name')} "
+                f"RETURNING {columns}, xmax = 0",
+                values
+            )
+            *row, created = cursor.fetchone()
+        obj = self.model.from_db(
+            self.db, [f.attname for f in opts.concrete_fields], row
+        )
+        if created:
+            post_save.send(
+                sender=self.model, instance=obj, created=True,
+                update_fields=None, raw=False, using=self.db
+            )
+        return obj, created
+
+
+class CatalogEntry(models.Model):
+    """a name shared by every user, see core.catalog"""
+    name = models.CharField(max_length=255)
+    # case and whitespace folded, the key names are matched on
+    normalized = models.CharField(max_length=catalog.KEY_LENGTH, unique=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.name
+
+
+class CatalogTag(CatalogEntry):
+    """global tag name the per-user tags are aliases of"""
+
+
+class CatalogIngredient(CatalogEntry):
+    """global ingredient name the per-user ingredients are aliases of"""
+
 
 class Tag(models.Model):
     """Tag to be used for a recipe"""
     name = models.CharField(max_length=255)
+    # set from the name on every save by core.signals
+    catalog = models.ForeignKey(
+        CatalogTag, on_delete=models.PROTECT, null=True, related_name="tags"
+    )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # number of recipes linked, maintained by core.signals
+    recipe_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        # one per user and normalized name, see get_or_create_by_name
+        unique_together = ("user", "catalog")
+        indexes = [
+            models.Index(fields=["user", "recipe_count"]),
+            models.Index(fields=["user", "updated_at"]),
+        ]
 
     def __str__(self):
         return self.name
@@ -65,15 +256,41 @@ class Tag(models.Model):
 class Ingredient(models.Model):
     """ingredient to be use for recipe"""
     name = models.CharField(max_length=255)
+    catalog = models.ForeignKey(
+        CatalogIngredient,
+        on_delete=models.PROTECT,
+        null=True,
+        related_name="ingredients"
+    )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # number of recipes linked, maintained by core.signals
+    recipe_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        # one per user and normalized name, see get_or_create_by_name
+        unique_together = ("user", "catalog")
+        indexes = [
+            models.Index(fields=["user", "recipe_count"]),
+            models.Index(fields=["user", "updated_at"]),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeManager(models.Manager):
+    """hide soft-deleted recipes"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Recipe(models.Model):
     """recipe objects"""
     title = models.CharField(max_length=255)
@@ -84,9 +301,196 @@ class Recipe(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
-    ingredients = models.ManyToManyField("Ingredient")
-    tags = models.ManyToManyField("Tag")
+    ingredients = models.ManyToManyField(
+        "Ingredient", through="RecipeIngredient"
+    )
+    tags = models.ManyToManyField("Tag", through="RecipeTag")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # opaque public share link and the pre-rendered payload served on it
+    share_slug = models.CharField(
+        max_length=32, unique=True, null=True, blank=True
+    )
+    shared_snapshot = models.TextField(blank=True, default="")
+    version = models.PositiveIntegerField(default=1)
+    # tombstone: the row and its image are removed by purge_deleted
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # bumped by saves and, through core.signals, by tag/ingredient changes
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "updated_at"])]
+
+    def soft_delete(self):
+        """hide the recipe now and leave the cascade to purge_deleted"""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=["deleted_at", "updated_at"])
+
+    def save_version(self, expected_version=None, **kwargs):
+        """save as the next version
+
+        With an expected version this is a single UPDATE ... WHERE id = %s
+        AND version = %s that raises VersionConflict when no row matched;
+        no lock is held beyond the statement's own transaction. Without
+        one the write is unconditional (last writer wins).
+        """
+        if expected_version is None:
+            self.version = models.F("version") + 1
+            self.save(**kwargs)
+            self.refresh_from_db(fields=["version"])
+            return
+        self._expected_version = expected_version
+        self.version = expected_version + 1
+        try:
+            self.save(**kwargs)
+        except VersionConflict:
+            self.version = expected_version
+            raise
+        finally:
+            del self._expected_version
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        expected = getattr(self, "_expected_version", None)
+        if expected is None:
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+        updated = super()._do_update(
+            base_qs.filter(version=expected), using, pk_val, values,
+            update_fields, True
+        )
+        if not updated:
+            raise VersionConflict()
+        return updated
 
     def __str__(self):
         return self.title
+
+
+# The link tables are the largest in the schema. Each one carries just two
+# composite indexes: the unique (recipe, x) one serves a recipe's links,
+# (x, recipe) serves "recipes with x" as an index-only scan. Single column
+# FK indexes would only be redundant prefixes of these, paid on every add.
+
+class RecipeTag(models.Model):
+    """link between a recipe and a tag"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               db_index=False)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        db_table = "core_recipe_tags"
+        unique_together = ("recipe", "tag")
+        indexes = [
+            models.Index(fields=["tag", "recipe"], name="recipe_tags_tag_idx")
+        ]
+
+
+class RecipeIngredient(models.Model):
+    """link between a recipe and an ingredient"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               db_index=False)
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   db_index=False)
+
+    class Meta:
+        db_table = "core_recipe_ingredients"
+        unique_together = ("recipe", "ingredient")
+        indexes = [
+            models.Index(fields=["ingredient", "recipe"],
+                         name="recipe_ingr_ingredient_idx")
+        ]
+
+
+class RecipeStats(models.Model):
+    """running totals over a user's recipes, maintained by core.signals"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        related_name="recipe_stats",
+        on_delete=models.CASCADE
+    )
+    recipe_count = models.IntegerField(default=0)
+    price_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    time_total = models.BigIntegerField(default=0)
+
+    @property
+    def average_price(self):
+        if not self.recipe_count:
+            return None
+        return self.price_total / self.recipe_count
+
+    @property
+    def average_time_minute(self):
+        if not self.recipe_count:
+            return None
+        return self.time_total / self.recipe_count
+
+
+class SyncTombstone(models.Model):
+    """record of a hard-deleted tag or ingredient for delta sync
+
+    Not constrained to the user: tombstones are written while a user's
+    rows are being deleted and are expired by purge_deleted instead.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        db_constraint=False,
+        on_delete=models.DO_NOTHING
+    )
+    model_name = models.CharField(max_length=32)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "deleted_at"])]
+
+
+class Job(models.Model):
+    """a unit of background work, run by manage.py run_workers
+
+    Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any
+    number of them share the table without handing a job out twice.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (QUEUED, "queued"),
+        (RUNNING, "running"),
+        (DONE, "done"),
+        (FAILED, "failed"),
+    ]
+
+    task = models.CharField(max_length=100)
+    # keyword arguments of the task, JSON encoded
+    arguments = models.TextField(default="{}")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_at"])]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger("core.slow_queries")
+
+# upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+OTHER = "(other)"
+
+_COMMENT = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?(?![\w\"])")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+_UNSAFE = re.compile(r"[^\w.:-]")
+
+_local = threading.local()
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """the shape of a statement: literals, parameters and the length of
+    IN lists folded, so one ORM call maps to one fingerprint
+
+    Memoized: the ORM sends the same parameterized text over and over.
+    """
+    sql = _COMMENT.sub(" ", sql)
+    sql = _STRING.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def set_origin(origin):
+    """name the code (e.g. RecipeViewSet.list) the next queries run for"""
+    _local.origin = _UNSAFE.sub("", origin) if origin else None
+
+
+def get_origin():
+    return getattr(_local, "origin", None)
+
+
+class QueryStats:
+    """per-fingerprint counts and latency histograms of this process
+
+    At most QUERY_STATS_MAX_FINGERPRINTS shapes are kept apart, later
+    ones are counted together as "(other)".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flushed = time.monotonic()
+
+    def record(self, sql, seconds, origin):
+        shape = fingerprint(sql)
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is None:
+                if len(self._entries) >= settings.QUERY_STATS_MAX_FINGERPRINTS:
+                    shape = OTHER
+                entry = self._entries.setdefault(shape, {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "histogram": [0] * len(BUCKETS), "origins": {},
+                })
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["histogram"][bisect_left(BUCKETS, ms)] += 1
+            origin = origin or "-"
+            entry["origins"][origin] = entry["origins"].get(origin, 0) + 1
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._entries))
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _maybe_flush(self):
+        now = time.monotonic()
+        if now - self._flushed < settings.QUERY_STATS_FLUSH_INTERVAL:
+            return
+        self._flushed = now
+        publish(self.snapshot())
+
+
+stats = QueryStats()
+
+PROCESSES_KEY = "query-stats:processes"
+
+
+def _process_key():
+    return f"query-stats:{socket.gethostname()}:{os.getpid()}"
+
+
+def publish(snapshot):
+    """share this process's statistics through the (shared) default cache
+
+    Registering the key is a read-modify-write; one lost to a concurrent
+    publish is redone on the next flush.
+    """
+    key = _process_key()
+    timeout = settings.QUERY_STATS_FLUSH_INTERVAL * 10
+    # not the query wrapper's business to fail a request over this
+    try:
+        cache.set(key, snapshot, timeout)
+        keys = cache.get(PROCESSES_KEY) or []
+        if key not in keys:
+            cache.set(PROCESSES_KEY, keys + [key], None)
+    except Exception:
+        pass
+
+
+def merge(snapshots):
+    """sum per-process statistics into one"""
+    merged = {}
+    for snapshot in snapshots:
+        for shape, entry in snapshot.items():
+            total = merged.setdefault(shape, {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "histogram": [0] * len(BUCKETS), "origins": {},
+            })
+            total["count"] += entry["count"]
+            total["total_ms"] += entry["total_ms"]
+            total["max_ms"] = max(total["max_ms"], entry["max_ms"])
+            total["histogram"] = [
+                a + b for a, b in zip(total["histogram"], entry["histogram"])
+            ]
+            for origin, count in entry["origins"].items():
+                total["origins"][origin] = (
+                    total["origins"].get(origin, 0) + count
+                )
+    return merged
+
+
+def collect():
+    """statistics of every process that published recently, and this one"""
+    publish(stats.snapshot())
+    keys = cache.get(PROCESSES_KEY) or []
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        cache.set(PROCESSES_KEY, [key for key in keys if key in found], None)
+    return merge(found.values())
+
+
+def reset():
+    """forget the statistics of this process and those published"""
+    stats.reset()
+    keys = cache.get(PROCESSES_KEY) or []
+    cache.delete_many(keys + [PROCESSES_KEY])
+
+
+def percentile(histogram, fraction):
+    """upper bound in ms of the bucket holding the given percentile, None
+    without samples
+    """
+    target = fraction * sum(histogram)
+    seen = 0
+    for bound, count in zip(BUCKETS, histogram):
+        seen += count
+        if count and seen >= target:
+            return bound
+    return None
+
+
+def report(merged, order="total_ms", limit=20):
+    """rows for the slowest fingerprints, by total time by default"""
+    rows = []
+    for shape, entry in merged.items():
+        origins = sorted(entry["origins"].items(), key=lambda i: -i[1])
+        p95 = percentile(entry["histogram"], 0.95)
+        if p95 == BUCKETS[-1]:
+            p95 = entry["max_ms"]
+        rows.append({
+            "fingerprint": shape,
+            "count": entry["count"],
+            "total_ms": round(entry["total_ms"], 3),
+            "mean_ms": round(entry["total_ms"] / entry["count"], 3),
+            "p95_ms": round(p95, 3),
+            "max_ms": round(entry["max_ms"], 3),
+            "histogram": dict(zip(
+                [str(b) for b in BUCKETS[:-1]] + ["inf"], entry["histogram"]
+            )),
+            "origins": dict(origins[:5]),
+        })
+    rows.sort(key=lambda row: -row[order])
+    return rows[:limit]
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """tag, time and account every statement of a connection"""
+    origin = get_origin()
+    if origin:
+        # sqlcommenter style, shown by pg_stat_activity and in the logs
+        sql = f"{sql} /* origin='{origin}' */"
+    start = time.monotonic()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.monotonic() - start
+        stats.record(sql, seconds, origin)
+        if seconds >= settings.SLOW_QUERY_THRESHOLD:
+            logger.warning(json.dumps({
+                "event": "slow_query",
+                "duration_ms": round(seconds * 1000, 3),
+                "origin": origin,
+                "fingerprint": fingerprint(sql),
+                "database": context["connection"].alias,
+            }))
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver adding the wrapper once per connection"""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+class QueryOriginMiddleware:
+    """name queries after the view handling the request
+
+    DRF viewsets are named Class.action, other views by their class or
+    function.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            set_origin(None)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, "cls", None)
+        if view is None:
+            set_origin(getattr(view_func, "__qualname__", None))
+            return None
+        actions = getattr(view_func, "actions", None) or {}
+        action = actions.get(request.method.lower())
+        name = view.__name__
+        set_origin(f"{name}.{action}" if action else name)
+        return None
@@ -0,0 +1,30 @@
+from rest_framework.renderers import JSONRenderer
+
+
+EMPTY = (None, "", [], {})
+
+
+def strip_empty(data):
+    """data without null or empty values, at any depth"""
+    if isinstance(data, dict):
+        stripped = {
+            key: strip_empty(value) for key, value in data.items()
+        }
+        return {
+            key: value for key, value in stripped.items()
+            if value not in EMPTY
+        }
+    if isinstance(data, (list, tuple)):
+        return [strip_empty(item) for item in data]
+    return data
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """JSON without whitespace or null/empty fields, picked by
+    ?format=compact; clients treat an absent field as null or empty
+    """
+    format = "compact"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # never indented, whatever the Accept header asks for
+        return super().render(strip_empty(data), None, renderer_context)
@@ -0,0 +1,46 @@
+import json
+
+from rest_framework import serializers
+
+from core.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """status of a background job"""
+    result = serializers.SerializerMethodField()
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            "id", "task", "status", "attempts", "max_attempts", "run_at",
+            "created_at", "started_at", "finished_at", "result", "error"
+        ]
+        read_only_fields = fields
+
+    def get_result(self, job):
+        return json.loads(job.result) if job.result else None
+
+    def get_error(self, job):
+        """the exception line of the traceback, not the stack"""
+        lines = job.error.strip().splitlines()
+        return lines[-1] if lines else None
+
+
+class JobMetricsSerializer(serializers.Serializer):
+    """queue health for monitoring"""
+    counts = serializers.DictField(child=serializers.IntegerField())
+    lag_seconds = serializers.FloatField()
+    done_last_hour = serializers.IntegerField()
+    failed_last_hour = serializers.IntegerField()
+    average_run_seconds = serializers.FloatField(allow_null=True)
+    queued_by_task = serializers.DictField(child=serializers.IntegerField())
+
+
+class QueryReportParamsSerializer(serializers.Serializer):
+    """query parameters of the query statistics endpoint"""
+    sort = serializers.ChoiceField(
+        choices=["total_ms", "count", "mean_ms", "max_ms"],
+        default="total_ms"
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=20)
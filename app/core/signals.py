@@ -0,0 +1,190 @@
+from decimal import Decimal
+
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import catalog, stats
+from core.models import Ingredient, Recipe, SyncTombstone, Tag
+
+
+TRACKED_FIELDS = ("user_id", "price", "time_minute", "deleted_at")
+
+
+def _snapshot(instance):
+    """the fields the running totals depend on, None if any is deferred"""
+    values = instance.__dict__
+    if any(name not in values for name in TRACKED_FIELDS):
+        return None
+    return tuple(values[name] for name in TRACKED_FIELDS)
+
+
+def _stored(instance):
+    return Recipe.all_objects.filter(pk=instance.pk).values_list(
+        *TRACKED_FIELDS
+    ).first()
+
+
+def _price(value):
+    return Recipe._meta.get_field("price").to_python(value) or Decimal(0)
+
+
+def _contribution(snapshot):
+    """what a recipe adds to its user's totals; nothing once deleted"""
+    if snapshot is None or snapshot[3] is not None:
+        return None
+    user_id, price, time, _ = snapshot
+    return user_id, _price(price), time
+
+
+def _add_to_counts(attrs, delta):
+    """add delta to recipe_count of the tags/ingredients in a queryset
+
+    updated_at moves with the count so delta sync delivers it.
+    """
+    attrs.update(
+        recipe_count=F("recipe_count") + delta, updated_at=timezone.now()
+    )
+
+
+def _shift_links(recipe_id, delta):
+    """add delta to recipe_count of every tag/ingredient of the recipe"""
+    for name in stats.LINK_FIELDS:
+        field = Recipe._meta.get_field(name)
+        linked = field.remote_field.through.objects.filter(
+            **{field.m2m_field_name(): recipe_id}
+        ).values(field.m2m_reverse_field_name())
+        _add_to_counts(
+            field.related_model.objects.filter(pk__in=linked), delta
+        )
+
+
+@receiver(post_init, sender=Recipe)
+def remember_recipe_totals(sender, instance, **kwargs):
+    instance._stats_snapshot = _snapshot(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def load_recipe_totals(sender, instance, raw, **kwargs):
+    """fetch the stored values if they were deferred when loaded"""
+    if raw or instance._state.adding or instance._stats_snapshot:
+        return
+    instance._stats_snapshot = _stored(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_totals(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    current = _snapshot(instance) or _stored(instance)
+    old = None if created else _contribution(instance._stats_snapshot)
+    new = _contribution(current)
+    if old and new and old[0] == new[0]:
+        if old != new:
+            stats.bump(new[0], 0, new[1] - old[1], new[2] - old[2])
+    else:
+        if old:
+            stats.bump(old[0], -1, -old[1], -old[2])
+        if new:
+            stats.bump(new[0], 1, new[1], new[2])
+    if not created and bool(old) != bool(new):
+        # soft-deleted or restored: its links stop or start counting
+        _shift_links(instance.pk, 1 if new else -1)
+    instance._stats_snapshot = current
+
+
+@receiver(pre_delete, sender=Recipe)
+def release_recipe_links(sender, instance, **kwargs):
+    """deleting a recipe drops its links without sending m2m_changed"""
+    if instance.deleted_at is None:
+        _shift_links(instance.pk, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_totals(sender, instance, **kwargs):
+    old = _contribution(_snapshot(instance))
+    if old:
+        stats.bump(old[0], -1, -old[1], -old[2])
+
+
+@receiver(m2m_changed)
+def update_link_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """keep Tag/Ingredient.recipe_count in step with the link tables"""
+    field = stats.link_field(sender)
+    if field is None or action not in ("post_add", "pre_remove", "pre_clear"):
+        return
+    if not reverse and instance.deleted_at is not None:
+        return
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    attrs = field.related_model.objects
+    if action == "post_add":
+        if reverse:
+            _add_to_counts(attrs.filter(pk=instance.pk), len(pk_set))
+        else:
+            _add_to_counts(attrs.filter(pk__in=pk_set), 1)
+        return
+    if reverse:
+        links = sender.objects.filter(**{
+            target: instance.pk, source + "__deleted_at__isnull": True
+        })
+        if action == "pre_remove":
+            links = links.filter(**{source + "__in": pk_set})
+        _add_to_counts(attrs.filter(pk=instance.pk), -links.count())
+    else:
+        links = sender.objects.filter(**{source: instance.pk})
+        if action == "pre_remove":
+            links = links.filter(**{target + "__in": pk_set})
+        _add_to_counts(attrs.filter(pk__in=links.values(target)), -1)
+
+
+@receiver(m2m_changed)
+def touch_relinked_recipes(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """a recipe whose links change counts as updated for delta sync"""
+    field = stats.link_field(sender)
+    if field is None:
+        return
+    now = timezone.now()
+    recipes = Recipe.all_objects
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            recipes.filter(pk=instance.pk).update(updated_at=now)
+    elif action in ("post_add", "post_remove"):
+        recipes.filter(pk__in=pk_set).update(updated_at=now)
+    elif action == "pre_clear":
+        recipes.filter(**{field.name: instance}).update(updated_at=now)
+
+
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Ingredient)
+def link_catalog_entry(sender, instance, raw, **kwargs):
+    """point a per-user tag/ingredient at the shared entry for its name"""
+    if raw and instance.catalog_id:
+        return
+    entries = sender._meta.get_field("catalog").related_model
+    instance.catalog_id = catalog.resolve(entries, [instance.name])[
+        instance.name
+    ]
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_of_deleted_attr(sender, instance, **kwargs):
+    name = "tags" if sender is Tag else "ingredients"
+    Recipe.all_objects.filter(**{name: instance}).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_tombstone(sender, instance, **kwargs):
+    SyncTombstone.objects.create(
+        user_id=instance.user_id,
+        model_name=sender._meta.model_name,
+        object_id=instance.pk
+    )
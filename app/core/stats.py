@@ -0,0 +1,129 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Recipe, RecipeStats
+
+
+LINK_FIELDS = ("tags", "ingredients")
+
+
+def link_field(through):
+    """return the Recipe m2m field using the given through model"""
+    for name in LINK_FIELDS:
+        field = Recipe._meta.get_field(name)
+        if field.remote_field.through is through:
+            return field
+    return None
+
+
+def bump(user_id, recipes=0, price=Decimal(0), time=0):
+    """add deltas to a user's running totals"""
+    changes = dict(
+        recipe_count=F("recipe_count") + recipes,
+        price_total=F("price_total") + price,
+        time_total=F("time_total") + time,
+    )
+    if RecipeStats.objects.filter(user_id=user_id).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            RecipeStats.objects.create(
+                user_id=user_id,
+                recipe_count=recipes,
+                price_total=price,
+                time_total=time
+            )
+    except IntegrityError:
+        RecipeStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def _link_count(field):
+    """subquery counting the recipes linked to the outer tag/ingredient"""
+    through = field.remote_field.through
+    target = field.m2m_reverse_field_name()
+    live = field.m2m_field_name() + "__deleted_at__isnull"
+    return Coalesce(Subquery(
+        through.objects.filter(**{target: OuterRef("pk"), live: True})
+        .order_by().values(target)
+        .annotate(n=Count("pk")).values("n")
+    ), 0, output_field=IntegerField())
+
+
+def _expected_totals(user_ids):
+    rows = (
+        Recipe.objects.filter(user_id__in=user_ids)
+        .order_by().values("user_id")
+        .annotate(
+            n=Count("pk"), price=Sum("price"), time=Sum("time_minute")
+        )
+    )
+    totals = {pk: (0, Decimal(0), 0) for pk in user_ids}
+    for row in rows:
+        totals[row["user_id"]] = (
+            row["n"], row["price"] or Decimal(0), row["time"] or 0
+        )
+    return totals
+
+
+def check(user_ids):
+    """return descriptions of summary rows that disagree with the data"""
+    problems = []
+    stored = {
+        s.user_id: (s.recipe_count, s.price_total, s.time_total)
+        for s in RecipeStats.objects.filter(user_id__in=user_ids)
+    }
+    for user_id, expected in _expected_totals(user_ids).items():
+        actual = stored.get(user_id, (0, Decimal(0), 0))
+        if actual != expected:
+            problems.append(
+                f"user {user_id}: totals {actual} != expected {expected}"
+            )
+    for name in LINK_FIELDS:
+        field = Recipe._meta.get_field(name)
+        stale = (
+            field.related_model.objects.filter(user_id__in=user_ids)
+            .annotate(actual=_link_count(field))
+            .filter(~Q(recipe_count=F("actual")))
+            .values_list("pk", "recipe_count", "actual")
+        )
+        for pk, stored_count, actual in stale:
+            problems.append(
+                f"{field.related_model._meta.model_name} {pk}: "
+                f"recipe_count {stored_count} != expected {actual}"
+            )
+    return problems
+
+
+def rebuild(user_ids):
+    """recompute the summary rows of the given users from scratch"""
+    with transaction.atomic():
+        RecipeStats.objects.filter(user_id__in=user_ids).delete()
+        RecipeStats.objects.bulk_create([
+            RecipeStats(
+                user_id=user_id,
+                recipe_count=count,
+                price_total=price,
+                time_total=time
+            )
+            for user_id, (count, price, time)
+            in _expected_totals(user_ids).items()
+        ])
+        for name in LINK_FIELDS:
+            field = Recipe._meta.get_field(name)
+            attrs = field.related_model.objects
+            stale = list(
+                attrs.filter(user_id__in=user_ids)
+                .annotate(actual=_link_count(field))
+                .filter(~Q(recipe_count=F("actual")))
+                .values_list("pk", flat=True)
+            )
+            # only corrected rows move, for delta sync to deliver them
+            attrs.filter(pk__in=stale).update(
+                recipe_count=_link_count(field), updated_at=timezone.now()
+            )
@@ -0,0 +1,9 @@
+from core import stats
+from core.jobs import task
+
+
+@task("core.rebuild_stats")
+def rebuild_stats(user_ids):
+    """recompute the recipe summaries of some users"""
+    stats.rebuild(user_ids)
+    return len(user_ids)
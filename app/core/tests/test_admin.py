@@ -1,7 +1,21 @@
+from unittest.mock import MagicMock, patch
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.admin import ESTIMATE_THRESHOLD, estimated_count
+from core.models import Ingredient, Recipe, Tag
+
+
+GIF = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!"
+    b"\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01"
+    b"\x00\x00\x02\x02D\x01\x00;"
+)
+
 
 class AdminSiteTests(TestCase):
 
@@ -36,3 +50,119 @@ class AdminSiteTests(TestCase):
         url = reverse('admin:core_user_add')
         res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
+
+    def test_recipe_changelist(self):
+        """test the changelist does not query once per row"""
+        url = reverse("admin:core_recipe_changelist")
+        Recipe.objects.create(
+            user=self.user, title="first", time_minute=1, price=1
+        )
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(url)
+        for n in range(5):
+            Recipe.objects.create(
+                user=self.user, title=f"more {n}", time_minute=1, price=1
+            )
+        with CaptureQueriesContext(connection) as six:
+            res = self.client.get(url)
+        self.assertContains(res, "more 4")
+        self.assertEqual(len(one), len(six))
+
+    def test_recipe_changelist_search(self):
+        """test recipes are searched by title prefix"""
+        Recipe.objects.create(
+            user=self.user, title="Pasta bake", time_minute=1, price=1
+        )
+        Recipe.objects.create(
+            user=self.user, title="Baked pasta", time_minute=1, price=1
+        )
+        url = reverse("admin:core_recipe_changelist")
+        res = self.client.get(url, {"q": "pasta"})
+        self.assertContains(res, "Pasta bake")
+        self.assertNotContains(res, "Baked pasta")
+
+    def test_recipe_change_page(self):
+        """test the recipe form does not list every tag and ingredient"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        Ingredient.objects.create(user=self.user, name="Unused salt")
+        recipe = Recipe.objects.create(
+            user=self.user, title="x", time_minute=1, price=1
+        )
+        recipe.tags.add(tag)
+        url = reverse("admin:core_recipe_change", args=[recipe.id])
+        res = self.client.get(url)
+        self.assertContains(res, "Vegan")
+        self.assertNotContains(res, "Unused salt")
+        self.assertNotContains(res, "test_admin@dummy.com</option>")
+
+    def test_attr_changelists(self):
+        """test tag and ingredient changelists"""
+        Tag.objects.create(user=self.user, name="Dessert")
+        Ingredient.objects.create(user=self.user, name="Sugar")
+        res = self.client.get(reverse("admin:core_tag_changelist"))
+        self.assertContains(res, "Dessert")
+        res = self.client.get(reverse("admin:core_ingredient_changelist"))
+        self.assertContains(res, "Sugar")
+
+    def test_attr_form_lists_no_catalog(self):
+        """test the tag form shows its catalog entry, not all of them"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="Unused quick")
+        res = self.client.get(reverse("admin:core_tag_change", args=[tag.id]))
+        self.assertContains(res, "Vegan")
+        self.assertNotContains(res, "Unused quick")
+        self.assertNotContains(res, 'name="catalog"')
+
+    def test_estimated_count(self):
+        """test the planner estimate is used only where it applies"""
+        self.assertIsNone(estimated_count(Tag.objects.all()))
+        with patch("core.admin.connections") as connections:
+            conn = connections.__getitem__.return_value
+            conn.vendor = "postgresql"
+            cursor = MagicMock()
+            conn.cursor.return_value.__enter__.return_value = cursor
+            cursor.fetchone.return_value = (ESTIMATE_THRESHOLD * 10,)
+            self.assertEqual(
+                estimated_count(Tag.objects.all()), ESTIMATE_THRESHOLD * 10
+            )
+            self.assertIsNone(estimated_count(Tag.objects.filter(name="x")))
+            cursor.fetchone.return_value = (12,)
+            self.assertIsNone(estimated_count(Tag.objects.all()))
+
+    def test_recipe_links_edited_inline(self):
+        """test inline link edits keep the tag counters in step"""
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        quick = Tag.objects.create(user=self.user, name="Quick")
+        recipe = Recipe.objects.create(
+            user=self.user, title="x", time_minute=1, price=1
+        )
+        recipe.tags.add(vegan)
+        link = recipe.tags.through.objects.get()
+        url = reverse("admin:core_recipe_change", args=[recipe.id])
+        prefix = "recipetag_set"
+        image = SimpleUploadedFile(
+            "x.gif", GIF, content_type="image/gif"
+        )
+        with patch(
+            "django.core.files.storage.FileSystemStorage.save",
+            return_value="uploads/recipe/x.gif"
+        ):
+            res = self.client.post(url, {
+                "title": "x", "price": "1", "time_minute": "1", "link": "",
+                "user": self.user.id, "image": image,
+                f"{prefix}-TOTAL_FORMS": "2",
+                f"{prefix}-INITIAL_FORMS": "1",
+                f"{prefix}-0-id": link.id,
+                f"{prefix}-0-recipe": recipe.id,
+                f"{prefix}-0-tag": vegan.id,
+                f"{prefix}-0-DELETE": "on",
+                f"{prefix}-1-recipe": recipe.id,
+                f"{prefix}-1-tag": quick.id,
+                "recipeingredient_set-TOTAL_FORMS": "0",
+                "recipeingredient_set-INITIAL_FORMS": "0",
+            })
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(list(recipe.tags.all()), [quick])
+        vegan.refresh_from_db()
+        quick.refresh_from_db()
+        self.assertEqual((vegan.recipe_count, quick.recipe_count), (0, 1))
@@ -0,0 +1,116 @@
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core import catalog
+from core.models import CatalogIngredient, CatalogTag, Ingredient, Tag
+
+
+class CatalogTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.other = get_user_model().objects.create_user(
+            "other@dummy.com",
+            "dummy123"
+        )
+
+    def test_normalize(self):
+        """test case and whitespace are folded"""
+        self.assertEqual(catalog.normalize("  Sea\tSALT "), "sea salt")
+
+    def test_long_name_fits_key(self):
+        """test a name case folding lengthens still gets an entry"""
+        tag = Tag.objects.create(user=self.user, name="ß" * 255)
+        self.assertEqual(tag.catalog.normalized, "s" * catalog.KEY_LENGTH)
+
+    def test_users_share_an_entry(self):
+        """test equal names of different users map to one entry"""
+        mine = Ingredient.objects.create(user=self.user, name="Sea salt")
+        theirs = Ingredient.objects.create(user=self.other, name="sea  SALT")
+        self.assertEqual(mine.catalog_id, theirs.catalog_id)
+        self.assertEqual(CatalogIngredient.objects.count(), 1)
+        self.assertEqual(mine.catalog.name, "Sea salt")
+        self.assertEqual(theirs.name, "sea  SALT")
+
+    def test_rename_moves_to_other_entry(self):
+        """test a renamed tag follows its new name"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.other, name="Vegan")
+        tag.name = "Vegetarian"
+        tag.save()
+        self.assertEqual(tag.catalog.normalized, "vegetarian")
+        self.assertEqual(CatalogTag.objects.count(), 2)
+
+    def test_resolve_creates_missing_in_one_insert(self):
+        """test many names are resolved with a fixed number of queries"""
+        CatalogTag.objects.create(name="Dessert", normalized="dessert")
+        with CaptureQueriesContext(connection) as queries:
+            ids = catalog.resolve(CatalogTag, ["dessert", "Brunch", "Quick"])
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(set(ids.values())), 3)
+        self.assertEqual(CatalogTag.objects.count(), 3)
+
+    def test_resolve_uses_cache_after_commit(self):
+        """test committed mappings are served without queries"""
+        with patch("core.catalog.transaction.on_commit", lambda f: f()):
+            ids = catalog.resolve(CatalogTag, ["Dessert"])
+        with CaptureQueriesContext(connection) as queries:
+            again = catalog.resolve(CatalogTag, [" DESSERT"])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(again[" DESSERT"], ids["Dessert"])
+
+    def test_resolve_does_not_cache_uncommitted(self):
+        """test entries of an open transaction stay out of the cache"""
+        catalog.resolve(CatalogTag, ["Dessert"])
+        with CaptureQueriesContext(connection) as queries:
+            catalog.resolve(CatalogTag, ["Dessert"])
+        self.assertEqual(len(queries), 1)
+
+    def test_get_or_create_by_name(self):
+        """test a name is matched to the user's existing row or a new one"""
+        tag, created = Tag.objects.get_or_create_by_name(self.user, "Vegan")
+        self.assertTrue(created)
+        same, created = Tag.objects.get_or_create_by_name(
+            self.user, " VEGAN"
+        )
+        self.assertFalse(created)
+        self.assertEqual(same.pk, tag.pk)
+        self.assertEqual(same.name, "Vegan")
+        theirs, created = Tag.objects.get_or_create_by_name(
+            self.other, "vegan"
+        )
+        self.assertTrue(created)
+        self.assertEqual(theirs.catalog_id, tag.catalog_id)
+
+    @skipUnless(connection.vendor == "postgresql", "postgres upsert")
+    def test_get_or_create_by_name_upsert(self):
+        """test the upsert fills every field and runs in one statement"""
+        Tag.objects.get_or_create_by_name(self.user, "Vegan")
+        with CaptureQueriesContext(connection) as queries:
+            tag, created = Tag.objects.get_or_create_by_name(
+                self.user, "vegan"
+            )
+        self.assertFalse(created)
+        upserts = [q for q in queries if "core_tag" in q["sql"]]
+        self.assertEqual(len(upserts), 1)
+        stored = Tag.objects.get()
+        for field in Tag._meta.concrete_fields:
+            self.assertEqual(
+                getattr(tag, field.attname), getattr(stored, field.attname)
+            )
+        ingredient, created = Ingredient.objects.get_or_create_by_name(
+            self.user, "Salt"
+        )
+        self.assertTrue(created)
+        self.assertEqual(ingredient.recipe_count, 0)
+        self.assertIsNotNone(ingredient.updated_at)
@@ -1,7 +1,16 @@
-from unittest.mock import patch
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import MagicMock, patch
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.utils import timezone
+
+from core import query_log
+from core.models import AuthToken, Ingredient, Job, Recipe, Tag
 
 
 class CommandTests(TestCase):
@@ -9,14 +18,236 @@ class CommandTests(TestCase):
     def test_wait_for_db_ready(self):
         """test waiting for db when db is available"""
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
+            gi.return_value = MagicMock()
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 1)
+            cursor = gi.return_value.cursor.return_value.__enter__()
+            cursor.execute.assert_called_once_with("SELECT 1")
 
     @patch("time.sleep", return_value=True)
     def test_wait_for_db(self, ts):
         """test waiting for db"""
         with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError]*5 + [True]
+            connection = MagicMock()
+            connection.cursor.side_effect = [OperationalError] * 5 + [
+                MagicMock()
+            ]
+            gi.return_value = connection
             call_command("wait_for_db")
-            self.assertEqual(gi.call_count, 6)
+            self.assertEqual(connection.cursor.call_count, 6)
+            self.assertEqual(ts.call_count, 5)
+
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_db_backoff_is_bounded(self, ts):
+        """test that retry delays grow but never exceed the max delay"""
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            connection = MagicMock()
+            connection.cursor.side_effect = [OperationalError] * 8 + [
+                MagicMock()
+            ]
+            gi.return_value = connection
+            call_command("wait_for_db", initial_delay=0.5, max_delay=2)
+            delays = [c[0][0] for c in ts.call_args_list]
+            self.assertEqual(len(delays), 8)
+            for delay in delays:
+                self.assertGreaterEqual(delay, 0)
+                self.assertLessEqual(delay, 2)
+
+    @patch("time.sleep", return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """test that the command fails once the timeout is exhausted"""
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value.cursor.side_effect = OperationalError("down")
+            with self.assertRaises(CommandError):
+                call_command("wait_for_db", timeout=0)
+
+    @patch("time.sleep", return_value=True)
+    @patch("core.management.commands.wait_for_db.MigrationExecutor")
+    def test_wait_for_db_pending_migrations(self, executor, ts):
+        """test waiting until migrations have been applied"""
+        executor.return_value.migration_plan.side_effect = [["0001"], []]
+        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+            gi.return_value = MagicMock()
+            call_command("wait_for_db", check_migrations=True)
+            self.assertEqual(ts.call_count, 1)
+
+    def test_purge_tokens(self):
+        """test that only expired tokens are purged, in batches"""
+        user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        past = timezone.now() - timedelta(days=1)
+        for device in ("a", "b", "c"):
+            AuthToken.objects.create(user=user, device=device, expires=past)
+        live = AuthToken.objects.create(user=user, device="live")
+        call_command("purge_tokens", batch_size=2)
+        self.assertEqual(list(AuthToken.objects.all()), [live])
+
+    @patch("time.sleep", return_value=True)
+    def test_purge_deleted(self, ts):
+        """test that tombstoned recipes and accounts are removed"""
+        user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        gone = get_user_model().objects.create_user(
+            "gone@dummy.com",
+            "dummy123"
+        )
+        kept = Recipe.objects.create(
+            user=user, title="kept", time_minute=1, price=1
+        )
+        deleted = Recipe.objects.create(
+            user=user, title="deleted", time_minute=1, price=1
+        )
+        deleted.soft_delete()
+        Recipe.objects.create(user=gone, title="x", time_minute=1, price=1)
+        Tag.objects.create(user=gone, name="Vegan")
+        Ingredient.objects.create(user=gone, name="Salt")
+        gone.soft_delete()
+        with patch("django.core.files.storage.FileSystemStorage.delete"):
+            call_command("purge_deleted", batch_size=1, min_age=0)
+        self.assertEqual(list(Recipe.all_objects.all()), [kept])
+        self.assertEqual(list(get_user_model().objects.all()), [user])
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Ingredient.objects.exists())
+
+    @patch("time.sleep", return_value=True)
+    def test_purge_deleted_removes_image(self, ts):
+        """test that the image file of a purged recipe is deleted"""
+        user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        recipe = Recipe.objects.create(
+            user=user, title="x", time_minute=1, price=1,
+            image="uploads/recipe/x.jpg"
+        )
+        recipe.soft_delete()
+        with patch(
+            "django.core.files.storage.FileSystemStorage.delete"
+        ) as delete:
+            call_command("purge_deleted", min_age=0)
+        delete.assert_called_once_with("uploads/recipe/x.jpg")
+
+    def test_startup_profile(self):
+        """test that import time is attributed to the owning app"""
+        stderr = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:      1000 |       1000 |   rest_framework.fields",
+            "import time:      2000 |       3000 | rest_framework",
+            "import time:       500 |        500 |   recipe.views",
+            "import time:       250 |        750 | recipe",
+            "import time:      4000 |       4000 | yaml",
+        ])
+        out = StringIO()
+        with patch("subprocess.run") as run:
+            run.return_value = MagicMock(stderr=stderr)
+            call_command("startup_profile", run="wait_for_db", stdout=out)
+        self.assertIn("-X", run.call_args[0][0])
+        lines = out.getvalue().splitlines()
+        self.assertIn("total import time: 7.8 ms (5 modules)", lines)
+        owners = [line.split()[-1] for line in lines[3:6]]
+        self.assertEqual(owners, ["yaml", "rest_framework", "recipe"])
+        self.assertIn("3.0 ms  rest_framework", out.getvalue())
+        self.assertNotIn("ms  recipe.views", out.getvalue())
+
+    def test_startup_profile_app_config_entry(self):
+        """test modules of an app installed by its AppConfig are attributed
+        to the app
+        """
+        stderr = "\n".join([
+            "import time:  3000 |  3000 |   django.contrib.admin.sites",
+            "import time:  1000 |  4000 | django.contrib.admin",
+            "import time:   500 |   500 | django.db",
+        ])
+        out = StringIO()
+        with patch("subprocess.run") as run:
+            run.return_value = MagicMock(stderr=stderr)
+            call_command("startup_profile", stdout=out)
+        lines = out.getvalue().splitlines()
+        owners = [line.split()[-1] for line in lines[3:5]]
+        self.assertEqual(owners, ["django.contrib.admin", "django"])
+        self.assertIn("4.0 ms  88.9%  django.contrib.admin", out.getvalue())
+
+    def test_startup_profile_no_output(self):
+        """test that a crashed child process is reported"""
+        with patch("subprocess.run") as run:
+            run.return_value = MagicMock(stderr="Traceback ...")
+            with self.assertRaises(CommandError):
+                call_command("startup_profile", stdout=StringIO())
+
+    def test_bench_concurrency(self):
+        """test the benchmark reports one row per concurrency level"""
+        response = MagicMock(status=200)
+        response.__enter__.return_value = response
+        out = StringIO()
+        with patch(
+            "core.management.commands.bench_concurrency.urlopen",
+            return_value=response
+        ) as urlopen:
+            call_command(
+                "bench_concurrency", "http://localhost:8000/api/",
+                token="abc", concurrency="1,4", requests=10, stdout=out
+            )
+        self.assertEqual(urlopen.call_count, 20)
+        request = urlopen.call_args[0][0]
+        self.assertEqual(request.get_header("Authorization"), "Token abc")
+        rows = [line.split() for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual([row[0] for row in rows], ["1", "4"])
+        self.assertEqual([row[-1] for row in rows], ["0", "0"])
+
+    def test_bench_concurrency_invalid(self):
+        """test bad concurrency levels are rejected"""
+        with self.assertRaises(CommandError):
+            call_command("bench_concurrency", "http://x/", concurrency="a")
+        with self.assertRaises(CommandError):
+            call_command("bench_concurrency", "http://x/", concurrency="0")
+
+    def test_bench_compression(self):
+        """test every mode is measured with every available coding"""
+        user = get_user_model().objects.create_user(
+            "test@dummy.com", "dummy123"
+        )
+        Recipe.objects.create(user=user, title="Dal", time_minute=5, price=1)
+        out = StringIO()
+        with patch("core.compression.zstandard", None):
+            call_command("bench_compression", repeat=1, stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines()[2:]]
+        modes = [row[0] for row in rows]
+        self.assertEqual(modes.count("json"), modes.count("compact"))
+        self.assertIn("gzip-6", [row[1] for row in rows])
+        self.assertNotIn("zstd-3", [row[1] for row in rows])
+
+    def test_bench_compression_no_recipes(self):
+        """test an empty database is reported"""
+        with self.assertRaises(CommandError):
+            call_command("bench_compression", stdout=StringIO())
+
+    def test_rebuild_stats_enqueue(self):
+        """test the rebuild can be handed to background workers"""
+        get_user_model().objects.create_user("test@dummy.com", "dummy123")
+        call_command("rebuild_stats", enqueue=True, stdout=StringIO())
+        job = Job.objects.get()
+        self.assertEqual(job.task, "core.rebuild_stats")
+        call_command("run_workers", concurrency=1, burst=True,
+                     stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_query_report(self):
+        """test recorded statements are dumped, then reset on request"""
+        query_log.reset()
+        query_log.set_origin("RecipeViewSet.list")
+        try:
+            list(Recipe.objects.filter(title="Dal"))
+        finally:
+            query_log.set_origin(None)
+        out = StringIO()
+        call_command("query_report", sort="count", reset=True, stdout=out)
+        self.assertIn('AND "core_recipe"."title" = ?)', out.getvalue())
+        self.assertIn("from RecipeViewSet.list (1)", out.getvalue())
+        out = StringIO()
+        call_command("query_report", json=True, stdout=out)
+        self.assertEqual(json.loads(out.getvalue()), [])
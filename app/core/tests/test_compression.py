@@ -0,0 +1,123 @@
+import gzip
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import compression
+from core.models import Recipe, Tag
+from core.renderers import strip_empty
+
+
+RECIPES_URL = reverse("recipe:recipe-list")
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
+class NegotiationTests(TestCase):
+
+    def test_prefers_best_accepted(self):
+        """test the best available coding the client accepts is used"""
+        with patch.object(compression, "brotli", None):
+            self.assertEqual(compression.negotiate("gzip, br"), "gzip")
+        with patch.object(compression, "brotli", object()):
+            self.assertEqual(compression.negotiate("gzip, br"), "br")
+
+    def test_quality_values(self):
+        """test q=0 refuses a coding and * accepts the rest"""
+        with patch.object(compression, "brotli", None), \
+                patch.object(compression, "zstandard", None):
+            self.assertIsNone(compression.negotiate("gzip;q=0, deflate"))
+            self.assertEqual(compression.negotiate("*"), "gzip")
+            self.assertIsNone(compression.negotiate(""))
+
+    def test_strip_empty(self):
+        """test null and empty values are dropped at any depth"""
+        self.assertEqual(
+            strip_empty({"a": None, "b": [], "c": [{"d": "", "e": 0}]}),
+            {"c": [{"e": 0}]}
+        )
+
+
+@override_settings(COMPRESS_MIN_SIZE=200)
+class CompressionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        for i in range(20):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f"Dal {i}", time_minute=10, price=5
+            )
+            recipe.tags.add(tag)
+        self.recipe = recipe
+
+    def get(self, url, coding="gzip", **params):
+        with patch.object(compression, "brotli", None), \
+                patch.object(compression, "zstandard", None):
+            return self.client.get(url, params, HTTP_ACCEPT_ENCODING=coding)
+
+    def test_list_compressed(self):
+        """test a large list is gzipped with its length and Vary set"""
+        plain = self.client.get(RECIPES_URL)
+        res = self.get(RECIPES_URL)
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res["Vary"])
+        self.assertEqual(int(res["Content-Length"]), len(res.content))
+        self.assertLess(len(res.content), len(plain.content) / 3)
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+
+    def test_html_sent_plain(self):
+        """test HTML pages, which carry CSRF tokens, are not compressed"""
+        res = self.client.get(
+            RECIPES_URL, HTTP_ACCEPT="text/html", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertTrue(res["Content-Type"].startswith("text/html"))
+        self.assertFalse(res.has_header("Content-Encoding"))
+
+    def test_small_or_unaccepted_sent_plain(self):
+        """test small bodies and identity-only clients are not encoded"""
+        res = self.get(reverse("recipe:recipe-detail", args=[self.recipe.id]))
+        self.assertFalse(res.has_header("Content-Encoding"))
+        self.assertEqual(res["ETag"], '"1"')
+        res = self.get(RECIPES_URL, coding="identity")
+        self.assertFalse(res.has_header("Content-Encoding"))
+
+    def test_etag_per_coding(self):
+        """test a compressed representation has its own strong ETag"""
+        with self.settings(COMPRESS_MIN_SIZE=10):
+            res = self.get(
+                reverse("recipe:recipe-detail", args=[self.recipe.id])
+            )
+        self.assertEqual(res["ETag"], '"1-gzip"')
+
+    def test_export_streamed_compressed(self):
+        """test the export is compressed chunk by chunk"""
+        with self.settings(RECIPE_EXPORT_BATCH_SIZE=7):
+            res = self.get(EXPORT_URL)
+            self.assertEqual(res["Content-Encoding"], "gzip")
+            chunks = list(res.streaming_content)
+        self.assertGreater(len(chunks), 3)
+        data = json.loads(gzip.decompress(b"".join(chunks)))
+        self.assertEqual(len(data), 20)
+        self.assertEqual(data[0]["tags"][0]["name"], "Vegan")
+
+    def test_compact_mode(self):
+        """test compact output drops empty fields"""
+        res = self.client.get(RECIPES_URL, {"format": "compact"})
+        self.assertNotIn(b'"link"', res.content)
+        self.assertNotIn(b", ", res.content)
+        res = self.client.get(EXPORT_URL, {"format": "compact"})
+        data = json.loads(b"".join(res.streaming_content))
+        self.assertNotIn("link", data[0])
+        self.assertEqual(len(data), 20)
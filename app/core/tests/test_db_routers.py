@@ -0,0 +1,172 @@
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.db import connections
+from django.db.utils import OperationalError
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import db_routers
+from core.models import Recipe, Tag
+from recipe.views import RecipeViewSet, TagViewSet
+
+
+TAGS_URL = reverse("recipe:tag-list")
+
+
+@override_settings(REPLICA_DATABASES=["replica0", "replica1"])
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        db_routers._ejected.clear()
+        db_routers.set_read_alias(None)
+        cache.clear()
+        self.router = db_routers.ReplicaRouter()
+
+    def test_reads_default_to_primary(self):
+        """test that unflagged reads go to the primary"""
+        self.assertEqual(self.router.db_for_read(Tag), "default")
+        self.assertEqual(self.router.db_for_write(Tag), "default")
+
+    def test_round_robin(self):
+        """test that replicas are picked in turn"""
+        picks = {db_routers.next_replica() for _ in range(4)}
+        self.assertEqual(picks, {"replica0", "replica1"})
+
+    def test_ejected_replica_skipped(self):
+        """test that an ejected replica is taken out of rotation"""
+        db_routers.eject("replica0")
+        picks = {db_routers.next_replica() for _ in range(4)}
+        self.assertEqual(picks, {"replica1"})
+        db_routers.eject("replica1")
+        self.assertEqual(db_routers.next_replica(), "default")
+
+    def test_no_migrations_on_replicas(self):
+        """test that migrations only run on the primary"""
+        self.assertTrue(self.router.allow_migrate("default", "core"))
+        self.assertFalse(self.router.allow_migrate("replica0", "core"))
+
+
+class ReplicaReadMixinTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(db_routers._ejected.clear)
+
+    def add_replica(self):
+        """register replica0 as an alias of the test database"""
+        config = dict(connections.databases["default"])
+        patcher = patch.dict(connections.databases, {"replica0": config})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connections.__delitem__, "replica0")
+        return connections["replica0"]
+
+    @patch("core.db_routers.next_replica", return_value="default")
+    def test_safe_request_uses_replica(self, next_replica):
+        """test that a list request is routed to a replica"""
+        self.client.get(TAGS_URL)
+        self.assertEqual(next_replica.call_count, 1)
+        self.assertIsNone(db_routers.get_read_alias())
+
+    @patch("core.db_routers.next_replica", return_value="default")
+    def test_read_your_writes(self, next_replica):
+        """test that a user is pinned to the primary after a write"""
+        self.client.post(TAGS_URL, {"name": "Vegan"})
+        self.assertTrue(db_routers.is_pinned(self.user))
+        self.client.get(TAGS_URL)
+        next_replica.assert_not_called()
+
+    @patch("core.db_routers.next_replica", return_value="replica0")
+    def test_export_streams_from_replica(self, next_replica):
+        """test the streamed export reads from the request's replica, and
+        goes on from the primary when that replica fails
+        """
+        replica = self.add_replica()
+        Recipe.objects.create(
+            user=self.user, title="Dal", time_minute=5, price=1
+        )
+        fetch = RecipeViewSet._export_batch
+        aliases = []
+
+        def flaky(view, alias, last, size):
+            aliases.append(alias)
+            if alias == "replica0":
+                replica.errors_occurred = True
+                raise OperationalError("replica went away")
+            return fetch(view, alias, last, size)
+
+        with patch.object(RecipeViewSet, "_export_batch", flaky):
+            res = self.client.get(reverse("recipe:recipe-export"))
+            data = json.loads(b"".join(res.streaming_content))
+        self.assertEqual([r["title"] for r in data], ["Dal"])
+        self.assertEqual(aliases, ["replica0", "default", "default"])
+        self.assertIn("replica0", db_routers._ejected)
+
+    @patch("core.db_routers.next_replica",
+           side_effect=["replica0", "default"])
+    def test_failing_replica_ejected(self, next_replica):
+        """test a read the replica fails is retried on the primary"""
+        replica = self.add_replica()
+        tags = TagViewSet.list
+
+        def flaky(view, request, *args, **kwargs):
+            if db_routers.get_read_alias() == "replica0":
+                replica.errors_occurred = True
+                raise OperationalError("replica went away")
+            return tags(view, request, *args, **kwargs)
+
+        with patch.object(TagViewSet, "list", flaky):
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("replica0", db_routers._ejected)
+
+    @patch("core.db_routers.next_replica",
+           side_effect=["replica0", "default"])
+    def test_failing_replica_read_post_retried(self, next_replica):
+        """test a read-only POST is retried with the body it was sent"""
+        replica = self.add_replica()
+        recipe = Recipe.objects.create(
+            user=self.user, title="Dal", time_minute=5, price=1
+        )
+        batch = RecipeViewSet.batch
+
+        def flaky(view, request, *args, **kwargs):
+            if db_routers.get_read_alias() == "replica0":
+                request.data
+                replica.errors_occurred = True
+                raise OperationalError("replica went away")
+            return batch(view, request, *args, **kwargs)
+
+        with patch.object(RecipeViewSet, "batch", flaky):
+            res = self.client.post(
+                reverse("recipe:recipe-batch"), {"ids": [recipe.id]},
+                format="json"
+            )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r["title"] for r in res.data["results"]], ["Dal"])
+
+    @patch("core.db_routers.next_replica", return_value="replica0")
+    def test_failing_primary_keeps_replica(self, next_replica):
+        """test an error from the primary doesn't eject the replica"""
+        replica = self.add_replica()
+        replica.errors_occurred = True
+        error = OperationalError("primary went away")
+
+        with patch.object(TagViewSet, "list", side_effect=error):
+            with self.assertRaises(OperationalError):
+                self.client.get(TAGS_URL)
+
+        self.assertNotIn("replica0", db_routers._ejected)
@@ -0,0 +1,182 @@
+import os
+import signal
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Job
+
+
+calls = []
+
+
+@jobs.task("tests.record")
+def record(value):
+    calls.append(value)
+    return {"value": value}
+
+
+@jobs.task("tests.terminate")
+def terminate():
+    os.kill(os.getpid(), signal.SIGTERM)
+    calls.append("terminated")
+
+
+@jobs.task("tests.broken", max_attempts=2)
+def broken():
+    raise ValueError("no luck")
+
+
+def job_url(job_id):
+    """return job status url"""
+    return reverse("core:job-detail", args=[job_id])
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def run_workers(self):
+        call_command("run_workers", concurrency=1, burst=True,
+                     stdout=StringIO())
+
+    def test_enqueue_and_run(self):
+        """test due jobs are run once and their result kept"""
+        job = jobs.enqueue("tests.record", value=3)
+        later = jobs.enqueue("tests.record", delay=60, value=4)
+        self.run_workers()
+        self.run_workers()
+        job.refresh_from_db()
+        self.assertEqual(calls, [3])
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, '{"value": 3}')
+        self.assertEqual(job.attempts, 1)
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    def test_unknown_task_rejected(self):
+        """test only registered tasks can be queued"""
+        with self.assertRaises(KeyError):
+            jobs.enqueue("tests.missing")
+
+    def test_retry_with_backoff_then_fail(self):
+        """test a failing job is retried later, then marked failed"""
+        job = jobs.enqueue("tests.broken")
+        with patch("core.jobs.random.uniform", return_value=1):
+            self.run_workers()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        delay = (job.run_at - timezone.now()).total_seconds()
+        self.assertAlmostEqual(delay, 10, delta=1)
+        self.assertIn("ValueError: no luck", job.error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.run_workers()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_is_capped(self):
+        """test retry delays double up to the maximum"""
+        with patch("core.jobs.random.uniform", return_value=1):
+            self.assertEqual(jobs.backoff(3), 40)
+            self.assertEqual(jobs.backoff(30), 3600)
+
+    def test_stale_jobs_requeued(self):
+        """test a job left running by a lost worker is run again"""
+        job = jobs.enqueue("tests.record", value=1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING,
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+        self.run_workers()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(calls, [1])
+
+    def test_stale_job_out_of_attempts_fails(self):
+        """test a job that keeps losing its worker is not run again"""
+        job = jobs.enqueue("tests.record", value=1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING,
+            attempts=job.max_attempts,
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+        self.run_workers()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, [])
+
+    def test_sigterm_lets_running_job_finish(self):
+        """test a single worker stops between jobs on SIGTERM"""
+        first = jobs.enqueue("tests.terminate")
+        second = jobs.enqueue("tests.record", value=2)
+        handler = signal.getsignal(signal.SIGTERM)
+        self.run_workers()
+        self.assertIs(signal.getsignal(signal.SIGTERM), handler)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, Job.DONE)
+        self.assertEqual(second.status, Job.QUEUED)
+        self.assertEqual(calls, ["terminated"])
+
+
+class JobApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_job_status(self):
+        """test users see their own jobs, errors without the stack"""
+        job = jobs.enqueue("tests.broken", user=self.user)
+        jobs.run(jobs.claim("test"))
+        res = self.client.get(job_url(job.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["status"], Job.QUEUED)
+        self.assertEqual(res.data["error"], "ValueError: no luck")
+
+        other = get_user_model().objects.create_user(
+            "other@dummy.com", "dummy123"
+        )
+        self.client.force_authenticate(other)
+        res = self.client.get(job_url(job.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics(self):
+        """test queue metrics are reported to staff only"""
+        url = reverse("core:job-metrics")
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        job = jobs.enqueue("tests.record", value=1)
+        Job.objects.filter(pk=job.pk).update(
+            run_at=timezone.now() - timedelta(seconds=30)
+        )
+        jobs.enqueue("tests.record", value=2)
+        jobs.run(jobs.claim("test"))
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(url)
+        self.assertEqual(res.data["counts"][Job.DONE], 1)
+        self.assertEqual(res.data["counts"][Job.QUEUED], 1)
+        self.assertEqual(res.data["done_last_hour"], 1)
+        self.assertLess(res.data["lag_seconds"], 30)
+        self.assertEqual(res.data["queued_by_task"], {"tests.record": 1})
@@ -0,0 +1,74 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.load_shedding import monitor, shed_probability
+
+
+TAGS_URL = reverse("recipe:tag-list")
+
+
+@override_settings(LOAD_SHED_DB_LATENCY=0.1)
+class LoadSheddingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        monitor.reset()
+        self.addCleanup(monitor.reset)
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def saturate(self, seconds):
+        for _ in range(200):
+            monitor.observe(seconds)
+
+    def test_requests_feed_the_monitor(self):
+        """test statements run by a request are measured"""
+        with patch.object(monitor, "observe") as observe:
+            self.client.get(TAGS_URL)
+        self.assertTrue(observe.called)
+
+    def test_writes_shed_before_reads(self):
+        """test writes are turned away first, with Retry-After"""
+        self.saturate(0.2)
+        self.assertAlmostEqual(shed_probability("POST"), 1.0, places=3)
+        self.assertEqual(shed_probability("GET"), 0.0)
+
+        with patch("core.load_shedding.random.random", return_value=0.99):
+            res = self.client.post(TAGS_URL, {"name": "Vegan"})
+            self.assertEqual(res.status_code,
+                             status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(res["Retry-After"], "5")
+            res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_shedding_is_gradual(self):
+        """test the shed share grows with the latency"""
+        self.saturate(0.15)
+        self.assertAlmostEqual(shed_probability("POST"), 0.5, places=2)
+        self.saturate(0.4)
+        self.assertAlmostEqual(shed_probability("GET"), 1.0)
+
+    @override_settings(LOAD_SHED_HALF_LIFE=5)
+    def test_recovers_when_idle(self):
+        """test the average decays while nothing is measured"""
+        self.saturate(0.4)
+        with patch("core.load_shedding.time.monotonic",
+                   return_value=monitor._at + 10):
+            self.assertAlmostEqual(monitor.average(), 0.1, places=2)
+
+    @override_settings(LOAD_SHED_DB_LATENCY=0)
+    def test_disabled(self):
+        """test a zero threshold never sheds"""
+        self.saturate(10)
+        self.assertEqual(shed_probability("POST"), 0.0)
@@ -0,0 +1,140 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """migrate to `migrate_from`, let setUpBeforeMigration create rows with
+    the historical models, then migrate to `migrate_to`
+    """
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate([self.migrate_from])
+        executor.loader.build_graph()
+        self.setUpBeforeMigration(
+            executor.loader.project_state([self.migrate_from]).apps
+        )
+        executor.migrate([self.migrate_to])
+        executor.loader.build_graph()
+        self.apps = executor.loader.project_state([self.migrate_to]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def setUpBeforeMigration(self, apps):
+        pass
+
+
+class CatalogBackfillTests(MigrationTestCase):
+    migrate_from = ("core", "0015_admin_search_indexes")
+    migrate_to = ("core", "0016_catalog")
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model("core", "User")
+        Tag = apps.get_model("core", "Tag")
+        user = User.objects.create(email="test@dummy.com", password="x")
+        self.vegan = Tag.objects.create(user=user, name="Vegan ")
+        self.long = Tag.objects.create(user=user, name="ß" * 255)
+
+    def test_rows_linked(self):
+        """test every row gets its entry, long folded names cut to fit"""
+        Tag = self.apps.get_model("core", "Tag")
+        linked = dict(Tag.objects.values_list("pk", "catalog__normalized"))
+        self.assertEqual(linked, {
+            self.vegan.pk: "vegan",
+            self.long.pk: "s" * 255,
+        })
+
+
+class MergeDuplicateAttrsTests(MigrationTestCase):
+    migrate_from = ("core", "0016_catalog")
+    migrate_to = ("core", "0017_merge_duplicate_attrs")
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model("core", "User")
+        Tag = apps.get_model("core", "Tag")
+        CatalogTag = apps.get_model("core", "CatalogTag")
+        Recipe = apps.get_model("core", "Recipe")
+        user = User.objects.create(email="test@dummy.com", password="x")
+        vegan = CatalogTag.objects.create(name="Vegan", normalized="vegan")
+        self.kept = Tag.objects.create(user=user, name="Vegan", catalog=vegan)
+        self.dupe = Tag.objects.create(user=user, name="vegan", catalog=vegan)
+        self.recipe = Recipe.objects.create(
+            user=user, title="Dal", time_minute=5, price=1
+        )
+        self.recipe.tags.add(self.dupe)
+
+    def test_duplicates_merged_before_constraint(self):
+        """test duplicates are folded into one row that keeps the links,
+        and the unique constraint is in place afterwards
+        """
+        Tag = self.apps.get_model("core", "Tag")
+        Recipe = self.apps.get_model("core", "Recipe")
+        SyncTombstone = self.apps.get_model("core", "SyncTombstone")
+        self.assertEqual(
+            list(Tag.objects.values_list("pk", flat=True)), [self.kept.pk]
+        )
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(
+            list(recipe.tags.values_list("pk", flat=True)), [self.kept.pk]
+        )
+        self.assertEqual(Tag.objects.get().recipe_count, 1)
+        self.assertTrue(
+            SyncTombstone.objects.filter(object_id=self.dupe.pk).exists()
+        )
+        kept = Tag.objects.get()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(
+                user_id=kept.user_id, name="VEGAN", catalog_id=kept.catalog_id
+            )
+
+
+class CopyLegacyTokensTests(MigrationTestCase):
+    migrate_from = ("core", "0008_recipe_image")
+    migrate_to = ("core", "0009_authtoken")
+
+    def setUpBeforeMigration(self, apps):
+        # authtoken is no dependency of 0008, its table is there though
+        from rest_framework.authtoken.models import Token
+        User = apps.get_model("core", "User")
+        for i in range(3):
+            user = User.objects.create(email=f"{i}@dummy.com", password="x")
+            Token.objects.create(key=str(i) * 40, user_id=user.pk)
+
+    def test_tokens_copied(self):
+        """test every legacy token gets an expiring copy"""
+        AuthToken = self.apps.get_model("core", "AuthToken")
+        self.assertEqual(
+            sorted(AuthToken.objects.values_list("key", "device")),
+            [(str(i) * 40, "") for i in range(3)]
+        )
+        self.assertFalse(AuthToken.objects.filter(expires=None).exists())
+
+
+class DropLegacyTokensTests(MigrationTestCase):
+    migrate_from = ("core", "0020_job")
+    migrate_to = ("core", "0021_drop_legacy_tokens")
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model("core", "User")
+        Token = apps.get_model("authtoken", "Token")
+        AuthToken = apps.get_model("core", "AuthToken")
+        user = User.objects.create(email="test@dummy.com", password="x")
+        other = User.objects.create(email="other@dummy.com", password="x")
+        Token.objects.create(key="a" * 40, user=user)
+        AuthToken.objects.create(
+            key="a" * 40, user=user, expires="2030-01-01T00:00Z"
+        )
+        Token.objects.create(key="b" * 40, user=other)
+
+    def test_copied_tokens_dropped(self):
+        """test the legacy tokens already in core.AuthToken are deleted"""
+        Token = self.apps.get_model("authtoken", "Token")
+        self.assertEqual(
+            list(Token.objects.values_list("key", flat=True)), ["b" * 40]
+        )
@@ -1,6 +1,9 @@
+import threading
+import time
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 
 from core import models
@@ -77,3 +80,39 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, "my_image.jpg")
         exp_path = f"uploads/recipe/{uuid}.jpg"
         self.assertEqual(file_path, exp_path)
+
+
+class AuthTokenTests(TransactionTestCase):
+
+    def test_rotate_racing_logins(self):
+        """test logins rotating one device's token at once both succeed"""
+        user = sample_user()
+        inserted = threading.Event()
+        keys = []
+
+        def first():
+            try:
+                with transaction.atomic():
+                    keys.append(models.AuthToken.objects.rotate(user).key)
+                    inserted.set()
+                    time.sleep(0.2)
+            finally:
+                connection.close()
+
+        def second():
+            inserted.wait()
+            try:
+                keys.append(models.AuthToken.objects.rotate(user).key)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=f) for f in (first, second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(
+            list(user.auth_tokens.values_list("key", flat=True)), keys[1:]
+        )
@@ -0,0 +1,183 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import query_log
+from core.models import Recipe
+
+
+QUERIES_URL = reverse("core:query-stats")
+
+
+class FingerprintTests(TestCase):
+
+    def test_literals_normalized(self):
+        """test literals, parameters and comments do not split shapes"""
+        self.assertEqual(
+            query_log.fingerprint(
+                "SELECT * FROM t WHERE a = 'it''s' AND b > 10.5 "
+                "/* origin='X.list' */"
+            ),
+            "SELECT * FROM t WHERE a = ? AND b > ?"
+        )
+        self.assertEqual(
+            query_log.fingerprint('SELECT "t"."id2" FROM t WHERE id = %s'),
+            'SELECT "t"."id2" FROM t WHERE id = ?'
+        )
+
+    def test_in_lists_folded(self):
+        """test IN lists of any length share a fingerprint"""
+        self.assertEqual(
+            query_log.fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s, %s)"),
+            query_log.fingerprint("SELECT 1 FROM t WHERE id IN (7)")
+        )
+
+    def test_histogram_and_overflow(self):
+        """test latencies land in buckets and excess shapes are pooled"""
+        stats = query_log.QueryStats()
+        with self.settings(QUERY_STATS_MAX_FINGERPRINTS=1):
+            stats.record("SELECT 1 FROM a", 0.003, "A.list")
+            stats.record("SELECT 2 FROM a", 3, None)
+            stats.record("SELECT 1 FROM b", 0.2, None)
+        entries = stats.snapshot()
+        self.assertEqual(
+            sorted(entries), [query_log.OTHER, "SELECT ? FROM a"]
+        )
+        entry = entries["SELECT ? FROM a"]
+        self.assertEqual(entry["count"], 2)
+        self.assertEqual(entry["histogram"][1], 1)
+        self.assertEqual(entry["histogram"][-1], 1)
+        self.assertEqual(entry["origins"], {"A.list": 1, "-": 1})
+        rows = query_log.report(entries)
+        self.assertEqual(rows[0]["p95_ms"], 3000)
+
+
+class QueryLogTests(TestCase):
+
+    def setUp(self):
+        query_log.reset()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user, title="Dal", time_minute=5, price=1
+        )
+
+    def test_queries_tagged_with_view(self):
+        """test statements carry the viewset action they ran for"""
+        executed = []
+
+        def capture(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            self.client.get(reverse("recipe:recipe-list"))
+        tagged = [sql for sql in executed if "core_recipe" in sql]
+        self.assertTrue(tagged)
+        for sql in tagged:
+            self.assertIn("/* origin='RecipeViewSet.list' */", sql)
+        self.assertIsNone(query_log.get_origin())
+
+    def test_streamed_export_tagged(self):
+        """test statements run while streaming carry the view's origin"""
+        executed = []
+
+        def capture(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            res = self.client.get(reverse("recipe:recipe-export"))
+            b"".join(res.streaming_content)
+        tagged = [sql for sql in executed if "core_recipe" in sql]
+        self.assertTrue(tagged)
+        for sql in tagged:
+            self.assertIn("/* origin='RecipeViewSet.export' */", sql)
+        self.assertIsNone(query_log.get_origin())
+
+    def test_origin_sanitized(self):
+        """test an origin cannot close the SQL comment"""
+        query_log.set_origin("X*/ DROP TABLE t; /*")
+        self.assertEqual(query_log.get_origin(), "XDROPTABLEt")
+        query_log.set_origin(None)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_slow_queries_logged(self):
+        """test slow statements are logged as JSON lines"""
+        with self.assertLogs("core.slow_queries") as logs:
+            self.client.get(reverse("recipe:recipe-list"))
+        entries = [json.loads(line.split(":", 2)[2]) for line in logs.output]
+        origins = {entry["origin"] for entry in entries}
+        self.assertIn("RecipeViewSet.list", origins)
+        self.assertEqual(entries[0]["event"], "slow_query")
+        self.assertEqual(entries[0]["database"], "default")
+
+    def test_stats_staff_only(self):
+        """test statistics per fingerprint are reported to staff only"""
+        res = self.client.get(QUERIES_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.get(reverse("recipe:recipe-list"))
+        self.client.get(reverse("recipe:recipe-list"))
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(QUERIES_URL, {"sort": "count", "limit": 50})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        listed = [
+            row for row in res.data
+            if "RecipeViewSet.list" in row["origins"]
+            and 'FROM "core_recipe"' in row["fingerprint"]
+        ]
+        self.assertEqual(listed[0]["origins"]["RecipeViewSet.list"], 2)
+        self.assertEqual(sum(listed[0]["histogram"].values()),
+                         listed[0]["count"])
+
+    def test_processes_merged(self):
+        """test statistics published by other workers are summed in"""
+        query_log.stats.record("SELECT 1", 0.001, "A.list")
+        query_log.publish(query_log.stats.snapshot())
+        other = query_log.QueryStats()
+        other.record("SELECT 2", 0.002, "B.list")
+        query_log.cache.set("query-stats:other:1", other.snapshot())
+        query_log.cache.set(
+            query_log.PROCESSES_KEY,
+            query_log.cache.get(query_log.PROCESSES_KEY)
+            + ["query-stats:other:1", "query-stats:gone:2"]
+        )
+        merged = query_log.collect()
+        self.assertEqual(merged["SELECT ?"]["count"], 2)
+        self.assertEqual(
+            merged["SELECT ?"]["origins"], {"A.list": 1, "B.list": 1}
+        )
+        self.assertNotIn(
+            "query-stats:gone:2",
+            query_log.cache.get(query_log.PROCESSES_KEY)
+        )
+
+    def test_stats_read_by_other_process(self):
+        """test query_report in its own process sees what this one published"""
+        query_log.stats.record("SELECT 1 FROM published", 0.001, "A.list")
+        query_log.publish(query_log.stats.snapshot())
+        report = subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, "manage.py"),
+             "query_report", "--json", "--top", "1000"],
+            stdout=subprocess.PIPE, check=True
+        )
+        rows = {row["fingerprint"]: row for row in json.loads(report.stdout)}
+        self.assertEqual(
+            rows["SELECT ? FROM published"]["origins"], {"A.list": 1}
+        )
@@ -0,0 +1,148 @@
+import warnings
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.throttling import IPRateThrottle, TokenBucketThrottle
+
+
+TAGS_URL = reverse("recipe:tag-list")
+BATCH_URL = reverse("recipe:recipe-batch")
+CREATE_USER_URL = reverse("users:create")
+
+RATES = {
+    "user_read": "3/min",
+    "user_write": "2/min",
+    "user_upload": "1/hour",
+    "ip_read": "100/min",
+    "ip_write": "2/min",
+    "ip_upload": "100/hour",
+}
+
+
+@patch.object(TokenBucketThrottle, "THROTTLE_RATES", RATES)
+class TokenBucketThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        timer = patch.object(
+            TokenBucketThrottle, "timer", lambda throttle: self.now
+        )
+        timer.start()
+        self.addCleanup(timer.stop)
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_burst_then_refill(self):
+        """test a full bucket allows a burst and refills over time"""
+        for _ in range(3):
+            res = self.client.get(TAGS_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "20")
+
+        self.now += 20
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_scopes_are_separate(self):
+        """test reads, writes and uploads draw from their own buckets"""
+        for name in ("a", "b"):
+            self.client.post(TAGS_URL, {"name": name})
+        res = self.client.post(TAGS_URL, {"name": "c"})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # the batch POST is a read
+        res = self.client.post(BATCH_URL, {"ids": [1]}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        recipe = Recipe.objects.create(
+            user=self.user, title="Dal", time_minute=5, price=1
+        )
+        url = reverse("recipe:recipe-upload-image", args=[recipe.id])
+        res = self.client.post(url, {"image": "notimage"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(url, {"image": "notimage"})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_users_have_own_buckets(self):
+        """test one user's writes don't count against another's"""
+        for name in ("a", "b", "c"):
+            self.client.post(TAGS_URL, {"name": name})
+        other = get_user_model().objects.create_user(
+            "other@dummy.com", "dummy123"
+        )
+        self.client.force_authenticate(other)
+        with patch.object(IPRateThrottle, "get_ident", lambda *a: "1.2.3.4"):
+            res = self.client.post(TAGS_URL, {"name": "a"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_signup_limited_per_ip(self):
+        """test anonymous signups are throttled per client IP"""
+        client = APIClient()
+        for i in range(2):
+            client.post(CREATE_USER_URL, {
+                "email": f"new{i}@dummy.com", "password": "dummy123",
+                "name": "new"
+            })
+        res = client.post(CREATE_USER_URL, {
+            "email": "new2@dummy.com", "password": "dummy123", "name": "new"
+        })
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_ignored(self):
+        """test a spoofed X-Forwarded-For neither gets a fresh bucket nor,
+        however long, breaks the cache key
+        """
+        client = APIClient()
+        with warnings.catch_warnings():
+            # what memcached raises on, other backends only warn about
+            warnings.simplefilter("error", CacheKeyWarning)
+            for i in range(3):
+                res = client.post(CREATE_USER_URL, {
+                    "email": f"new{i}@dummy.com", "password": "dummy123",
+                    "name": "new"
+                }, HTTP_X_FORWARDED_FOR=f"10.0.0.{i}, " + "1" * 300)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_racing_requests_share_no_token(self):
+        """test a request beaten to the last token between its read and
+        its write is refused
+        """
+        def bucket():
+            throttle = IPRateThrottle()
+            throttle.key, throttle.now = "throttle_race", self.now
+            throttle.num_requests, throttle.duration = 2, 60
+            return throttle
+
+        first, racing, rival = bucket(), bucket(), bucket()
+        self.assertIsNone(first.take_token())
+        get = cache.get
+        raced = []
+
+        def get_then_race(key, default=None):
+            value = get(key, default)
+            if not raced:
+                raced.append(None)
+                raced[0] = rival.take_token()
+            return value
+
+        with patch.object(cache, "get", get_then_race):
+            waited = racing.take_token()
+        self.assertIsNone(raced[0])
+        self.assertEqual(waited, 30)
@@ -0,0 +1,127 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+
+def request_kind(request, view):
+    """the throttle scope suffix of a request: read, write or upload"""
+    if getattr(view, "action", None) in getattr(view, "upload_actions", ()):
+        return "upload"
+    is_read = getattr(view, "_is_read", None)
+    if is_read is not None:
+        # viewset actions like batch are reads whatever their method
+        return "read" if is_read(request) else "write"
+    return "read" if request.method in SAFE_METHODS else "write"
+
+
+def ident_digest(ident):
+    """an ident as it goes into a cache key: hashed, as idents are client
+    supplied (forwarded-for headers, emails) and may be long or hold
+    characters memcached keys can't
+    """
+    return hashlib.sha1(str(ident).encode()).hexdigest()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """token bucket per scope and ident: bursts of up to N requests,
+    refilled at N per period for a rate of "N/period"
+
+    Kept as a single theoretical arrival time per bucket (GCRA) in the
+    THROTTLE_CACHE, so every worker draws from the same bucket. The time
+    only moves by compare-and-set (see take_token), so concurrent
+    requests never spend the same token.
+    """
+    scope_prefix = None
+    # seconds a claimed step "<bucket>@<time>" is kept for the requests
+    # that raced for it, and how often one request races before giving up
+    step_timeout = 10
+    max_attempts = 8
+
+    def __init__(self):
+        # the scope, and so the rate, depends on the request
+        self.cache = caches[settings.THROTTLE_CACHE]
+
+    def get_ident_for(self, request):
+        raise NotImplementedError(".get_ident_for() must be overridden")
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_for(request)
+        if ident is None:
+            return None
+        return self.cache_format % {
+            "scope": self.scope, "ident": ident_digest(ident)
+        }
+
+    def allow_request(self, request, view):
+        self.scope = f"{self.scope_prefix}_{request_kind(request, view)}"
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        self.retry_in = self.take_token()
+        return self.retry_in is None
+
+    def take_token(self):
+        """one GCRA step; None if a token was taken, or the seconds until
+        one is free
+
+        The cache has no compare-and-set, but add is atomic: moving the
+        bucket from time t is done by adding the key "<bucket>@t", which
+        only one request can do. Requests that lose follow that key to
+        the time it moved to and try again from there.
+        """
+        interval = self.duration / self.num_requests
+        burst = self.duration - interval
+        arrival = self.cache.get(self.key)
+        for _ in range(self.max_attempts):
+            start = self.now if arrival is None else max(arrival, self.now)
+            if start - self.now > burst:
+                return start - self.now - burst
+            if arrival is None:
+                step = self.key
+                taken = self.cache.add(
+                    step, start + interval, self.duration
+                )
+            else:
+                step = f"{self.key}@{arrival!r}"
+                taken = self.cache.add(
+                    step, start + interval, self.step_timeout
+                )
+                if taken:
+                    self.cache.set(self.key, start + interval, self.duration)
+            if taken:
+                return None
+            arrival = self.cache.get(step)
+            if arrival is None:
+                arrival = self.cache.get(self.key)
+        # lost every race: the bucket is that busy, so it is likely empty
+        return interval
+
+    def wait(self):
+        return self.retry_in
+
+
+class UserRateThrottle(TokenBucketThrottle):
+    """one bucket per authenticated user and kind of request"""
+    scope_prefix = "user"
+
+    def get_ident_for(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPRateThrottle(TokenBucketThrottle):
+    """one bucket per client IP and kind of request, signed in or not"""
+    scope_prefix = "ip"
+
+    def get_ident_for(self, request):
+        return self.get_ident(request)
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from core import views
+
+
+app_name = "core"
+
+urlpatterns = [
+    path("jobs/metrics/", views.JobMetricsView.as_view(), name="job-metrics"),
+    path("jobs/<int:pk>/", views.JobView.as_view(), name="job-detail"),
+    path("queries/", views.QueryStatsView.as_view(), name="query-stats"),
+]
@@ -0,0 +1,52 @@
+from rest_framework import generics
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import jobs, query_log
+from core.authentication import ExpiringTokenAuthentication
+from core.models import Job
+from core.serializers import (
+    JobMetricsSerializer, JobSerializer, QueryReportParamsSerializer
+)
+
+
+class JobView(generics.RetrieveAPIView):
+    """status of one of the authenticated user's background jobs
+
+    Read from the primary: a replica could still show a finished job as
+    queued.
+    """
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+
+class JobMetricsView(generics.RetrieveAPIView):
+    """queue depth, lag and throughput of the background jobs"""
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+    serializer_class = JobMetricsSerializer
+
+    def get_object(self):
+        return jobs.metrics()
+
+
+class QueryStatsView(APIView):
+    """statement counts and latency histograms per fingerprint, summed
+    over the processes that published them
+    """
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        params = QueryReportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(query_log.report(
+            query_log.collect(),
+            order=params.validated_data["sort"],
+            limit=params.validated_data["limit"]
+        ))
@@ -0,0 +1,29 @@
+"""gunicorn settings: `gunicorn -c gunicorn.conf.py app.wsgi`
+
+With GUNICORN_WORKER_CLASS=gevent every worker is an event loop. A
+request waiting on postgres (psycopg2 is made cooperative below) or on a
+slow client no longer holds the worker, so one process serves up to
+GUNICORN_WORKER_CONNECTIONS requests at once. Use
+`manage.py bench_concurrency` to compare it with the sync workers.
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+# every in-flight request holds its own database connection, so this is
+# also the per-worker share of postgres' max_connections
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 50))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# the app must be imported after the gevent worker monkey-patches
+preload_app = False
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
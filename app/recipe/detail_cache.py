@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _key(recipe_id):
+    return f"recipe-detail:{recipe_id}"
+
+
+def _stamp(recipe):
+    """what a cached payload must match to be served for this row
+
+    updated_at moves on every save and on link changes (see
+    core.signals), so most writes make old entries unreachable even in
+    other processes; tag/ingredient renames are invalidated explicitly.
+    """
+    return recipe.version, recipe.updated_at
+
+
+class LocalLRU:
+    """bounded per-process tier in front of the shared cache
+
+    Entries expire after RECIPE_CACHE_LOCAL_TTL seconds, which bounds
+    how long another process's invalidation can go unnoticed here.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_stamp, payload, expires = entry
+            if entry_stamp != stamp or expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, stamp, payload):
+        expires = time.monotonic() + settings.RECIPE_CACHE_LOCAL_TTL
+        with self._lock:
+            self._entries[key] = (stamp, payload, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.RECIPE_CACHE_LOCAL_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local = LocalLRU()
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _shared_get(key, stamp):
+    entry = cache.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    return None
+
+
+def _build_shared(key, stamp, build):
+    """build once per cluster: other processes wait for the shared copy"""
+    lock_key = key + ":building"
+    wait = settings.RECIPE_CACHE_BUILD_WAIT
+    if not cache.add(lock_key, True, timeout=max(1, int(wait * 2))):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            payload = _shared_get(key, stamp)
+            if payload is not None:
+                return payload
+        # the builder is slow or gone, don't keep the request waiting
+        lock_key = None
+    try:
+        payload = build()
+        cache.set(key, (stamp, payload), settings.RECIPE_CACHE_TIMEOUT)
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+    return payload
+
+
+def get_or_build(recipe, build):
+    """return the cached detail payload of a recipe, building it on a miss
+
+    Concurrent misses for the same recipe and stamp share one build:
+    threads of a process wait on the leading thread, processes wait on
+    the one holding the build lock in the shared cache.
+    """
+    key = _key(recipe.pk)
+    stamp = _stamp(recipe)
+    payload = local.get(key, stamp)
+    if payload is not None:
+        return payload
+    payload = _shared_get(key, stamp)
+    if payload is not None:
+        local.set(key, stamp, payload)
+        return payload
+
+    with _flights_lock:
+        flight = _flights.get((key, stamp))
+        leader = flight is None
+        if leader:
+            flight = _flights[(key, stamp)] = threading.Event()
+    if not leader:
+        flight.wait(settings.RECIPE_CACHE_BUILD_WAIT)
+        payload = local.get(key, stamp)
+        return payload if payload is not None else build()
+    try:
+        payload = _build_shared(key, stamp, build)
+        local.set(key, stamp, payload)
+    finally:
+        with _flights_lock:
+            del _flights[(key, stamp)]
+        flight.set()
+    return payload
+
+
+def invalidate(recipe_ids):
+    """drop the cached payloads of the given recipes"""
+    keys = [_key(pk) for pk in recipe_ids]
+    for key in keys:
+        local.delete(key)
+    if keys:
+        cache.delete_many(keys)
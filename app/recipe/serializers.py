@@ -1,14 +1,76 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.utils import html
 from core.models import Tag, Ingredient, Recipe
 
 
+class OwnedPrimaryKeysField(serializers.Field):
+    """list of primary keys of objects owned by the requesting user
+
+    Unlike PrimaryKeyRelatedField(many=True), which runs one query per
+    submitted id, every id is checked in a single query.
+    """
+    default_error_messages = {
+        "not_a_list": _("Expected a list of items but got type "
+                        "\"{input_type}\"."),
+        "incorrect_type": _("Incorrect type. Expected pk value, received "
+                            "{data_type}."),
+        "does_not_exist": _("Invalid pk \"{pk_value}\" - object does not "
+                            "exist."),
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def get_value(self, dictionary):
+        if html.is_html_input(dictionary):
+            if self.field_name not in dictionary:
+                if getattr(self.root, "partial", False):
+                    return empty
+            return dictionary.getlist(self.field_name)
+        return dictionary.get(self.field_name, empty)
+
+    def to_internal_value(self, data):
+        if isinstance(data, (str, dict)) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        pks = []
+        for item in data:
+            if isinstance(item, bool):
+                self.fail("incorrect_type", data_type=type(item).__name__)
+            try:
+                pks.append(int(item))
+            except (TypeError, ValueError):
+                self.fail("incorrect_type", data_type=type(item).__name__)
+        pks = list(dict.fromkeys(pks))
+        if not pks:
+            return pks
+        found = set(
+            self.queryset.filter(
+                user=self.context["request"].user,
+                pk__in=pks
+            ).values_list("pk", flat=True)
+        )
+        for pk in pks:
+            if pk not in found:
+                self.fail("does_not_exist", pk_value=pk)
+        return pks
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
+
+
 class TagSerializer(serializers.ModelSerializer):
     """serializer for tag object"""
 
     class Meta:
         model = Tag
-        fields = ["id", "name"]
-        read_only_fields = ["id"]
+        fields = ["id", "name", "recipe_count"]
+        read_only_fields = ["id", "recipe_count"]
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -16,33 +78,140 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
+        fields = ["id", "name", "recipe_count"]
+        read_only_fields = ["id", "recipe_count"]
+
+
+class LinkedTagSerializer(TagSerializer):
+    """a tag nested in a recipe payload
+
+    recipe_count is left out: it moves when other recipes are linked,
+    which doesn't change the stamp recipe payloads are cached under.
+    """
+
+    class Meta(TagSerializer.Meta):
         fields = ["id", "name"]
-        read_only_fields = ["id"]
+
+
+class LinkedIngredientSerializer(IngredientSerializer):
+    """an ingredient nested in a recipe payload, see LinkedTagSerializer"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = ["id", "name"]
+
+
+class AttrListParamsSerializer(serializers.Serializer):
+    """query parameters of the tag and ingredient lists"""
+    assigned_only = serializers.BooleanField(default=False)
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """serializer for recipe object"""
-    ingredients = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Ingredient.objects.all()
-    )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
-    )
+    ingredients = OwnedPrimaryKeysField(queryset=Ingredient.objects.all())
+    tags = OwnedPrimaryKeysField(queryset=Tag.objects.all())
 
     class Meta:
         model = Recipe
         fields = [
             "id", "title", "price", "link", "time_minute",
-            "tags", "ingredients"]
-        read_only_fields = ["id"]
+            "tags", "ingredients", "version"]
+        read_only_fields = ["id", "version"]
+
+    m2m_fields = ("tags", "ingredients")
+
+    def _set_links(self, recipe, name, pks, created):
+        """diff the links of one m2m field and apply them in bulk
+
+        Sends the same m2m_changed signals as the related manager would.
+        """
+        field = Recipe._meta.get_field(name)
+        through = field.remote_field.through
+        source = field.m2m_field_name() + "_id"
+        target = field.m2m_reverse_field_name() + "_id"
+        links = through.objects.filter(**{source: recipe.pk})
+        current = set() if created else set(
+            links.values_list(target, flat=True)
+        )
+        removed = current.difference(pks)
+        added = [pk for pk in pks if pk not in current]
+        signal = dict(
+            sender=through, instance=recipe, reverse=False,
+            model=field.related_model, using=links.db
+        )
+        if removed:
+            m2m_changed.send(action="pre_remove", pk_set=removed, **signal)
+            links.filter(**{target + "__in": removed}).delete()
+            m2m_changed.send(action="post_remove", pk_set=removed, **signal)
+        if added:
+            m2m_changed.send(action="pre_add", pk_set=set(added), **signal)
+            through.objects.bulk_create([
+                through(**{source: recipe.pk, target: pk}) for pk in added
+            ])
+            m2m_changed.send(action="post_add", pk_set=set(added), **signal)
+
+    def _pop_links(self, validated_data):
+        return {
+            name: validated_data.pop(name)
+            for name in self.m2m_fields if name in validated_data
+        }
+
+    def create(self, validated_data):
+        """create a recipe and its tag/ingredient links in one transaction"""
+        links = self._pop_links(validated_data)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            for name, pks in links.items():
+                self._set_links(recipe, name, pks, created=True)
+        return recipe
+
+    def update(self, instance, validated_data):
+        """update a recipe and diff its tag/ingredient links
+
+        The row is written as the next version; when `expected_version`
+        (from If-Match) is given the write only happens if the row is
+        still at that version, VersionConflict is raised otherwise.
+        """
+        links = self._pop_links(validated_data)
+        expected_version = validated_data.pop("expected_version", None)
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save_version(expected_version)
+            for name, pks in links.items():
+                self._set_links(instance, name, pks, created=False)
+        return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """serializer for recipe object with detail"""
-    ingredients = IngredientSerializer(many=True, read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    ingredients = LinkedIngredientSerializer(many=True, read_only=True)
+    tags = LinkedTagSerializer(many=True, read_only=True)
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """ids requested from the batch endpoint"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_MAX_IDS
+    )
+
+
+class SimilarRecipeSerializer(RecipeDetailSerializer):
+    """a recipe with its similarity to the requested one"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeDetailSerializer.Meta):
+        fields = RecipeDetailSerializer.Meta.fields + ["similarity"]
+
+
+class SimilarParamsSerializer(serializers.Serializer):
+    """query parameters of the similar recipes endpoint"""
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.RECIPE_SIMILAR_MAX_LIMIT,
+        default=settings.RECIPE_SIMILAR_LIMIT
+    )
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
@@ -50,5 +219,51 @@ class RecipeImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ["id", "image"]
-        read_only_fields = ["id"]
+        fields = ["id", "image", "version"]
+        read_only_fields = ["id", "version"]
+        # the model allows no image, an upload doesn't
+        extra_kwargs = {"image": {"required": True}}
+
+    def update(self, instance, validated_data):
+        """store the image as the next version of the recipe, see
+        RecipeSerializer.update
+        """
+        expected_version = validated_data.pop("expected_version", None)
+        instance.image = validated_data["image"]
+        instance.save_version(expected_version)
+        return instance
+
+
+class AttrUsageSerializer(serializers.Serializer):
+    """a tag or ingredient with the number of recipes using it"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """serializer for the per-user recipe statistics"""
+    recipe_count = serializers.IntegerField()
+    average_price = serializers.DecimalField(
+        max_digits=14, decimal_places=2, allow_null=True
+    )
+    average_time_minute = serializers.FloatField(allow_null=True)
+    recipes_per_tag = AttrUsageSerializer(many=True)
+    top_ingredients = AttrUsageSerializer(many=True)
+
+
+class SyncDeletedSerializer(serializers.Serializer):
+    """ids removed since the previous sync, per collection"""
+    recipes = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = serializers.ListField(child=serializers.IntegerField())
+
+
+class SyncSerializer(serializers.Serializer):
+    """serializer for a delta sync page"""
+    recipes = RecipeSerializer(many=True)
+    tags = TagSerializer(many=True)
+    ingredients = IngredientSerializer(many=True)
+    deleted = SyncDeletedSerializer()
+    sync_token = serializers.CharField()
+    has_more = serializers.BooleanField()
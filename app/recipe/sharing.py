@@ -0,0 +1,77 @@
+import secrets
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Recipe
+
+
+def new_slug():
+    """return an unguessable slug for a share link"""
+    return secrets.token_urlsafe(16)
+
+
+def surrogate_keys(recipe_id):
+    """cache tags attached to a shared recipe response"""
+    return [f"recipe-{recipe_id}"]
+
+
+def render_snapshot(recipe):
+    """render the public payload of a recipe once, at write time"""
+    # imported here: recipe.signals loads this module at app ready, and
+    # commands that never save a shared recipe shouldn't pay for DRF
+    from rest_framework.renderers import JSONRenderer
+    from recipe.serializers import RecipeDetailSerializer
+
+    data = RecipeDetailSerializer(recipe).data
+    return JSONRenderer().render(data).decode()
+
+
+def purge(keys):
+    """ask the edge cache to drop responses tagged with the keys"""
+    if keys and settings.SURROGATE_KEY_PURGER:
+        import_string(settings.SURROGATE_KEY_PURGER)(keys)
+
+
+def refresh(recipe_ids):
+    """re-render the snapshots of the shared recipes among the ids"""
+    recipes = Recipe.objects.filter(
+        pk__in=recipe_ids, share_slug__isnull=False
+    ).prefetch_related("tags", "ingredients")
+    keys = []
+    for recipe in recipes:
+        Recipe.objects.filter(pk=recipe.pk).update(
+            shared_snapshot=render_snapshot(recipe)
+        )
+        keys.extend(surrogate_keys(recipe.pk))
+    purge(keys)
+
+
+def share(recipe):
+    """publish a recipe, returning its slug"""
+    if not recipe.share_slug:
+        recipe.share_slug = new_slug()
+        recipe.shared_snapshot = render_snapshot(recipe)
+        # who can see it changed: updated_at tells the similarity index
+        recipe.updated_at = timezone.now()
+        # update() rather than save(): no signals, no second render
+        Recipe.objects.filter(pk=recipe.pk).update(
+            share_slug=recipe.share_slug,
+            shared_snapshot=recipe.shared_snapshot,
+            updated_at=recipe.updated_at
+        )
+    return recipe.share_slug
+
+
+def unshare(recipe):
+    """revoke a recipe's share link"""
+    if recipe.share_slug:
+        recipe.share_slug = None
+        recipe.shared_snapshot = ""
+        recipe.updated_at = timezone.now()
+        Recipe.objects.filter(pk=recipe.pk).update(
+            share_slug=None, shared_snapshot="",
+            updated_at=recipe.updated_at
+        )
+        purge(surrogate_keys(recipe.pk))
@@ -0,0 +1,69 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from core.models import Ingredient, Recipe, RecipeIngredient
+
+
+def _key(user_id, recipe_ids):
+    ids = ",".join(str(pk) for pk in sorted(recipe_ids))
+    return f"shopping-list:{user_id}:{hashlib.md5(ids.encode()).hexdigest()}"
+
+
+def _stamp(user, recipe_ids):
+    """what a cached list must match: the recipes found and their
+    updated_at (moved by link changes too), and the latest change to an
+    ingredient of the user, which covers renames
+    """
+    recipes = tuple(Recipe.objects.filter(
+        user=user, pk__in=recipe_ids
+    ).order_by("pk").values_list("pk", "updated_at"))
+    renamed = Ingredient.objects.filter(user=user).aggregate(
+        Max("updated_at")
+    )["updated_at__max"]
+    return recipes, renamed
+
+
+def _build(recipe_ids):
+    """merge the ingredients of the recipes in one grouped query over the
+    links, one row per ingredient
+    """
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values("ingredient_id", "ingredient__name").annotate(
+        count=Count("recipe_id"),
+        recipes=ArrayAgg("recipe_id", ordering="recipe_id")
+    ).order_by("ingredient__name", "ingredient_id")
+    return [
+        {
+            "id": row["ingredient_id"],
+            "name": row["ingredient__name"],
+            "count": row["count"],
+            "recipes": row["recipes"],
+        }
+        for row in rows
+    ]
+
+
+def shopping_list(user, recipe_ids):
+    """the merged ingredients of the user's recipes among recipe_ids
+
+    Cached per set of ids; a hit costs the two stamp queries.
+    """
+    recipe_ids = set(recipe_ids)
+    key = _key(user.pk, recipe_ids)
+    stamp = _stamp(user, recipe_ids)
+    entry = cache.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    found = [pk for pk, _ in stamp[0]]
+    data = {
+        "recipes": found,
+        "missing": sorted(recipe_ids.difference(found)),
+        "ingredients": _build(found),
+    }
+    cache.set(key, (stamp, data), settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,97 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import detail_cache, sharing
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_saved_recipe(sender, instance, raw, **kwargs):
+    if raw or not instance.share_slug:
+        return
+    if instance.deleted_at is None:
+        sharing.refresh([instance.pk])
+    else:
+        sharing.purge(sharing.surrogate_keys(instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def purge_deleted_recipe(sender, instance, **kwargs):
+    if instance.share_slug and instance.deleted_at is None:
+        sharing.purge(sharing.surrogate_keys(instance.pk))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def refresh_relinked_recipes(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not reverse:
+        if action.startswith("post_") and instance.share_slug:
+            sharing.refresh([instance.pk])
+    elif action == "pre_clear":
+        instance._shared_recipe_ids = list(
+            instance.recipe_set.filter(share_slug__isnull=False)
+            .values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        sharing.refresh(getattr(instance, "_shared_recipe_ids", []))
+    elif action in ("post_add", "post_remove"):
+        sharing.refresh(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def refresh_renamed_attr(sender, instance, created, raw, **kwargs):
+    if not (created or raw):
+        sharing.refresh(
+            instance.recipe_set.filter(share_slug__isnull=False)
+            .values_list("pk", flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_shared_recipes(sender, instance, **kwargs):
+    instance._shared_recipe_ids = list(
+        instance.recipe_set.filter(share_slug__isnull=False)
+        .values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_after_attr_delete(sender, instance, **kwargs):
+    sharing.refresh(getattr(instance, "_shared_recipe_ids", []))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def drop_cached_recipe(sender, instance, **kwargs):
+    detail_cache.invalidate([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def drop_cached_relinked(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            detail_cache.invalidate([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        detail_cache.invalidate(pk_set)
+    elif action == "pre_clear":
+        detail_cache.invalidate(
+            instance.recipe_set.values_list("pk", flat=True)
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def drop_cached_renamed(sender, instance, created, raw, **kwargs):
+    """a rename does not move the recipes' stamps, drop them here"""
+    if not (created or raw):
+        detail_cache.invalidate(
+            instance.recipe_set.values_list("pk", flat=True)
+        )
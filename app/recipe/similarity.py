@@ -0,0 +1,247 @@
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from core import jobs
+from core.models import Recipe, RecipeIngredient, RecipeTag
+
+
+# a recipe's features are the catalog entries of its tags and ingredients,
+# so equal names of different users count as the same feature
+TAG, INGREDIENT = 0, 1
+
+
+def _links(recipes):
+    """(recipe id, feature) pairs of the given recipe queryset"""
+    tags = RecipeTag.objects.filter(
+        recipe__in=recipes.values("pk"), tag__catalog__isnull=False
+    ).values_list("recipe_id", "tag__catalog_id")
+    ingredients = RecipeIngredient.objects.filter(
+        recipe__in=recipes.values("pk"), ingredient__catalog__isnull=False
+    ).values_list("recipe_id", "ingredient__catalog_id")
+    for kind, links in ((TAG, tags), (INGREDIENT, ingredients)):
+        for recipe_id, catalog_id in links.iterator():
+            yield recipe_id, catalog_id * 2 + kind
+
+
+def features(recipes):
+    """{recipe id: set of features} of the given recipe queryset"""
+    found = defaultdict(set)
+    for recipe_id, feature in _links(recipes):
+        found[recipe_id].add(feature)
+    return found
+
+
+class SimilarityIndex:
+    """recipe x feature incidence matrix, stored by column
+
+    The product of the matrix with a recipe's feature vector counts the
+    features every recipe shares with it; by column (CSC) that is one
+    bincount over the rows listed under the query's few features, so the
+    cost follows the size of those columns, not of the catalog.
+    """
+
+    def __init__(self, recipe_ids, users, shared, sizes, columns, colptr,
+                 rows, built_at):
+        self.recipe_ids = recipe_ids
+        self.users = users
+        self.shared = shared
+        self.sizes = sizes
+        self.columns = columns
+        self.colptr = colptr
+        self.rows = rows
+        self.built_at = built_at
+
+    @classmethod
+    def build(cls):
+        """index every visible recipe"""
+        # taken first: anything written during the build is newer
+        built_at = timezone.now()
+        recipes = Recipe.objects.all()
+        meta = list(recipes.order_by("pk").values_list(
+            "pk", "user_id", "share_slug"
+        ))
+        recipe_ids = np.array([m[0] for m in meta], dtype=np.int64)
+        users = np.array([m[1] for m in meta], dtype=np.int64)
+        shared = np.array([m[2] is not None for m in meta], dtype=bool)
+
+        pairs = np.array(list(_links(recipes)), dtype=np.int64)
+        pairs = pairs.reshape(-1, 2)
+        rows = np.searchsorted(recipe_ids, pairs[:, 0])
+        # drop links of recipes created after the pk list was read
+        known = rows < len(recipe_ids)
+        known[known] = recipe_ids[rows[known]] == pairs[known, 0]
+        rows, feats = rows[known], pairs[known, 1]
+
+        columns, cols = np.unique(feats, return_inverse=True)
+        order = np.argsort(cols, kind="stable")
+        colptr = np.zeros(len(columns) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=len(columns)), out=colptr[1:])
+        sizes = np.bincount(rows, minlength=len(recipe_ids))
+        return cls(
+            recipe_ids, users, shared, sizes, columns, colptr,
+            rows[order], built_at
+        )
+
+    def save(self, path):
+        """write the index atomically, replacing the previous one"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(
+                fh,
+                recipe_ids=self.recipe_ids, users=self.users,
+                shared=self.shared, sizes=self.sizes, columns=self.columns,
+                colptr=self.colptr, rows=self.rows,
+                built_at=np.array(self.built_at.timestamp())
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            fields = {name: data[name] for name in data.files}
+        built_at = fields.pop("built_at").item()
+        return cls(
+            built_at=datetime.fromtimestamp(built_at, timezone.utc),
+            **fields
+        )
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def overlap(self, query):
+        """number of features each row shares with the query"""
+        query = np.fromiter(query, dtype=np.int64)
+        cols = np.searchsorted(self.columns, query)
+        cols = cols[cols < len(self.columns)]
+        cols = cols[np.isin(self.columns[cols], query)]
+        postings = [self.rows[self.colptr[c]:self.colptr[c + 1]]
+                    for c in cols]
+        if not postings:
+            return np.zeros(len(self), dtype=np.int64)
+        return np.bincount(np.concatenate(postings), minlength=len(self))
+
+
+_loaded = (None, None)
+_load_lock = threading.Lock()
+
+
+def current():
+    """the index last written by build_similarity, or None
+
+    Reloaded in every process when the file changes.
+    """
+    global _loaded
+    path = settings.RECIPE_SIMILARITY_INDEX
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _load_lock:
+        if _loaded[0] != mtime:
+            _loaded = (mtime, SimilarityIndex.load(path))
+        return _loaded[1]
+
+
+def _top(scores, keys, k):
+    """indexes of the k best scores, best first, ties by key"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.lexsort((keys[best], -scores[best]))]
+
+
+def _request_rebuild(index):
+    """queue one index build, however many requests find it out of date"""
+    built_at = index.built_at.timestamp() if index is not None else 0
+    if cache.add(f"similarity-rebuild:{built_at}", True,
+                 settings.JOB_TIMEOUT):
+        jobs.enqueue("recipe.build_similarity")
+
+
+def _fresh_ids(visible, index):
+    """ids of visible recipes the index doesn't know as they are
+
+    At most RECIPE_SIMILARITY_MAX_FRESH, the latest writes first; with
+    more a rebuild is queued and the rest wait for it.
+    """
+    if index is not None:
+        visible = visible.filter(updated_at__gt=index.built_at)
+    cap = settings.RECIPE_SIMILARITY_MAX_FRESH
+    ids = list(
+        visible.order_by("-updated_at").values_list("pk", flat=True)[:cap + 1]
+    )
+    if len(ids) > cap:
+        _request_rebuild(index)
+    return ids[:cap]
+
+
+def _indexed(index, query, user, recipe, exclude, limit):
+    """[(recipe id, jaccard)] of the best index rows still as indexed
+
+    Only the rows about to be returned are picked (by partition, not a
+    full sort) and checked for writes since the build, a page at a time,
+    so the cost follows the limit rather than the number of writes.
+    """
+    inter = index.overlap(query)
+    candidates = (inter > 0) & ((index.users == user.pk) | index.shared)
+    candidates &= index.recipe_ids != recipe.pk
+    candidates &= ~np.isin(index.recipe_ids, exclude)
+    rows = np.flatnonzero(candidates)
+    inter = inter[rows]
+    scores = inter / (len(query) + index.sizes[rows] - inter)
+    ids = index.recipe_ids[rows]
+    left = np.ones(len(ids), dtype=bool)
+    found = []
+    while left.any():
+        rest = np.flatnonzero(left)
+        page = rest[_top(scores[rest], ids[rest], limit)]
+        left[page] = False
+        stale = set(Recipe.all_objects.filter(
+            pk__in=ids[page].tolist(), updated_at__gt=index.built_at
+        ).values_list("pk", flat=True))
+        found.extend(
+            (int(ids[i]), float(scores[i]))
+            for i in page if ids[i] not in stale
+        )
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def similar(recipe, user, limit, index=None):
+    """[(recipe id, jaccard)] of the recipes most like the given one
+
+    Candidates are the user's own and shared recipes. Rows of the index
+    are scored in bulk; visible recipes written since it was built are
+    scored from the database instead, so edits show up before the next
+    build (see _fresh_ids for the bound).
+    """
+    query = features(Recipe.objects.filter(pk=recipe.pk))[recipe.pk]
+    if not query:
+        return []
+    if index is None:
+        index = current()
+    visible = Recipe.objects.filter(
+        Q(user=user) | Q(share_slug__isnull=False)
+    ).exclude(pk=recipe.pk)
+    fresh_ids = _fresh_ids(visible, index)
+    fresh = features(Recipe.objects.filter(pk__in=fresh_ids))
+
+    found = []
+    if index is not None and len(index):
+        found = _indexed(index, query, user, recipe, fresh_ids, limit)
+    for recipe_id, feats in fresh.items():
+        inter = len(query & feats)
+        if inter:
+            found.append((recipe_id, inter / len(query | feats)))
+    found.sort(key=lambda item: (-item[1], item[0]))
+    return found[:limit]
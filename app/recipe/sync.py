@@ -0,0 +1,97 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, SyncTombstone, Tag
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class InvalidToken(ValueError):
+    """the sync token could not be decoded"""
+
+
+def encode_token(moment):
+    """return the opaque token for a point in time"""
+    micros = (moment - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(str(micros).encode()).decode()
+
+
+def decode_token(token):
+    """return the point in time a token stands for"""
+    try:
+        micros = int(base64.urlsafe_b64decode(token.encode()).decode())
+        return EPOCH + timedelta(microseconds=micros)
+    except (binascii.Error, UnicodeError, ValueError, OverflowError):
+        raise InvalidToken(token)
+
+
+def is_expired(since):
+    """tombstones older than the retention may already be purged"""
+    return since < timezone.now() - settings.SYNC_TOMBSTONE_RETENTION
+
+
+def changes(user, since=None, limit=None):
+    """collect what changed for a user after `since`
+
+    Only changes older than SYNC_SETTLE_SECONDS are returned so that
+    transactions still in flight are picked up by the next sync. When
+    more than `limit` changes are pending the window is cut at the
+    limit-th change and `has_more` is set; the returned token always
+    marks the end of the window.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    upper = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    sources = {
+        "recipes": (Recipe.all_objects.filter(user=user), "updated_at"),
+        "tags": (Tag.objects.filter(user=user), "updated_at"),
+        "ingredients": (Ingredient.objects.filter(user=user), "updated_at"),
+    }
+    if since is None:
+        sources["recipes"] = (Recipe.objects.filter(user=user), "updated_at")
+    else:
+        sources["tombstones"] = (
+            SyncTombstone.objects.filter(user=user), "deleted_at"
+        )
+
+    def window(queryset, field):
+        queryset = queryset.filter(**{field + "__lte": upper})
+        if since is not None:
+            queryset = queryset.filter(**{field + "__gt": since})
+        return queryset
+
+    stamps = sorted(
+        stamp
+        for queryset, field in sources.values()
+        for stamp in window(queryset, field).order_by(field)
+        .values_list(field, flat=True)[:limit + 1]
+    )
+    has_more = len(stamps) > limit
+    if has_more:
+        upper = stamps[limit - 1]
+
+    recipes = list(
+        window(*sources["recipes"]).prefetch_related("tags", "ingredients")
+    )
+    deleted = {
+        "recipes": [r.pk for r in recipes if r.deleted_at is not None],
+        "tags": [],
+        "ingredients": [],
+    }
+    if since is not None:
+        for model_name, object_id in window(
+            *sources["tombstones"]
+        ).values_list("model_name", "object_id"):
+            deleted[model_name + "s"].append(object_id)
+    return {
+        "recipes": [r for r in recipes if r.deleted_at is None],
+        "tags": list(window(*sources["tags"])),
+        "ingredients": list(window(*sources["ingredients"])),
+        "deleted": deleted,
+        "sync_token": encode_token(max(upper, since or upper)),
+        "has_more": has_more,
+    }
@@ -0,0 +1,74 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.utils import timezone
+
+from core.jobs import task
+from core.models import Recipe
+from recipe import detail_cache, sharing
+
+
+@task("recipe.purge_shared")
+def purge_shared(recipe_ids):
+    """purge recipes that are no longer public from the edge caches"""
+    keys = []
+    for recipe_id in recipe_ids:
+        keys.extend(sharing.surrogate_keys(recipe_id))
+    sharing.purge(keys)
+    return len(keys)
+
+
+@task("recipe.process_image")
+def process_image(recipe_id, image):
+    """shrink an uploaded image to RECIPE_IMAGE_MAX_SIZE pixels a side
+
+    Does nothing once the recipe has another image, so a retry or a
+    newer upload is never overwritten.
+    """
+    # imported here: every process loads this module at app ready
+    from PIL import Image
+
+    recipes = Recipe.all_objects.filter(pk=recipe_id, image=image)
+    if not recipes.exists():
+        return None
+    storage = Recipe._meta.get_field("image").storage
+    with storage.open(image) as fh:
+        picture = Image.open(fh)
+        picture.load()
+    limit = settings.RECIPE_IMAGE_MAX_SIZE
+    if max(picture.size) <= limit:
+        return image
+    picture_format = picture.format
+    picture.thumbnail((limit, limit))
+    buffer = BytesIO()
+    picture.save(buffer, format=picture_format)
+    resized = storage.save(image, ContentFile(buffer.getvalue()))
+    # a new version, like any other write, so ETags, the detail cache
+    # and delta sync stop pointing at the file removed below
+    if recipes.update(
+        image=resized,
+        version=F("version") + 1,
+        updated_at=timezone.now()
+    ):
+        detail_cache.invalidate([recipe_id])
+        sharing.refresh([recipe_id])
+        storage.delete(image)
+        return resized
+    storage.delete(resized)
+    return None
+
+
+@task("recipe.build_similarity")
+def build_similarity():
+    """rebuild the similar recipes index, like manage.py build_similarity"""
+    # imported here: numpy is only needed by the similarity code
+    from recipe.similarity import SimilarityIndex
+
+    index = SimilarityIndex.build()
+    path = settings.RECIPE_SIMILARITY_INDEX
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    index.save(path)
+    return len(index)
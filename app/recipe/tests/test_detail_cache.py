@@ -0,0 +1,146 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import detail_cache
+
+
+def detail_url(recipe_id):
+    """return detail recipe url"""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class RecipeDetailCacheTests(TestCase):
+    """test the tiered cache in front of the recipe detail"""
+
+    def setUp(self):
+        cache.clear()
+        detail_cache.local.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Dal", time_minute=30, price=4
+        )
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.recipe.tags.add(self.tag)
+        self.url = detail_url(self.recipe.id)
+
+    def test_hit_skips_nested_queries(self):
+        """test a cached detail costs only the row lookup"""
+        with CaptureQueriesContext(connection) as miss:
+            first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as hit:
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second["ETag"], f'"{self.recipe.version}"')
+        self.assertEqual(len(hit), 1)
+        self.assertLess(len(hit), len(miss))
+
+    def test_shared_tier_serves_other_processes(self):
+        """test an empty local tier is refilled from the shared cache"""
+        self.client.get(self.url)
+        detail_cache.local.clear()
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(self.url)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(res.data["tags"][0]["name"], "Vegan")
+
+    def test_update_invalidates(self):
+        """test a write is visible on the next read"""
+        self.client.get(self.url)
+        self.client.patch(self.url, {"title": "Tadka dal"})
+        res = self.client.get(self.url)
+        self.assertEqual(res.data["title"], "Tadka dal")
+        self.assertEqual(res.data["version"], 2)
+
+    def test_link_change_invalidates(self):
+        """test adding an ingredient from either side is visible"""
+        self.client.get(self.url)
+        lentils = Ingredient.objects.create(user=self.user, name="Lentils")
+        lentils.recipe_set.add(self.recipe)
+        res = self.client.get(self.url)
+        self.assertEqual(res.data["ingredients"][0]["name"], "Lentils")
+
+    def test_nested_counts_not_cached(self):
+        """test linking a tag elsewhere can't leave a stale count behind"""
+        first = self.client.get(self.url)
+        other = Recipe.objects.create(
+            user=self.user, title="Chana", time_minute=40, price=5
+        )
+        other.tags.add(self.tag)
+        second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.data["tags"], [
+            {"id": self.tag.id, "name": "Vegan"}
+        ])
+
+    def test_rename_invalidates(self):
+        """test renaming a tag refreshes recipes using it"""
+        self.client.get(self.url)
+        self.tag.name = "Plant based"
+        self.tag.save()
+        # a process that missed the signal still has the old stamp
+        self.assertIsNone(cache.get(f"recipe-detail:{self.recipe.id}"))
+        res = self.client.get(self.url)
+        self.assertEqual(res.data["tags"][0]["name"], "Plant based")
+
+    def test_other_users_recipe_not_served(self):
+        """test a cached recipe stays private to its owner"""
+        self.client.get(self.url)
+        other = get_user_model().objects.create_user(
+            "other@dummy.com", "dummy123"
+        )
+        self.client.force_authenticate(other)
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(RECIPE_CACHE_LOCAL_SIZE=2)
+    def test_local_tier_is_bounded(self):
+        """test the least recently used entry is evicted"""
+        lru = detail_cache.LocalLRU()
+        for key in ("a", "b", "c"):
+            lru.set(key, 1, key.upper())
+        self.assertIsNone(lru.get("a", 1))
+        self.assertEqual(lru.get("c", 1), "C")
+        self.assertIsNone(lru.get("c", 2))
+
+    def test_concurrent_misses_build_once(self):
+        """test a stampede on a cold entry runs the build once"""
+        recipe = SimpleNamespace(pk=-1, version=1, updated_at=None)
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.1)
+            return {"id": -1}
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    detail_cache.get_or_build(recipe, build)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [{"id": -1}] * 5)
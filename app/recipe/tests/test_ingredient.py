@@ -1,11 +1,13 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 
@@ -73,3 +75,42 @@ class PrivateIngredientApiTests(TestCase):
         payload = {"name": ""}
         res = self.client.post(INGREDIENT_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_ingredients_assigned_to_recipes(self):
+        """test filtering ingredients by those assigned to recipes"""
+        ingredient1 = Ingredient.objects.create(user=self.user, name="Apples")
+        ingredient2 = Ingredient.objects.create(user=self.user, name="Turkey")
+        recipe = Recipe.objects.create(
+            title="Coriander eggs on toast",
+            time_minute=10,
+            price=5.00,
+            user=self.user
+        )
+        recipe.ingredients.add(ingredient1)
+        res = self.client.get(INGREDIENT_URL, {"assigned_only": 1})
+        ingredient1.refresh_from_db()
+        serializer1 = IngredientSerializer(ingredient1)
+        serializer2 = IngredientSerializer(ingredient2)
+        self.assertIn(serializer1.data, res.data)
+        self.assertNotIn(serializer2.data, res.data)
+        self.assertEqual(res.data[0]["recipe_count"], 1)
+
+    def test_ingredient_recipe_count_no_join(self):
+        """test that listing ingredients does not join the recipe links"""
+        Ingredient.objects.create(user=self.user, name="Apples")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(INGREDIENT_URL, {"assigned_only": 1})
+        self.assertFalse(
+            any("recipe_ingredients" in query["sql"]
+                for query in queries.captured_queries)
+        )
+
+    def test_create_existing_ingredient_returns_it(self):
+        """test creating an ingredient the user already has returns it"""
+        salt = Ingredient.objects.create(user=self.user, name="Sea salt")
+        res = self.client.post(INGREDIENT_URL, {"name": "SEA SALT"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["id"], salt.id)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 1
+        )
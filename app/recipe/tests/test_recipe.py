@@ -3,8 +3,12 @@ import os
 
 from PIL import Image
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -15,6 +19,7 @@ from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 
 RECIPE_URL = reverse("recipe:recipe-list")
+BATCH_URL = reverse("recipe:recipe-batch")
 
 
 def image_upload_url(recipe_id):
@@ -155,6 +160,78 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(ingredient1, ingredients)
         self.assertIn(ingredient2, ingredients)
 
+    def test_create_recipe_with_other_users_tag(self):
+        """test that tags owned by another user are rejected"""
+        user2 = get_user_model().objects.create_user(
+            "test2@dummy.com",
+            "dummy123"
+        )
+        tag = sample_tag(user=user2)
+        payload = {
+            "title": "Pancakes",
+            "tags": [tag.id],
+            "time_minute": 10,
+            "price": 3.00
+        }
+        res = self.client.post(RECIPE_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_create_recipe_query_count_constant(self):
+        """test that the number of queries does not grow with the links"""
+        def create(count):
+            tags = [sample_tag(user=self.user, name=f"t{count}.{i}")
+                    for i in range(count)]
+            ingredients = [
+                sample_ingredient(user=self.user, name=f"i{count}.{i}")
+                for i in range(count)
+            ]
+            payload = {
+                "title": "Stew",
+                "tags": [tag.id for tag in tags],
+                "ingredients": [ingredient.id for ingredient in ingredients],
+                "time_minute": 60,
+                "price": 9.00
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPE_URL, payload, format="json")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+        create(1)
+        self.assertEqual(create(2), create(6))
+
+    def test_create_recipe_idempotency_key(self):
+        """test a retried recipe create does not insert twice"""
+        cache.clear()
+        payload = {"title": "Stew", "time_minute": 60, "price": 9.00}
+        headers = {"HTTP_IDEMPOTENCY_KEY": "stew-1"}
+        first = self.client.post(RECIPE_URL, payload, **headers)
+        again = self.client.post(RECIPE_URL, payload, **headers)
+        self.assertEqual(again.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(again.data["id"], first.data["id"])
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_update_recipe_keeps_unchanged_links(self):
+        """test that updating links only touches the differences"""
+        recipe = sample_recipe(user=self.user)
+        kept = sample_tag(user=self.user, name="Kept")
+        dropped = sample_tag(user=self.user, name="Dropped")
+        added = sample_tag(user=self.user, name="Added")
+        recipe.tags.add(kept, dropped)
+        through = Recipe.tags.through
+        kept_link = through.objects.get(recipe=recipe, tag=kept)
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"tags": [kept.id, added.id]},
+            format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list("id", flat=True)),
+            {kept.id, added.id}
+        )
+        self.assertTrue(through.objects.filter(pk=kept_link.pk).exists())
+
     def test_partial_update_recipe(self):
         """test updating a recipe with patch"""
         recipe = sample_recipe(user=self.user)
@@ -189,6 +266,155 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(recipe.price, payload["price"])
         self.assertEqual(len(recipe.tags.all()), 0)
 
+    def test_update_returns_new_version(self):
+        """test that each write bumps the version and returns an ETag"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res["ETag"], '"1"')
+        res = self.client.patch(detail_url(recipe.id), {"title": "Soup"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["version"], 2)
+        self.assertEqual(res["ETag"], '"2"')
+
+    def test_update_if_match_current_version(self):
+        """test that a write with the current version succeeds"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"title": "Soup"},
+            HTTP_IF_MATCH='"1"'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Soup")
+        self.assertEqual(recipe.version, 2)
+
+    def test_update_if_match_stale_version(self):
+        """test that a write based on a stale version is rejected"""
+        recipe = sample_recipe(user=self.user)
+        self.client.patch(detail_url(recipe.id), {"title": "Soup"})
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"title": "Stew"},
+            HTTP_IF_MATCH='"1"'
+        )
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Soup")
+        self.assertEqual(recipe.version, 2)
+
+    def test_stale_version_leaves_links_untouched(self):
+        """test that a rejected write does not change the links either"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+        Recipe.objects.filter(pk=recipe.pk).update(version=5)
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"tags": [tag.id]},
+            HTTP_IF_MATCH='W/"4"'
+        )
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertFalse(recipe.tags.exists())
+
+    def test_update_if_match_list(self):
+        """test that any strong tag in the If-Match list can match, the
+        coding suffixed ones of compressed responses too
+        """
+        recipe = sample_recipe(user=self.user)
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"title": "Soup"},
+            HTTP_IF_MATCH='"7", "1"'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"title": "Stew"},
+            HTTP_IF_MATCH='"2-gzip"'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["ETag"], '"3"')
+
+    def test_update_if_match_weak_rejected(self):
+        """test that a weak tag never matches, even of the current version"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {"title": "Soup"},
+            HTTP_IF_MATCH='W/"1"'
+        )
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.version, 1)
+
+    def test_delete_recipe_soft_deletes(self):
+        """test that deleting a recipe hides it and leaves a tombstone"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+        recipe.tags.add(tag)
+        res = self.client.delete(detail_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(RECIPE_URL).data, [])
+        self.assertFalse(Recipe.objects.filter(pk=recipe.pk).exists())
+        self.assertIsNotNone(Recipe.all_objects.get(pk=recipe.pk).deleted_at)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+        self.assertEqual(self.user.recipe_stats.recipe_count, 0)
+
+    def test_batch_preserves_order_and_reports_missing(self):
+        """test batch returns details in order and lists missing ids"""
+        first = sample_recipe(user=self.user, title="first")
+        second = sample_recipe(user=self.user, title="second")
+        second.tags.add(sample_tag(user=self.user))
+        other = get_user_model().objects.create_user(
+            "other@dummy.com", "dummy123"
+        )
+        foreign = sample_recipe(user=other)
+        ids = [second.id, 9999, first.id, foreign.id, second.id]
+        res = self.client.get(
+            BATCH_URL, {"ids": ",".join(str(i) for i in ids)}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = RecipeDetailSerializer(
+            [second, first], many=True, context={"request": res.wsgi_request}
+        )
+        self.assertEqual(res.data["results"], expected.data)
+        self.assertEqual(res.data["missing"], [9999, foreign.id])
+
+    def test_batch_query_count_constant(self):
+        """test batch cost does not grow with the number of ids"""
+        tag = sample_tag(user=self.user)
+        recipes = [sample_recipe(user=self.user) for _ in range(5)]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(BATCH_URL, {"ids": str(recipes[0].id)})
+        ids = ",".join(str(r.id) for r in recipes)
+        with CaptureQueriesContext(connection) as five:
+            res = self.client.get(BATCH_URL, {"ids": ids})
+        self.assertEqual(len(res.data["results"]), 5)
+        self.assertEqual(len(one), len(five))
+
+    def test_batch_post(self):
+        """test long id lists can be posted"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.post(
+            BATCH_URL, {"ids": [recipe.id, 42]}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["id"], recipe.id)
+        self.assertEqual(res.data["missing"], [42])
+
+    def test_batch_invalid(self):
+        """test malformed, empty and oversized id lists are rejected"""
+        res = self.client.get(BATCH_URL, {"ids": "1,abc"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(BATCH_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        ids = list(range(1, settings.RECIPE_BATCH_MAX_IDS + 2))
+        res = self.client.post(BATCH_URL, {"ids": ids}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class RecipeImageUploadTests(TestCase):
 
@@ -216,6 +442,22 @@ class RecipeImageUploadTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertIn("image", res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(self.recipe.version, 2)
+        self.assertEqual(res["ETag"], '"2"')
+
+    def test_upload_image_if_match_stale(self):
+        """test that an upload based on a stale version is rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", (10, 10)).save(ntf, format="JPEG")
+            ntf.seek(0)
+            res = self.client.post(
+                url, {"image": ntf}, format="multipart",
+                HTTP_IF_MATCH='"2"'
+            )
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
 
     def test_upload_image_bad_request(self):
         """test uploading an invaalid image"""
@@ -227,6 +469,15 @@ class RecipeImageUploadTests(TestCase):
         )
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_upload_image_missing(self):
+        """test an upload without an image is rejected"""
+        res = self.client.post(
+            image_upload_url(self.recipe.id), {}, format="multipart"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, 1)
+
     def test_filter_recipe_by_tags(self):
         """test returning recipe wth specific recipe tag"""
         recipe1 = sample_recipe(user=self.user, title="Thai Vegetable Curry")
@@ -266,3 +517,12 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
+
+    def test_filter_recipe_by_several_tags_lists_once(self):
+        """test a recipe matching more than one tag is returned once"""
+        recipe = sample_recipe(user=self.user)
+        vegan = sample_tag(user=self.user, name="Vegan")
+        quick = sample_tag(user=self.user, name="Quick")
+        recipe.tags.add(vegan, quick)
+        res = self.client.get(RECIPE_URL, {"tags": f"{vegan.id},{quick.id}"})
+        self.assertEqual([r["id"] for r in res.data], [recipe.id])
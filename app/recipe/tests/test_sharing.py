@@ -0,0 +1,89 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.serializers import RecipeDetailSerializer
+
+
+purged_keys = []
+
+
+def purge_keys(keys):
+    """stand-in CDN purge that records the keys"""
+    purged_keys.extend(keys)
+
+
+def share_url(recipe_id):
+    """return the share action url of a recipe"""
+    return reverse("recipe:recipe-share", args=[recipe_id])
+
+
+@override_settings(SURROGATE_KEY_PURGER="recipe.tests.test_sharing.purge_keys")
+class RecipeSharingApiTests(TestCase):
+    """test publishing recipes through share links"""
+
+    def setUp(self):
+        purged_keys.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Shakshuka", time_minute=20, price=6
+        )
+        self.tag = Tag.objects.create(user=self.user, name="Brunch")
+        self.recipe.tags.add(self.tag)
+
+    def get_shared(self, slug):
+        return APIClient().get(reverse("recipe:shared-recipe", args=[slug]))
+
+    def test_share_recipe_public_read(self):
+        """test that a shared recipe is readable anonymously and cacheable"""
+        res = self.client.post(share_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        shared = self.get_shared(res.data["slug"])
+        self.assertEqual(shared.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(shared.content),
+            json.loads(json.dumps(RecipeDetailSerializer(self.recipe).data))
+        )
+        self.assertIn("public", shared["Cache-Control"])
+        self.assertIn("s-maxage", shared["Cache-Control"])
+        self.assertEqual(shared["Surrogate-Key"], f"recipe-{self.recipe.id}")
+
+    def test_snapshot_refreshed_and_purged_on_edit(self):
+        """test that edits re-render the snapshot and purge the edge"""
+        slug = self.client.post(share_url(self.recipe.id)).data["slug"]
+        self.client.patch(
+            reverse("recipe:recipe-detail", args=[self.recipe.id]),
+            {"title": "Green shakshuka"}
+        )
+        self.tag.name = "Breakfast"
+        self.tag.save()
+        self.assertIn(f"recipe-{self.recipe.id}", purged_keys)
+        data = json.loads(self.get_shared(slug).content)
+        self.assertEqual(data["title"], "Green shakshuka")
+        self.assertEqual(data["tags"][0]["name"], "Breakfast")
+
+    def test_unshare_recipe(self):
+        """test that revoking a share link hides the recipe"""
+        slug = self.client.post(share_url(self.recipe.id)).data["slug"]
+        res = self.client.delete(share_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(purged_keys, [f"recipe-{self.recipe.id}"])
+        self.assertEqual(
+            self.get_shared(slug).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_unshared_recipe_not_public(self):
+        """test that unknown slugs are not found"""
+        res = self.get_shared("not-a-real-slug")
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
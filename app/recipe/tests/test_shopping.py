@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe
+
+
+SHOPPING_LIST_URL = reverse("recipe:shopping-list")
+
+
+class ShoppingListApiTests(TestCase):
+    """test the shopping list endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client.force_authenticate(self.user)
+        self.onion = Ingredient.objects.create(user=self.user, name="Onion")
+        self.rice = Ingredient.objects.create(user=self.user, name="Rice")
+        self.dal = self.recipe("Dal", self.onion)
+        self.pilaf = self.recipe("Pilaf", self.onion, self.rice)
+
+    def recipe(self, title, *ingredients, user=None):
+        recipe = Recipe.objects.create(
+            user=user or self.user, title=title, time_minute=10, price=5
+        )
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def test_login_required(self):
+        """test that authentication is required"""
+        res = APIClient().post(SHOPPING_LIST_URL, {"ids": [self.dal.id]})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_merges_ingredients(self):
+        """test each ingredient is listed once with the recipes using it"""
+        res = self.client.post(
+            SHOPPING_LIST_URL, {"ids": [self.pilaf.id, self.dal.id]},
+            format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["recipes"], [self.dal.id, self.pilaf.id])
+        self.assertEqual(res.data["ingredients"], [
+            {"id": self.onion.id, "name": "Onion", "count": 2,
+             "recipes": [self.dal.id, self.pilaf.id]},
+            {"id": self.rice.id, "name": "Rice", "count": 1,
+             "recipes": [self.pilaf.id]},
+        ])
+
+    def test_grouped_in_one_query(self):
+        """test the merge is one grouped query, not a row per link"""
+        self.client.post(
+            SHOPPING_LIST_URL, {"ids": [self.dal.id]}, format="json"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                SHOPPING_LIST_URL, {"ids": [self.dal.id, self.pilaf.id]},
+                format="json"
+            )
+        merges = [
+            q["sql"] for q in queries if "core_recipe_ingredients" in q["sql"]
+        ]
+        self.assertEqual(len(merges), 1)
+        self.assertIn("GROUP BY", merges[0])
+
+    def test_other_users_recipes_missing(self):
+        """test recipes of other users are reported, not merged"""
+        other = get_user_model().objects.create_user(
+            "other@dummy.com", "dummy123"
+        )
+        salt = Ingredient.objects.create(user=other, name="Salt")
+        theirs = self.recipe("Theirs", salt, user=other)
+        res = self.client.post(
+            SHOPPING_LIST_URL, {"ids": [self.dal.id, theirs.id, 9999]},
+            format="json"
+        )
+        self.assertEqual(res.data["missing"], [theirs.id, 9999])
+        self.assertEqual(
+            [i["name"] for i in res.data["ingredients"]], ["Onion"]
+        )
+
+    def test_cached_by_id_set(self):
+        """test the same set in any order is served from the cache"""
+        self.client.post(
+            SHOPPING_LIST_URL, {"ids": [self.dal.id, self.pilaf.id]},
+            format="json"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(
+                SHOPPING_LIST_URL, {"ids": [self.pilaf.id, self.dal.id]},
+                format="json"
+            )
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(res.data["ingredients"][0]["count"], 2)
+
+    def test_changes_invalidate(self):
+        """test link changes, renames and deletes are reflected"""
+        ids = {"ids": [self.dal.id, self.pilaf.id]}
+        self.client.post(SHOPPING_LIST_URL, ids, format="json")
+        self.dal.ingredients.add(self.rice)
+        res = self.client.post(SHOPPING_LIST_URL, ids, format="json")
+        self.assertEqual(res.data["ingredients"][1]["count"], 2)
+
+        self.rice.name = "Basmati"
+        self.rice.save()
+        res = self.client.post(SHOPPING_LIST_URL, ids, format="json")
+        self.assertEqual(res.data["ingredients"][0]["name"], "Basmati")
+
+        self.pilaf.soft_delete()
+        res = self.client.post(SHOPPING_LIST_URL, ids, format="json")
+        self.assertEqual(res.data["missing"], [self.pilaf.id])
+        self.assertEqual(res.data["ingredients"][0]["count"], 1)
+
+    def test_too_many_ids(self):
+        """test the number of recipes is capped"""
+        res = self.client.post(
+            SHOPPING_LIST_URL, {"ids": list(range(1, 102))}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
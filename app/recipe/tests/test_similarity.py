@@ -0,0 +1,172 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Job, Recipe, Tag
+from recipe import similarity
+
+
+def similar_url(recipe_id):
+    """return similar recipes url"""
+    return reverse("recipe:recipe-similar", args=[recipe_id])
+
+
+class SimilarRecipesTests(TestCase):
+    """test the similar recipes endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "similarity.npz")
+        settings = override_settings(RECIPE_SIMILARITY_INDEX=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self.tmp.cleanup)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.other = get_user_model().objects.create_user(
+            "other@dummy.com",
+            "dummy123"
+        )
+        self.client.force_authenticate(self.user)
+        self.dal = self.recipe(self.user, "Dal", ["Vegan"],
+                               ["Lentils", "Cumin", "Onion"])
+
+    def recipe(self, user, title, tags, ingredients, shared=False):
+        recipe = Recipe.objects.create(
+            user=user, title=title, time_minute=10, price=5,
+            share_slug=f"s-{title}" if shared else None
+        )
+        for name in tags:
+            tag, _ = Tag.objects.get_or_create_by_name(user, name)
+            recipe.tags.add(tag)
+        for name in ingredients:
+            ingredient, _ = Ingredient.objects.get_or_create_by_name(
+                user, name
+            )
+            recipe.ingredients.add(ingredient)
+        return recipe
+
+    def build(self):
+        call_command("build_similarity", stdout=StringIO())
+
+    def test_ranked_by_jaccard(self):
+        """test recipes sharing more features come first"""
+        soup = self.recipe(self.user, "Soup", ["Vegan"],
+                           ["Lentils", "Onion"])
+        curry = self.recipe(self.user, "Curry", [], ["Cumin", "Rice"])
+        self.recipe(self.user, "Cake", ["Dessert"], ["Sugar"])
+        res = self.client.get(similar_url(self.dal.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data], [soup.id, curry.id])
+        self.assertEqual(res.data[0]["similarity"], 3 / 4)
+        self.assertEqual(res.data[1]["similarity"], 1 / 5)
+        self.assertEqual(res.data[0]["tags"][0]["name"], "Vegan")
+
+    def test_shared_recipes_of_other_users(self):
+        """test other users' recipes are candidates only when shared"""
+        public = self.recipe(self.other, "Their dal", ["vegan"],
+                             ["lentils"], shared=True)
+        self.recipe(self.other, "Private dal", ["Vegan"], ["Lentils"])
+        res = self.client.get(similar_url(public.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(similar_url(self.dal.id))
+        self.assertEqual([r["id"] for r in res.data], [public.id])
+
+    def test_index_matches_database(self):
+        """test scores from the built index equal the fresh ones"""
+        for i in range(5):
+            self.recipe(self.user, f"Dal {i}", ["Vegan"][:i % 2],
+                        ["Lentils", "Cumin", "Rice", "Onion"][:i])
+        self.recipe(self.other, "Their dal", ["Vegan"], ["Lentils"],
+                    shared=True)
+        fresh = similarity.similar(self.dal, self.user, 10)
+        self.build()
+        index = similarity.current()
+        self.assertEqual(len(index), 7)
+        self.assertEqual(similarity.similar(self.dal, self.user, 10), fresh)
+        self.assertEqual(similarity.similar(self.dal, self.user, 2),
+                         fresh[:2])
+
+    def test_writes_after_build_are_scored(self):
+        """test recipes changed since the build are not served stale"""
+        soup = self.recipe(self.user, "Soup", [], ["Lentils"])
+        gone = self.recipe(self.user, "Stew", [], ["Onion"])
+        self.build()
+        cumin = Ingredient.objects.get(user=self.user, name="Cumin")
+        soup.ingredients.add(cumin)
+        gone.soft_delete()
+        new = self.recipe(self.user, "Tadka", ["Vegan"], ["Cumin", "Onion"])
+
+        res = self.client.get(similar_url(self.dal.id))
+        self.assertEqual([r["id"] for r in res.data], [new.id, soup.id])
+        self.assertEqual(res.data[1]["similarity"], 2 / 4)
+
+    def test_unshared_after_build_skipped(self):
+        """test a recipe unshared since the build makes room for the next
+        one rather than a short page
+        """
+        public = self.recipe(self.other, "Their dal", ["Vegan"],
+                             ["Lentils", "Cumin", "Onion"], shared=True)
+        soup = self.recipe(self.user, "Soup", [], ["Lentils"])
+        self.build()
+        self.client.force_authenticate(self.other)
+        self.client.delete(
+            reverse("recipe:recipe-share", args=[public.id])
+        )
+        self.client.force_authenticate(self.user)
+
+        res = self.client.get(similar_url(self.dal.id), {"limit": 1})
+        self.assertEqual([r["id"] for r in res.data], [soup.id])
+
+    @override_settings(RECIPE_SIMILARITY_MAX_FRESH=1)
+    def test_many_writes_queue_rebuild(self):
+        """test writes beyond the cap wait for a rebuild, queued once"""
+        self.build()
+        soup = self.recipe(self.user, "Soup", ["Vegan"], ["Lentils"])
+        tadka = self.recipe(self.user, "Tadka", [], ["Cumin"])
+        res = self.client.get(similar_url(self.dal.id))
+        self.assertEqual([r["id"] for r in res.data], [tadka.id])
+        self.client.get(similar_url(self.dal.id))
+        self.assertEqual(
+            Job.objects.filter(task="recipe.build_similarity").count(), 1
+        )
+
+        call_command("run_workers", concurrency=1, burst=True,
+                     stdout=StringIO())
+        res = self.client.get(similar_url(self.dal.id))
+        self.assertEqual([r["id"] for r in res.data], [soup.id, tadka.id])
+
+    def test_limit(self):
+        """test the number of results is capped and validated"""
+        for i in range(3):
+            self.recipe(self.user, f"Dal {i}", ["Vegan"], [])
+        self.build()
+        res = self.client.get(similar_url(self.dal.id), {"limit": 2})
+        self.assertEqual(len(res.data), 2)
+
+        res = self.client.get(similar_url(self.dal.id), {"limit": 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_without_features(self):
+        """test a bare recipe has no similar recipes"""
+        bare = Recipe.objects.create(
+            user=self.user, title="Toast", time_minute=1, price=1
+        )
+        res = self.client.get(similar_url(bare.id))
+        self.assertEqual(res.data, [])
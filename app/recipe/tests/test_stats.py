@@ -0,0 +1,125 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeStats, Tag, Ingredient
+
+
+STATS_URL = reverse("recipe:stats")
+
+
+def sample_recipe(user, **kwargs):
+    """create and return a sample recipe"""
+    default = {
+        "title": "sample recipe",
+        "time_minute": 10,
+        "price": Decimal("5.00")
+    }
+    default.update(kwargs)
+    return Recipe.objects.create(user=user, **default)
+
+
+class PublicRecipeStatsApiTests(TestCase):
+    """test unauthenticated stats API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """test that authentication is required"""
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateRecipeStatsApiTests(TestCase):
+    """test the recipe stats API for an authenticated user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.dessert = Tag.objects.create(user=self.user, name="Dessert")
+        self.salt = Ingredient.objects.create(user=self.user, name="Salt")
+
+    def assertConsistent(self):
+        call_command("rebuild_stats", check=True)
+
+    def test_empty_stats(self):
+        """test the stats of a user without recipes"""
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["recipe_count"], 0)
+        self.assertIsNone(res.data["average_price"])
+        self.assertEqual(res.data["recipes_per_tag"], [])
+
+    def test_stats_follow_changes(self):
+        """test that the summaries track saves, m2m changes and deletes"""
+        recipe1 = sample_recipe(self.user, price=Decimal("4.00"))
+        recipe2 = sample_recipe(self.user, price=Decimal("8.00"),
+                                time_minute=30)
+        recipe1.tags.add(self.vegan, self.dessert)
+        recipe2.tags.add(self.vegan)
+        self.salt.recipe_set.add(recipe1, recipe2)
+        recipe2.price = Decimal("10.00")
+        recipe2.save()
+        self.assertConsistent()
+
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data["recipe_count"], 2)
+        self.assertEqual(res.data["average_price"], "7.00")
+        self.assertEqual(res.data["average_time_minute"], 20)
+        self.assertEqual(
+            [(t["name"], t["recipe_count"])
+             for t in res.data["recipes_per_tag"]],
+            [("Vegan", 2), ("Dessert", 1)]
+        )
+        self.assertEqual(res.data["top_ingredients"][0]["recipe_count"], 2)
+
+        recipe1.tags.remove(self.dessert, self.vegan)
+        self.vegan.recipe_set.clear()
+        recipe2.delete()
+        self.assertConsistent()
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 1)
+        self.assertEqual(stats.price_total, Decimal("4.00"))
+
+    def test_stats_updated_through_api(self):
+        """test that recipes written through the API are counted"""
+        payload = {
+            "title": "Salad",
+            "tags": [self.vegan.id],
+            "ingredients": [self.salt.id],
+            "time_minute": 5,
+            "price": "3.50"
+        }
+        res = self.client.post(reverse("recipe:recipe-list"), payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        url = reverse("recipe:recipe-detail", args=[res.data["id"]])
+        self.client.patch(url, {"tags": [self.dessert.id]}, format="json")
+        self.assertConsistent()
+        self.dessert.refresh_from_db()
+        self.assertEqual(self.dessert.recipe_count, 1)
+
+    def test_rebuild_stats(self):
+        """test that rebuild_stats repairs drifted summaries"""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(self.vegan)
+        Tag.objects.filter(pk=self.vegan.pk).update(recipe_count=7)
+        RecipeStats.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_stats", check=True)
+        call_command("rebuild_stats")
+        self.assertConsistent()
+        self.vegan.refresh_from_db()
+        self.assertEqual(self.vegan.recipe_count, 1)
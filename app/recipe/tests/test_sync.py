@@ -0,0 +1,140 @@
+import base64
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import sync
+
+
+SYNC_URL = reverse("recipe:sync")
+
+
+class PublicSyncApiTests(TestCase):
+    """test unauthenticated sync API access"""
+
+    def test_auth_required(self):
+        """test that authentication is required"""
+        res = APIClient().get(SYNC_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class PrivateSyncApiTests(TestCase):
+    """test delta sync for an authenticated user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.salt = Ingredient.objects.create(user=self.user, name="Salt")
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Salad", time_minute=5, price=3
+        )
+
+    def test_full_sync(self):
+        """test that a sync without a token returns everything"""
+        other = get_user_model().objects.create_user(
+            "other@dummy.com",
+            "dummy123"
+        )
+        Tag.objects.create(user=other, name="Other")
+        res = self.client.get(SYNC_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data["recipes"]],
+                         [self.recipe.id])
+        self.assertEqual([t["id"] for t in res.data["tags"]], [self.tag.id])
+        self.assertEqual(
+            [i["id"] for i in res.data["ingredients"]], [self.salt.id]
+        )
+        self.assertFalse(res.data["has_more"])
+        self.assertTrue(res.data["sync_token"])
+
+    def test_delta_sync(self):
+        """test that only changes after the token are returned"""
+        token = self.client.get(SYNC_URL).data["sync_token"]
+        unchanged = Tag.objects.create(user=self.user, name="Dessert")
+        token = self.client.get(SYNC_URL, {"since": token}).data["sync_token"]
+
+        self.recipe.tags.add(self.tag)
+        self.tag.name = "Plant based"
+        self.tag.save()
+        salt_id = self.salt.id
+        self.salt.delete()
+        gone = Recipe.objects.create(
+            user=self.user, title="Gone", time_minute=5, price=3
+        )
+        gone.soft_delete()
+
+        res = self.client.get(SYNC_URL, {"since": token})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["recipes"]), 1)
+        self.assertEqual(res.data["recipes"][0]["tags"], [self.tag.id])
+        self.assertEqual(
+            [t["name"] for t in res.data["tags"]], ["Plant based"]
+        )
+        self.assertNotIn(unchanged.id, [t["id"] for t in res.data["tags"]])
+        self.assertEqual(res.data["ingredients"], [])
+        self.assertEqual(res.data["deleted"]["recipes"], [gone.id])
+        self.assertEqual(res.data["deleted"]["ingredients"], [salt_id])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_sync_paging(self):
+        """test that large deltas are split into pages"""
+        token = self.client.get(SYNC_URL).data["sync_token"]
+        names = {f"tag{i}" for i in range(5)}
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+        seen = set()
+        pages = 0
+        has_more = True
+        while has_more:
+            res = self.client.get(SYNC_URL, {"since": token})
+            self.assertLessEqual(len(res.data["tags"]), 2)
+            seen.update(t["name"] for t in res.data["tags"])
+            token = res.data["sync_token"]
+            has_more = res.data["has_more"]
+            pages += 1
+        self.assertEqual(seen, names)
+        self.assertGreaterEqual(pages, 3)
+
+    def test_invalid_token(self):
+        """test that a malformed token is rejected"""
+        res = self.client.get(SYNC_URL, {"since": "???"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_out_of_range_token(self):
+        """test that a well-formed token for an impossible time is rejected"""
+        token = base64.urlsafe_b64encode(str(10 ** 30).encode()).decode()
+        res = self.client.get(SYNC_URL, {"since": token})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_count_change_synced(self):
+        """test a tag used by another recipe is synced with its new count"""
+        self.recipe.tags.add(self.tag)
+        token = self.client.get(SYNC_URL).data["sync_token"]
+        other = Recipe.objects.create(
+            user=self.user, title="Curry", time_minute=20, price=6
+        )
+        other.tags.add(self.tag)
+        res = self.client.get(SYNC_URL, {"since": token})
+        self.assertEqual(
+            [(t["id"], t["recipe_count"]) for t in res.data["tags"]],
+            [(self.tag.id, 2)]
+        )
+
+    def test_expired_token(self):
+        """test that a token older than the tombstone retention is gone"""
+        token = sync.encode_token(timezone.now() - timedelta(days=365))
+        res = self.client.get(SYNC_URL, {"since": token})
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
@@ -1,11 +1,14 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Tag, Recipe
 from recipe.serializers import TagSerializer
 
 
@@ -73,3 +76,85 @@ class PrivateTagsApiTests(TestCase):
         payload = {"name": ""}
         res = self.client.post(TAGS_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_tags_assigned_to_recipes(self):
+        """test filtering tags by those assigned to recipes"""
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        recipe = Recipe.objects.create(
+            title="Coriander eggs on toast",
+            time_minute=10,
+            price=5.00,
+            user=self.user
+        )
+        recipe.tags.add(tag1)
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+        tag1.refresh_from_db()
+        serializer1 = TagSerializer(tag1)
+        serializer2 = TagSerializer(tag2)
+        self.assertIn(serializer1.data, res.data)
+        self.assertNotIn(serializer2.data, res.data)
+        self.assertEqual(res.data[0]["recipe_count"], 1)
+
+    def test_assigned_only_parsed_as_boolean(self):
+        """test assigned_only is a boolean, anything else is rejected"""
+        tag = Tag.objects.create(user=self.user, name="Breakfast")
+        res = self.client.get(TAGS_URL, {"assigned_only": "true"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+        for value in ("false", ""):
+            res = self.client.get(TAGS_URL, {"assigned_only": value})
+            self.assertEqual(res.data[0]["id"], tag.id)
+        res = self.client.get(TAGS_URL, {"assigned_only": "maybe"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tag_recipe_count_no_join(self):
+        """test that listing tags does not join the recipe links"""
+        Tag.objects.create(user=self.user, name="Breakfast")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(TAGS_URL, {"assigned_only": 1})
+        self.assertFalse(
+            any("recipe_tags" in query["sql"]
+                for query in queries.captured_queries)
+        )
+
+    def test_create_existing_tag_returns_it(self):
+        """test creating a tag the user has already returns that tag"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        res = self.client.post(TAGS_URL, {"name": "  vegan "})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["id"], tag.id)
+        self.assertEqual(res.data["name"], "Vegan")
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_tag_same_name_other_user(self):
+        """test another user's tag of the same name is not returned"""
+        other = get_user_model().objects.create_user(
+            "other@dummy.com", "dummy123"
+        )
+        theirs = Tag.objects.create(user=other, name="Vegan")
+        res = self.client.post(TAGS_URL, {"name": "Vegan"})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(res.data["id"], theirs.id)
+
+    def test_create_tag_idempotency_key(self):
+        """test a retried create replays the first response"""
+        cache.clear()
+        headers = {"HTTP_IDEMPOTENCY_KEY": "retry-1"}
+        first = self.client.post(TAGS_URL, {"name": "Brunch"}, **headers)
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.post(TAGS_URL, {"name": "Brunch"}, **headers)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(again.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(len(queries), 0)
+
+    def test_create_tag_idempotency_key_reused(self):
+        """test a key cannot be replayed for a different body"""
+        cache.clear()
+        headers = {"HTTP_IDEMPOTENCY_KEY": "retry-2"}
+        self.client.post(TAGS_URL, {"name": "Brunch"}, **headers)
+        res = self.client.post(TAGS_URL, {"name": "Dinner"}, **headers)
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(Tag.objects.filter(name="Dinner").exists())
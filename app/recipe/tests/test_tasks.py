@@ -0,0 +1,81 @@
+import os
+import tempfile
+from io import StringIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Job, Recipe
+from recipe import sharing
+from recipe.tests.test_sharing import purged_keys
+
+
+def run_workers():
+    call_command("run_workers", concurrency=1, burst=True, stdout=StringIO())
+
+
+class RecipeTaskTests(TestCase):
+    """test work moved to background jobs"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@dummy.com",
+            "dummy123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Dal", time_minute=30, price=4
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            self.recipe.image.delete()
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=20)
+    def test_upload_resized_by_job(self):
+        """test an uploaded image is shrunk by a worker"""
+        url = reverse("recipe:recipe-upload-image", args=[self.recipe.id])
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", (80, 40)).save(ntf, format="JPEG")
+            ntf.seek(0)
+            res = self.client.post(url, {"image": ntf}, format="multipart")
+        self.recipe.refresh_from_db()
+        original = self.recipe.image.path
+        uploaded = self.recipe.version, self.recipe.updated_at
+        job = Job.objects.get(pk=res.data["job"])
+        self.assertEqual(job.user, self.user)
+
+        run_workers()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, uploaded[0] + 1)
+        self.assertGreater(self.recipe.updated_at, uploaded[1])
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.size, (20, 10))
+        self.assertFalse(os.path.exists(original))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    @override_settings(
+        SURROGATE_KEY_PURGER="recipe.tests.test_sharing.purge_keys"
+    )
+    def test_account_deletion_purges_shared_later(self):
+        """test shared recipes of a closed account are hidden at once
+        and purged from the edge by a job
+        """
+        purged_keys.clear()
+        slug = sharing.share(self.recipe)
+        self.user.soft_delete()
+        shared = APIClient().get(reverse("recipe:shared-recipe", args=[slug]))
+        self.assertEqual(shared.status_code, 404)
+        self.assertEqual(purged_keys, [])
+
+        run_workers()
+        self.assertEqual(purged_keys, [f"recipe-{self.recipe.id}"])
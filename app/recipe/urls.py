@@ -12,5 +12,17 @@ router.register("recipes", views.RecipeViewSet, "recipe")
 app_name = "recipe"
 
 urlpatterns = [
+    path("stats/", views.RecipeStatsView.as_view(), name="stats"),
+    path("sync/", views.SyncView.as_view(), name="sync"),
+    path(
+        "shopping-list/",
+        views.ShoppingListView.as_view(),
+        name="shopping-list"
+    ),
+    path(
+        "shared/<slug:slug>/",
+        views.SharedRecipeView.as_view(),
+        name="shared-recipe"
+    ),
     path("", include(router.urls)),
 ]
@@ -1,27 +1,92 @@
-from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q, prefetch_related_objects
+from django.db.utils import OperationalError
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+
+from rest_framework import generics, viewsets, mixins, status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import jobs, load_shedding, query_log
+from core.authentication import ExpiringTokenAuthentication
+from core.db_routers import (
+    ReplicaReadMixin, eject, get_read_alias, raised_by, set_read_alias,
+    watch
+)
+from core.idempotency import IdempotentCreateMixin
+from core.models import (
+    Tag, Ingredient, Recipe, RecipeIngredient, RecipeStats, RecipeTag,
+    VersionConflict
+)
+from core.renderers import CompactJSONRenderer
+from recipe import detail_cache, serializers, sharing, shopping, sync
+
+
+# the entity tags listed in an If-Match header, and the opaque part of a
+# recipe's: its version, with the content coding of a compressed response
+ENTITY_TAG = re.compile(r'(W/)?"([^"]*)"')
+VERSION_TAG = re.compile(r"(\d+)(?:-[\w.+-]+)?")
 
-from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
 
+class PreconditionFailed(APIException):
+    """raised when If-Match does not match the current version"""
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The recipe was modified by another request."
+    default_code = "precondition_failed"
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
-                            mixins.ListModelMixin,
-                            mixins.CreateModelMixin):
+
+class SyncTokenExpired(APIException):
+    """raised when a sync token predates the tombstone retention"""
+    status_code = status.HTTP_410_GONE
+    default_detail = "The sync token has expired, start a full sync."
+    default_code = "sync_token_expired"
+
+
+class GetOrCreateByNameMixin:
+    """create that returns the user's existing object of the same name"""
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.instance, created = (
+            self.queryset.model.objects.get_or_create_by_name(
+                request.user, serializer.validated_data["name"]
+            )
+        )
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                            IdempotentCreateMixin,
+                            GetOrCreateByNameMixin,
+                            viewsets.GenericViewSet,
+                            mixins.ListModelMixin):
     """base objects manager in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
         """return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by("-name")
-
-    def perform_create(self, serializer):
-        """create a new object"""
-        serializer.save(user=self.request.user)
+        params = serializers.AttrListParamsSerializer(
+            data=self.request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        queryset = self.queryset.filter(user=self.request.user)
+        if params.validated_data["assigned_only"]:
+            queryset = queryset.filter(recipe_count__gt=0)
+        return queryset.order_by("-name")
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -36,12 +101,19 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin,
+                    IdempotentCreateMixin,
+                    viewsets.ModelViewSet):
     """manage recipe in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeSerializer
+    etag_actions = (
+        "retrieve", "create", "update", "partial_update", "upload_image"
+    )
+    read_actions = ("batch", "similar")
+    upload_actions = ("upload_image",)
 
     def _params_to_ints(self, qs):
         """convert a list of string id to a list of integers"""
@@ -52,12 +124,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         tags = self.request.query_params.get("tags")
         ingredients = self.request.query_params.get("ingredients")
         queryset = self.queryset
+        # semi-joins rather than joins: answered from the (x, recipe)
+        # link indexes, and a recipe matching several ids is listed once
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(pk__in=RecipeTag.objects.filter(
+                tag_id__in=tag_ids
+            ).values("recipe_id"))
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(pk__in=RecipeIngredient.objects.filter(
+                ingredient_id__in=ingredient_ids
+            ).values("recipe_id"))
         return queryset.filter(user=self.request.user)
 
     def get_serializer_class(self):
@@ -69,10 +147,57 @@ class RecipeViewSet(viewsets.ModelViewSet):
         else:
             return self.serializer_class
 
+    def retrieve(self, request, *args, **kwargs):
+        """serve the detail payload from the tiered cache"""
+        recipe = self.get_object()
+
+        def build():
+            prefetch_related_objects([recipe], "tags", "ingredients")
+            return serializers.RecipeDetailSerializer(recipe).data
+
+        return Response(detail_cache.get_or_build(recipe, build))
+
     def perform_create(self, serializer):
         """create a new recipe"""
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """hide the recipe; rows and files are removed by purge_deleted"""
+        instance.soft_delete()
+
+    def _if_match_version(self, recipe):
+        """return the version required by If-Match, or None for any
+
+        If-Match uses the strong comparison, so weak tags in the list
+        never match; a tag matches when it names the recipe's version,
+        with or without the coding core.compression appended to it.
+        """
+        header = self.request.META.get("HTTP_IF_MATCH", "").strip()
+        if not header or header == "*":
+            return None
+        for weak, opaque in ENTITY_TAG.findall(header):
+            match = VERSION_TAG.fullmatch(opaque)
+            if not weak and match and int(match[1]) == recipe.version:
+                # the write itself checks the version is still this one
+                return recipe.version
+        raise PreconditionFailed()
+
+    def perform_update(self, serializer):
+        """write only if the recipe is still at the If-Match version"""
+        expected_version = self._if_match_version(serializer.instance)
+        try:
+            serializer.save(expected_version=expected_version)
+        except VersionConflict:
+            raise PreconditionFailed()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.action in self.etag_actions and response.status_code < 300:
+            response["ETag"] = f'"{response.data["version"]}"'
+        return response
+
     @action(methods=["POST"], detail=True, url_path="upload-image")
     def upload_image(self, request, pk=None):
         """upload an image to a recipe"""
@@ -82,12 +207,253 @@ class RecipeViewSet(viewsets.ModelViewSet):
             data=request.data
         )
         if serializer.is_valid():
-            serializer.save()
+            self.perform_update(serializer)
+            # resizing runs on a worker; the job id is there to poll it
+            job = jobs.enqueue(
+                "recipe.process_image", user=request.user,
+                recipe_id=recipe.pk, image=recipe.image.name
+            )
             return Response(
-                serializer.data,
+                dict(serializer.data, job=job.pk),
                 status=status.HTTP_200_OK
             )
         return Response(
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=["GET", "POST"], detail=False, url_path="batch")
+    def batch(self, request):
+        """detail of many recipes, in request order, in three queries
+
+        GET takes ?ids=1,2,3; POST takes {"ids": [...]} for lists too
+        long for a URL. Ids that don't exist or belong to another user
+        are reported together under "missing".
+        """
+        if request.method == "GET":
+            ids = request.query_params.get("ids", "")
+            data = {"ids": [i for i in ids.split(",") if i.strip()]}
+        else:
+            data = request.data
+        params = serializers.RecipeBatchSerializer(data=data)
+        params.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(params.validated_data["ids"]))
+        found = self.queryset.filter(user=request.user).prefetch_related(
+            "tags", "ingredients"
+        ).in_bulk(ids)
+        recipes = [found[pk] for pk in ids if pk in found]
+        serializer = serializers.RecipeDetailSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return Response({
+            "results": serializer.data,
+            "missing": [pk for pk in ids if pk not in found],
+        })
+
+    def _export_batch(self, alias, last, size):
+        """the next batch of the user's recipes after pk `last`"""
+        set_read_alias(alias)
+        try:
+            with connections[alias].execute_wrapper(load_shedding.monitor):
+                return list(
+                    self.queryset.using(alias).filter(
+                        user=self.request.user, pk__gt=last
+                    ).order_by("pk").prefetch_related(
+                        "tags", "ingredients"
+                    )[:size]
+                )
+        finally:
+            set_read_alias(None)
+
+    def _export_chunks(self, renderer, alias, origin):
+        """the user's recipes as a JSON array, one batch per chunk
+
+        Runs once the view and the middleware have returned, so it redoes
+        what they set up for the request: reads from the alias picked for
+        it, going on from the primary when that replica fails, under the
+        latency monitor, with queries tagged by the view's origin.
+        """
+        size = settings.RECIPE_EXPORT_BATCH_SIZE
+        last = 0
+        yield b"["
+        while True:
+            query_log.set_origin(origin)
+            watch(alias)
+            try:
+                batch = self._export_batch(alias, last, size)
+            except OperationalError:
+                if not raised_by(alias):
+                    raise
+                eject(alias)
+                alias = DEFAULT_DB_ALIAS
+                continue
+            finally:
+                query_log.set_origin(None)
+            if not batch:
+                break
+            data = serializers.RecipeDetailSerializer(batch, many=True).data
+            yield (b"," if last else b"") + renderer.render(data)[1:-1]
+            last = batch[-1].pk
+        yield b"]"
+
+    @action(methods=["GET"], detail=False, url_path="export")
+    def export(self, request):
+        """every recipe of the user in detail, streamed batch by batch"""
+        if isinstance(request.accepted_renderer, CompactJSONRenderer):
+            renderer = request.accepted_renderer
+        else:
+            renderer = JSONRenderer()
+        chunks = self._export_chunks(
+            renderer, get_read_alias() or DEFAULT_DB_ALIAS,
+            query_log.get_origin()
+        )
+        return StreamingHttpResponse(
+            chunks, content_type="application/json"
+        )
+
+    @action(methods=["GET"], detail=True, url_path="similar")
+    def similar(self, request, pk=None):
+        """the user's and shared recipes with the most tags and
+        ingredients in common, scored by Jaccard similarity
+        """
+        # imported here: only workers serving this action pay for numpy
+        from recipe import similarity
+
+        recipe = self.get_object()
+        params = serializers.SimilarParamsSerializer(
+            data=request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        ranked = similarity.similar(
+            recipe, request.user, params.validated_data["limit"]
+        )
+        found = Recipe.objects.filter(
+            Q(user=request.user) | Q(share_slug__isnull=False)
+        ).prefetch_related("tags", "ingredients").in_bulk(
+            [pk for pk, _ in ranked]
+        )
+        recipes = []
+        for pk, score in ranked:
+            if pk in found:
+                found[pk].similarity = score
+                recipes.append(found[pk])
+        serializer = serializers.SimilarRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @action(methods=["POST", "DELETE"], detail=True, url_path="share")
+    def share(self, request, pk=None):
+        """create or revoke the public share link of a recipe"""
+        recipe = self.get_object()
+        if request.method == "DELETE":
+            sharing.unshare(recipe)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        slug = sharing.share(recipe)
+        url = reverse("recipe:shared-recipe", args=[slug])
+        return Response(
+            {"slug": slug, "url": request.build_absolute_uri(url)},
+            status=status.HTTP_200_OK
+        )
+
+
+class SharedRecipeView(ReplicaReadMixin, APIView):
+    """anonymous, edge-cacheable read of a shared recipe
+
+    Serves the snapshot rendered at write time: one indexed lookup, no
+    joins and no serialization per request.
+    """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request, slug):
+        row = Recipe.objects.filter(share_slug=slug).values_list(
+            "pk", "shared_snapshot"
+        ).first()
+        if row is None:
+            raise Http404
+        recipe_id, snapshot = row
+        response = HttpResponse(snapshot, content_type="application/json")
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.SHARED_RECIPE_MAX_AGE,
+            s_maxage=settings.SHARED_RECIPE_S_MAXAGE
+        )
+        response["Surrogate-Key"] = " ".join(
+            sharing.surrogate_keys(recipe_id)
+        )
+        return response
+
+
+class RecipeStatsView(ReplicaReadMixin, generics.RetrieveAPIView):
+    """statistics over the authenticated user's recipes"""
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = serializers.RecipeStatsSerializer
+    top_ingredients = 10
+
+    def get_object(self):
+        """read the incrementally maintained summaries, no aggregation"""
+        user = self.request.user
+        totals = RecipeStats.objects.filter(user=user).first()
+        if totals is None:
+            totals = RecipeStats(user=user)
+        used = ("id", "name", "recipe_count")
+        return {
+            "recipe_count": totals.recipe_count,
+            "average_price": totals.average_price,
+            "average_time_minute": totals.average_time_minute,
+            "recipes_per_tag": Tag.objects.filter(
+                user=user, recipe_count__gt=0
+            ).order_by("-recipe_count", "name").only(*used),
+            "top_ingredients": Ingredient.objects.filter(
+                user=user, recipe_count__gt=0
+            ).order_by("-recipe_count", "name").only(*used)[
+                :self.top_ingredients
+            ],
+        }
+
+
+class ShoppingListView(ReplicaReadMixin, APIView):
+    """merged ingredients of up to RECIPE_BATCH_MAX_IDS recipes
+
+    Takes {"ids": [...]}; each ingredient is listed once with the number
+    and ids of the selected recipes using it. Ids that don't exist or
+    belong to another user are reported under "missing".
+    """
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def _is_read(self, request):
+        # a POST only because the id list can be long
+        return True
+
+    def post(self, request):
+        params = serializers.RecipeBatchSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        return Response(shopping.shopping_list(
+            request.user, params.validated_data["ids"]
+        ))
+
+
+class SyncView(APIView):
+    """changes to recipes, tags and ingredients since a sync token
+
+    Served from the primary: a lagging replica could hide changes that
+    are older than the token handed out.
+    """
+    authentication_classes = (ExpiringTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = sync.decode_token(since)
+            except sync.InvalidToken:
+                raise ValidationError({"since": "Invalid sync token."})
+            if sync.is_expired(since):
+                raise SyncTokenExpired()
+        page = sync.changes(request.user, since or None)
+        return Response(serializers.SyncSerializer(page).data)
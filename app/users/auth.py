@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+_executor = None
+_slots = None
+_init_lock = threading.Lock()
+
+
+class LoginBusy(APIException):
+    """raised when the password hashing pool is saturated"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("too many logins in progress, try again shortly")
+    default_code = "login_busy"
+
+
+def _get_pool():
+    """lazily create the hashing pool and its admission semaphore"""
+    global _executor, _slots
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                workers = settings.PASSWORD_HASH_WORKERS
+                _slots = threading.BoundedSemaphore(
+                    workers + settings.PASSWORD_HASH_QUEUE
+                )
+                _executor = _executor_class()(
+                    max_workers=workers,
+                    thread_name_prefix="password-hash"
+                )
+    return _executor, _slots
+
+
+def _executor_class():
+    """a pool of OS threads, even under gevent workers
+
+    Once gevent has patched threading, ThreadPoolExecutor threads are
+    greenlets and a hash would block the whole worker's event loop.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return ThreadPoolExecutor
+    if not monkey.is_module_patched("threading"):
+        return ThreadPoolExecutor
+    from gevent.threadpool import ThreadPoolExecutor as NativeExecutor
+    return NativeExecutor
+
+
+def run_hasher(func, *args):
+    """run a password hashing call on the bounded pool and wait for it
+
+    At most PASSWORD_HASH_WORKERS hashes run at once with
+    PASSWORD_HASH_QUEUE more waiting; beyond that LoginBusy is raised
+    straight away instead of queueing request workers behind the backlog.
+    """
+    executor, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise LoginBusy()
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda f: slots.release())
+    try:
+        return future.result(timeout=settings.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        raise LoginBusy()
+
+
+def _verify(password, encoded):
+    """check a password, returning (valid, upgraded hash or None)"""
+    upgraded = []
+    valid = check_password(
+        password, encoded,
+        setter=lambda raw: upgraded.append(make_password(raw))
+    )
+    return valid, (upgraded[0] if upgraded else None)
+
+
+def authenticate_email(email, password):
+    """return the active user matching the credentials or None
+
+    Only the hashing runs on the pool; database access stays on the
+    request thread and connection. Hashes made with an older hasher
+    (e.g. PBKDF2) are transparently replaced by the preferred one.
+    """
+    user_model = get_user_model()
+    try:
+        user = user_model._default_manager.get_by_natural_key(email)
+    except user_model.DoesNotExist:
+        # hash anyway so response time does not reveal unknown emails
+        run_hasher(make_password, password)
+        return None
+    valid, upgraded = run_hasher(_verify, password, user.password)
+    if not valid or not user.is_active:
+        return None
+    if upgraded:
+        user.password = upgraded
+        user.save(update_fields=["password"])
+    return user
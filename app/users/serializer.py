@@ -1,8 +1,10 @@
-from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth import get_user_model
 from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import serializers
 
+from users.auth import authenticate_email
+
 
 class UserSerializer(serializers.ModelSerializer):
     """serializer for the users object"""
@@ -32,16 +34,15 @@ class AuthTokenSerializer(serializers.Serializer):
     password = serializers.CharField(
         style={"input_type": "password", "trim_whitespace": False}
     )
+    device = serializers.CharField(
+        required=False, allow_blank=True, max_length=64
+    )
 
     def validate(self, attrs):
         """validate and authenticate the user"""
         email = attrs.get("email")
         password = attrs.get("password")
-        user = authenticate(
-            request=self.context.get("request"),
-            username=email,
-            password=password
-        )
+        user = authenticate_email(email, password)
         if not user:
             msg = _("unable to authenticate with provided credentials")
             raise serializers.ValidationError(msg, code="authentication")
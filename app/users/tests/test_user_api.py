@@ -1,10 +1,23 @@
+import warnings
+from datetime import timedelta
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import AuthToken
+from users import auth
+from users.auth import LoginBusy
+from users.throttles import LoginEmailThrottle
+
 
 CREATE_USER_URL = reverse("users:create")
 TOKEN_URL = reverse("users:token")
@@ -19,6 +32,7 @@ class PublicUserApiTests(TestCase):
     """Test the user's api (public)"""
 
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
 
     def test_create_valid_user_success(self):
@@ -100,11 +114,117 @@ class PublicUserApiTests(TestCase):
         self.assertNotIn("token", res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_token_per_device(self):
+        """test that each device gets its own token and logins rotate it"""
+        create_user(email="test_user@dummy.com", password="dummy123")
+        payload = {"email": "test_user@dummy.com", "password": "dummy123"}
+        phone = self.client.post(TOKEN_URL, dict(payload, device="phone"))
+        laptop = self.client.post(TOKEN_URL, dict(payload, device="laptop"))
+        rotated = self.client.post(TOKEN_URL, dict(payload, device="phone"))
+        self.assertIn("expires", phone.data)
+        keys = set(AuthToken.objects.values_list("key", flat=True))
+        self.assertEqual(keys, {laptop.data["token"], rotated.data["token"]})
+
+    def test_password_hashed_with_argon2(self):
+        """test that new passwords are hashed with argon2"""
+        user = create_user(email="test_user@dummy.com", password="dummy123")
+        self.assertTrue(user.password.startswith("argon2"))
+
+    def test_legacy_hash_upgraded_on_login(self):
+        """test that a PBKDF2 hash is replaced by argon2 on login"""
+        user = create_user(email="test_user@dummy.com", password="dummy123")
+        user.password = make_password("dummy123", hasher="pbkdf2_sha256")
+        user.save()
+        res = self.client.post(
+            TOKEN_URL,
+            {"email": "test_user@dummy.com", "password": "dummy123"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("argon2"))
+        self.assertTrue(user.check_password("dummy123"))
+
+    def test_token_throttled_per_email(self):
+        """test that repeated logins for one email are throttled"""
+        create_user(email="test_user@dummy.com", password="dummy123")
+        payload = {"email": "test_user@dummy.com", "password": "wrong"}
+        rates = {"login_email": "2/min", "login_ip": "100/min"}
+        with patch.object(LoginEmailThrottle, "THROTTLE_RATES", rates):
+            for _ in range(2):
+                res = self.client.post(TOKEN_URL, payload)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_token_non_string_email_rejected(self):
+        """test that an email that is not a string is a validation error"""
+        for email in (5, ["a@dummy.com"], {"a": 1}):
+            res = self.client.post(
+                TOKEN_URL, {"email": email, "password": "dummy123"},
+                format="json"
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_token_odd_email_rejected(self):
+        """test that emails memcached can't key on (a space, too long) are
+        counted and rejected, not a server error
+        """
+        with warnings.catch_warnings():
+            # what memcached raises on, other backends only warn about
+            warnings.simplefilter("error", CacheKeyWarning)
+            for email in ("a b@dummy.com", "a" * 300 + "@dummy.com"):
+                res = self.client.post(
+                    TOKEN_URL, {"email": email, "password": "dummy123"}
+                )
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST
+                )
+
+    @patch("users.serializer.authenticate_email", side_effect=LoginBusy)
+    def test_token_hash_pool_saturated(self, authenticate_email):
+        """test that a saturated hashing pool sheds the login with a 503"""
+        payload = {"email": "test_user@dummy.com", "password": "dummy123"}
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(
+            res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertNotIn("token", res.data)
+
+    def test_hash_pool_uses_native_threads_under_gevent(self):
+        """test hashing does not run on greenlets once gevent patched"""
+        from concurrent.futures import ThreadPoolExecutor
+        self.assertIs(auth._executor_class(), ThreadPoolExecutor)
+        with patch("gevent.monkey.is_module_patched", return_value=True):
+            executor = auth._executor_class()
+        self.assertEqual(executor.__module__, "gevent.threadpool")
+
     def test_retrieve_user_unauthorized(self):
         """test that authentication is required for users"""
         res = self.client.get(ME_URL)
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_expired_token_rejected(self):
+        """test that an expired token no longer authenticates"""
+        user = create_user(email="test_user@dummy.com", password="dummy123")
+        token = AuthToken.objects.create(
+            user=user,
+            expires=timezone.now() - timedelta(seconds=1)
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_expiry_slides_on_use(self):
+        """test that using a token pushes its expiry forward"""
+        user = create_user(email="test_user@dummy.com", password="dummy123")
+        expires = timezone.now() + timedelta(minutes=5)
+        token = AuthToken.objects.create(user=user, expires=expires)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        token.refresh_from_db()
+        self.assertGreater(token.expires, expires)
+
 
 class PrivateUserApiTests(TestCase):
     """test API requests that requires authentications"""
@@ -143,3 +263,13 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload["name"])
         self.assertTrue(self.user.check_password(payload["password"]))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_delete_account(self):
+        """test that deleting the account locks it until it is purged"""
+        AuthToken.objects.create(user=self.user)
+        res = self.client.delete(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deleted_at)
+        self.assertFalse(AuthToken.objects.filter(user=self.user).exists())
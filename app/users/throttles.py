@@ -0,0 +1,33 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+from core.throttling import ident_digest
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    """limit token requests per client IP"""
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": ident_digest(self.get_ident(request))
+        }
+
+
+class LoginEmailThrottle(SimpleRateThrottle):
+    """limit token requests per target account, whatever the source IP"""
+    scope = "login_email"
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        email = data.get("email") if hasattr(data, "get") else None
+        if not email:
+            return None
+        if not isinstance(email, str):
+            # not an address, the serializer rejects it; still counted
+            ident = self.get_ident(request)
+        else:
+            ident = email.strip().lower()
+        return self.cache_format % {
+            "scope": self.scope, "ident": ident_digest(ident)
+        }
@@ -1,6 +1,11 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from core.authentication import ExpiringTokenAuthentication
+from core.db_routers import ReplicaReadMixin
+from core.models import AuthToken
+from users.throttles import LoginEmailThrottle, LoginIPThrottle
 from users.serializer import UserSerializer, AuthTokenSerializer
 
 
@@ -13,14 +18,33 @@ class CreateTokenView(ObtainAuthToken):
     """create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = (LoginIPThrottle, LoginEmailThrottle)
 
+    def post(self, request, *args, **kwargs):
+        """issue a fresh token for the user's device, replacing the old one"""
+        serializer = self.serializer_class(
+            data=request.data,
+            context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        token = AuthToken.objects.rotate(
+            serializer.validated_data["user"],
+            serializer.validated_data.get("device", "")
+        )
+        return Response({"token": token.key, "expires": token.expires})
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class ManageUserView(ReplicaReadMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     """manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (ExpiringTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
         """retrieve and return authenticated user"""
         return self.request.user
+
+    def perform_destroy(self, instance):
+        """close the account; its data is purged in the background"""
+        instance.soft_delete()